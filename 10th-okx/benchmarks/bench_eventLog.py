@@ -0,0 +1,59 @@
+import io
+import os
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.eventLog import EventLog
+
+'''
+    事件日志基准 python benchmarks/bench_eventLog.py [次数]
+    对比下单路径上原来的 print(name, parameters) 和 events.info 每次调用的耗时(微秒)
+    print 写到 StringIO 已经比写终端快很多 真实终端只会更慢
+'''
+
+PARAMETERS = {
+    "instId": "BTC-USDT-SWAP",
+    "tdMode": "cross",
+    "side": "buy",
+    "posSide": "long",
+    "ordType": "market",
+    "sz": "12",
+    "clOrdId": "t10th1718000000000001"
+}
+
+
+def measure(call, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        call()
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def main(count = 100000):
+    sink = io.StringIO()
+    with redirect_stdout(sink):
+        legacy = measure(lambda: print('okx', PARAMETERS), count)
+
+    directory = tempfile.mkdtemp()
+    log = EventLog(capacity=count, console=False)
+    log.open(os.path.join(directory, 'events.jsonl'))
+    current = measure(lambda: log.info('trade', 'order', venue='okx', parameters=PARAMETERS), count)
+    log.set_level('trade', 'WARNING')
+    filtered = measure(lambda: log.info('trade', 'order', venue='okx', parameters=PARAMETERS), count)
+    start = time.perf_counter()
+    log.close()
+    drain = time.perf_counter() - start
+
+    print(f"{count} 次")
+    print(f"print:           {legacy:.3f} us/次")
+    print(f"events.info:     {current:.3f} us/次   x{legacy / current:.1f}")
+    print(f"低于级别被过滤:  {filtered:.3f} us/次")
+    print(f"后台线程写完剩余事件 {drain * 1000:.1f} ms  丢弃 {log.dropped}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
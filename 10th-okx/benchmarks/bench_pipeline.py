@@ -0,0 +1,298 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import global_const
+from utils.latency import tracer, percentile
+from utils.notifier import notifier, CRITICAL
+
+'''
+    下单链路基准 python benchmarks/bench_pipeline.py [--only parse,map,build,e2e,failover] [--save]
+        parse  matchStr 解析语料里的每条消息
+        map    storage_messages + exchange_interface 消息 -> 下单信号(不下单)
+        build  TradeManager.open_position 换算数量/拼下单参数 交给 StubExchange 立刻成交
+        e2e    本地 mock OKX(REST + 私有 websocket) 从收到消息到成交回报 可以加延迟和错误率
+               --latency 0.02 --jitter 0.01 --error-rate 0.05 错误码 50011/50001 会走下单重试
+        failover  热备接手后补下已经下过的信号 OKX 回 51016 要查出原来那笔订单当成功处理 不能多下也不能报失败
+    每项输出吞吐和 p50/p95/p99
+    --save 把这次结果写到 baseline.json 之后每次运行和它比 吞吐降低或 p50/p95 变慢超过 --threshold(默认 20%) 标记退化 退出码 1
+    e2e 的基线按延迟/错误率分开存 参数不同不比较
+'''
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS_PATH = os.path.join(BENCH_DIR, 'signal_corpus.jsonl')
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baseline.json')
+CHAT_ID = -1000000000001
+CASES = ('parse', 'map', 'build', 'e2e', 'failover')
+
+
+def load_corpus(path = CORPUS_PATH):
+    with open(path, 'r', encoding='utf-8') as file:
+        return [json.loads(line)['text'] for line in file if line.strip()]
+
+
+# samples 单位毫秒
+def summarize(samples, elapsed):
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "throughput": len(ordered) / elapsed if elapsed else 0.0,
+        "p50": percentile(ordered, 50),
+        "p95": percentile(ordered, 95),
+        "p99": percentile(ordered, 99)
+    }
+
+
+# exchange_interface 里没有 await 直接跑完协程 不经过事件循环
+def run_sync(coro):
+    try:
+        coro.send(None)
+    except StopIteration as stop:
+        return stop.value
+    raise RuntimeError('协程被挂起')
+
+
+def create_client(trade_manager):
+    from telethon_client import telethon_client
+    client = telethon_client(1, 'bench', CHAT_ID, None, [{"id": CHAT_ID}], session=None)
+    client.trade_manager = trade_manager
+    return client
+
+
+def messages(texts, rounds):
+    message_id = 0
+    for _ in range(rounds):
+        for text in texts:
+            message_id += 1
+            yield SimpleNamespace(id=message_id, chat_id=CHAT_ID, message=text)
+
+
+def bench_parse(texts, rounds):
+    from utils.matchStr import matchStr
+    samples = []
+    clock = time.perf_counter_ns
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in texts:
+            begin = clock()
+            matchStr(text, CHAT_ID)
+            samples.append((clock() - begin) / 1e6)
+    return summarize(samples, time.perf_counter() - start)
+
+
+# 只收集 open_position 收到的信号 不下单
+class CaptureTradeManager:
+    def __init__(self):
+        self.orders = []
+
+    def open_position(self, current_order):
+        self.orders.append(current_order)
+
+    def create_task(self, coro):
+        pass
+
+
+def bench_map(texts, rounds):
+    capture = CaptureTradeManager()
+    client = create_client(capture)
+    samples = []
+    clock = time.perf_counter_ns
+    start = time.perf_counter()
+    for message in messages(texts, rounds):
+        begin = clock()
+        current_order = client.storage_messages(message)
+        if current_order:
+            run_sync(client.exchange_interface(current_order))
+        samples.append((clock() - begin) / 1e6)
+    elapsed = time.perf_counter() - start
+    tracer.reset()
+    return summarize(samples, elapsed), capture.orders
+
+
+# 只用开仓信号 平仓会去查平仓收益 不属于拼参数
+async def bench_build(orders):
+    from replay import create_trade_manager
+    from exchanges.stubExchange import StubExchange
+    opens = [order for order in orders if order['operation'].startswith('开')]
+    trade_manager = create_trade_manager(StubExchange())
+    samples = []
+    clock = time.perf_counter_ns
+    start = time.perf_counter()
+    for current_order in opens:
+        begin = clock()
+        await trade_manager.open_position(current_order)
+        samples.append((clock() - begin) / 1e6)
+    elapsed = time.perf_counter() - start
+    await trade_manager.close()
+    tracer.reset()
+    return summarize(samples, elapsed)
+
+
+# 按 rate(条/秒) 发开仓信号 等所有下单任务结束 延迟取 tracer 的 total(收到消息 -> 成交回报)
+async def bench_e2e(signals, rate, latency, jitter, error_rate, port):
+    from mock.okxServer import MockOKXServer
+    from exchanges.okx.okx import OKXExchange
+    from replay import create_trade_manager
+    server = MockOKXServer(latency=latency, jitter=jitter, error_rate=error_rate, seed=1)
+    base_url, ws_url = await server.start('127.0.0.1', port)
+    exchange = OKXExchange('bench', 'bench', 'bench', base_url=base_url, ws_url=ws_url)
+    try:
+        await exchange.start()
+        await exchange.websocket.ready.wait()
+        trade_manager = create_trade_manager(exchange)
+        client = create_client(trade_manager)
+        markets = ('BTC-USDT-SWAP', 'ETH-USDT-SWAP')
+        operations = ('开多', '开空')
+        tracer.reset()
+        start = time.perf_counter()
+        for index in range(signals):
+            # 返回里的 ts 每条不同 内容一样的信号会被去重
+            ts = int(time.time() * 1000) + index
+            text = f"[{operations[index % 2]}] 数量:1 市场:{markets[index // 2 % 2]} 返回{{'code': '0', 'data': [{{'sCode': '0', 'ts': '{ts}'}}], 'msg': ''}}"
+            await client.handle_message(SimpleNamespace(id=index + 1, chat_id=CHAT_ID, message=text))
+            if rate:
+                delay = (index + 1) / rate - (time.perf_counter() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+        await asyncio.gather(*trade_manager._tasks, return_exceptions=True)
+        elapsed = time.perf_counter() - start
+        totals = tracer._stages.get('total', ())
+        result = summarize(totals, elapsed)
+        result['failed'] = signals - len(totals)
+        result['injected'] = server.injected
+        result['requests'] = server.order_requests
+        await trade_manager.close()
+    finally:
+        await exchange.close()
+        await server.stop()
+        tracer.reset()
+    return result
+
+
+# 旧主已经下了单 新主(新进程 去重表是空的)收到同一条消息再下一次 返回失败的原因 None 表示通过
+async def check_failover(port):
+    from mock.okxServer import MockOKXServer
+    from exchanges.okx.okx import OKXExchange
+    from replay import create_trade_manager
+    server = MockOKXServer(seed=1)
+    base_url, ws_url = await server.start('127.0.0.1', port)
+    ts = int(time.time() * 1000)
+    text = f"[开多] 数量:1 市场:BTC-USDT-SWAP 返回{{'code': '0', 'data': [{{'sCode': '0', 'ts': '{ts}'}}], 'msg': ''}}"
+    try:
+        for instance in ('leader', 'standby'):
+            exchange = OKXExchange('bench', 'bench', 'bench', base_url=base_url, ws_url=ws_url)
+            try:
+                await exchange.start()
+                await exchange.websocket.ready.wait()
+                trade_manager = create_trade_manager(exchange)
+                client = create_client(trade_manager)
+                notifier._heap.clear()
+                await client.handle_message(SimpleNamespace(id=1, chat_id=CHAT_ID, message=text))
+                await asyncio.gather(*trade_manager._tasks, return_exceptions=True)
+                await trade_manager.close()
+            finally:
+                await exchange.close()
+            failures = [item for item in notifier._heap if item[0] == CRITICAL]
+            if failures:
+                return f'{instance} 报了失败: {failures[0]}'
+        if len(server.orders) != 1:
+            return f'下了 {len(server.orders)} 笔'
+        return None
+    finally:
+        await server.stop()
+        notifier._heap.clear()
+        tracer.reset()
+
+
+def e2e_key(args):
+    return f"e2e latency={args.latency} jitter={args.jitter} error_rate={args.error_rate} rate={args.rate} signals={args.signals}"
+
+
+# 和基线比 返回退化的指标
+def compare(current, baseline, threshold):
+    regressions = []
+    if current['throughput'] < baseline['throughput'] * (1 - threshold):
+        regressions.append(f"throughput {baseline['throughput']:,.0f} -> {current['throughput']:,.0f}/s")
+    for key in ('p50', 'p95'):
+        if current[key] is not None and baseline.get(key) and current[key] > baseline[key] * (1 + threshold):
+            regressions.append(f"{key} {baseline[key]:.4f} -> {current[key]:.4f}ms")
+    return regressions
+
+
+def show(name, result):
+    line = f"{name:>6}: n={result['count']:<7} {result['throughput']:>12,.0f}/s  p50={result['p50'] or 0:.4f}ms  p95={result['p95'] or 0:.4f}ms  p99={result['p99'] or 0:.4f}ms"
+    if 'failed' in result:
+        line += f"  失败 {result['failed']}  注入错误 {result['injected']}  下单请求 {result['requests']}"
+    print(line)
+
+
+async def main(args):
+    global_const._init()
+    global_const.set_value('flag', '1')
+    # 通知不发送 只进队列
+    notifier.client = None
+    cases = args.only.split(',') if args.only else CASES
+    texts = load_corpus()
+    results = {}
+    if 'parse' in cases:
+        results['parse'] = bench_parse(texts, args.rounds)
+    orders = []
+    if 'map' in cases or 'build' in cases:
+        mapped, orders = bench_map(texts, args.rounds)
+        if 'map' in cases:
+            results['map'] = mapped
+    if 'build' in cases:
+        results['build'] = await bench_build(orders)
+    if 'e2e' in cases:
+        results[e2e_key(args)] = await bench_e2e(args.signals, args.rate, args.latency, args.jitter, args.error_rate, args.port)
+    failover = None
+    if 'failover' in cases:
+        failover = await check_failover(args.port)
+
+    baseline = {}
+    if os.path.isfile(BASELINE_PATH):
+        with open(BASELINE_PATH, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+
+    regressed = False
+    for name, result in results.items():
+        show(name.split(' ')[0], result)
+        if name.startswith('e2e'):
+            print('        ' + name)
+        if name in baseline and not args.save:
+            regressions = compare(result, baseline[name], args.threshold)
+            if regressions:
+                regressed = True
+                print('        退化: ' + ', '.join(regressions))
+
+    if 'failover' in cases:
+        print('failover: ' + (failover or '通过'))
+        regressed = regressed or failover is not None
+
+    if args.save:
+        baseline.update(results)
+        with open(BASELINE_PATH, 'w', encoding='utf-8') as file:
+            json.dump(baseline, file, ensure_ascii=False, indent=2)
+        print('基线已保存 ' + BASELINE_PATH)
+    return 1 if regressed else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='下单链路基准')
+    parser.add_argument('--only', default='', help='只跑这些 逗号分隔 parse,map,build,e2e,failover')
+    parser.add_argument('--rounds', type=int, default=50, help='parse/map/build 语料重复轮数')
+    parser.add_argument('--signals', type=int, default=50, help='e2e 信号数')
+    parser.add_argument('--rate', type=float, default=20, help='e2e 每秒发多少条 0 为一次全发')
+    parser.add_argument('--latency', type=float, default=0.0, help='mock 每个请求的延迟(秒)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='mock 额外随机延迟上限(秒)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='mock 下单出错概率')
+    parser.add_argument('--port', type=int, default=18765)
+    parser.add_argument('--threshold', type=float, default=0.2, help='超过基线多少算退化')
+    parser.add_argument('--save', action='store_true', help='把结果存为基线')
+    sys.exit(asyncio.run(main(parser.parse_args())))
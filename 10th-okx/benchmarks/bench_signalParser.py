@@ -0,0 +1,69 @@
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.signalParser import default_parser
+
+'''
+    信号解析基准 python benchmarks/bench_signalParser.py [轮数]
+    语料 signal_corpus.jsonl 每行 {"kind": "signal"|"noise", "text": ...}
+    对比旧版 matchStr(re.search + replace + json.loads) 输出每秒处理的消息数
+'''
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'signal_corpus.jsonl')
+
+
+def load_corpus(path = CORPUS_PATH):
+    with open(path, 'r', encoding='utf-8') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+# 旧版 matchStr 去掉 print 只保留解析逻辑
+def legacy_matchStr(string):
+    match = re.search(r"\[([^\]]+)\] 数量:(\d+) 市场:(\S+) 返回({.*})", string)
+    if match:
+        try:
+            response_json = json.loads(match.group(4).replace("'", "\""))
+        except json.JSONDecodeError:
+            response_json = {}
+        return {
+            "operation": match.group(1),
+            "quantity": match.group(2),
+            "market": match.group(3),
+            "response_json": response_json
+        }
+    return None
+
+
+def run(parse, texts, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text in texts:
+            parse(text)
+    elapsed = time.perf_counter() - start
+    return len(texts) * rounds / elapsed
+
+
+def main(rounds = 500):
+    corpus = load_corpus()
+    texts = [item['text'] for item in corpus]
+    signals = [item['text'] for item in corpus if item['kind'] == 'signal']
+    noise = [item['text'] for item in corpus if item['kind'] == 'noise']
+
+    # 结果要和旧版一致
+    for text in texts:
+        assert default_parser.parse(text) == legacy_matchStr(text), text
+
+    print(f"语料: {len(texts)} 条 (信号 {len(signals)} / 噪声 {len(noise)}) x {rounds} 轮")
+    for name, sample in (('全部', texts), ('信号', signals), ('噪声', noise)):
+        legacy = run(legacy_matchStr, sample, rounds)
+        current = run(default_parser.parse, sample, rounds)
+        print(f"{name}:  旧版 {legacy:,.0f} 条/秒   新版 {current:,.0f} 条/秒   x{current / legacy:.2f}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,206 @@
+import argparse
+import asyncio
+import importlib.util
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import global_const
+from exchanges.stubExchange import StubExchange
+
+'''
+    下单安全检查 python benchmarks/check_safety.py [--only roll_cross,...]
+    不连网 用 StubExchange 跑会自动下单的路径 每项输出 通过 或者失败原因 有失败时退出码 1
+        roll_cross  高杠杆全仓刚成交 没有交易所 liqPx 时滚仓不能减仓 推送 liqPx 靠近后才减
+        kill_hedge  kill switch 打开后套利对冲单不下
+        kill_roll   kill switch 打开后滚仓不加仓 止盈照常
+        arb_prices  只有资金费率还没有盘口价格时不报套利机会 价格到了再报
+        signal_payload  两个包的信号解析 返回体缺失或者不是合法 JSON 时都不算信号
+        mexc_message  MEXC 推送坏 JSON 或者扫描器出错时不退出 后面的推送照常更新价格
+        pro_stale  okxPro 推送价格过期时用 REST 查价 查不到不下单 推送出错不影响后面的数据
+'''
+
+
+async def check_roll_cross():
+    from exchanges.rollEngine import RollEngine, REDUCE
+    exchange = StubExchange(price=60000.0, lever='50')
+    engine = RollEngine(exchange, tdMode='cross')
+    engine.on_fill({"instId": 'BTC-USDT-SWAP', "posSide": 'long', "side": 'buy', "sz": '1', "avgPx": '60000', "lever": '50'})
+    decisions = engine.on_mark('BTC-USDT-SWAP', 60000.0)
+    await engine.drain()
+    if decisions:
+        return f'刚成交就下单 {decisions}'
+    engine.on_position({"instId": 'BTC-USDT-SWAP', "posSide": 'long', "pos": '1', "liqPx": '59500'})
+    decisions = engine.on_mark('BTC-USDT-SWAP', 60000.0)
+    await engine.drain()
+    if [decision[0] for decision in decisions] != [REDUCE]:
+        return f'liqPx 靠近时没有减仓 {decisions}'
+    return None
+
+
+def create_trade_manager(**trade):
+    from exchanges.tradeManager import TradeManager
+    from utils.config import TradeConfig
+    trade_manager = TradeManager(['okx', 'mexc'])
+    trade_manager.configure(TradeConfig(**trade))
+    trade_manager.add_exchange('okx', StubExchange(price=60000.0))
+    trade_manager.add_exchange('mexc', StubExchange(price=60300.0))
+    return trade_manager
+
+
+async def check_kill_hedge():
+    trade_manager = create_trade_manager(arb_notional=600, arb_max_exposure=1200, risk_kill_switch=True)
+    opportunity = {"kind": 'spread', "pair": 'BTC-USDT', "instId": 'BTC-USDT-SWAP', "value": 0.005, "long": 'okx', "short": 'mexc', "longPx": 60000.0, "shortPx": 60300.0}
+    trade_manager.on_opportunity(opportunity)
+    # 绕过 on_opportunity 直接下 也要被风控拦住
+    await trade_manager.open_hedge(opportunity)
+    await asyncio.gather(*trade_manager._tasks)
+    placed = sum(len(exchange.orders) for exchange in trade_manager._exchanges.values())
+    if placed:
+        return f'下了 {placed} 笔对冲单'
+    if trade_manager._hedges:
+        return f'对冲占用没有释放 {trade_manager._hedges}'
+    return None
+
+
+async def check_kill_roll():
+    from exchanges.rollEngine import RollEngine, TAKE_PROFIT
+    from exchanges.riskGate import RiskGate
+    exchange = StubExchange(price=60000.0, lever='20')
+    engine = RollEngine(exchange, add_step=0.05, take_profit=0.3, risk=RiskGate(kill_switch=True))
+    engine.on_fill({"instId": 'BTC-USDT-SWAP', "posSide": 'long', "side": 'buy', "sz": '1', "avgPx": '60000', "lever": '20'})
+    engine.on_mark('BTC-USDT-SWAP', 63600.0)
+    await engine.drain()
+    if exchange.orders:
+        return f'kill switch 打开还加仓 {list(exchange.orders.values())}'
+    exchange.price = 78600.0
+    engine.on_mark('BTC-USDT-SWAP', 78600.0)
+    await engine.drain()
+    if [order.get('reduceOnly') for order in exchange.orders.values()] != [True] or engine.actions[TAKE_PROFIT] != 1:
+        return f'止盈没有照常平仓 {engine.actions}'
+    return None
+
+
+async def check_arb_prices():
+    from exchanges.arbScanner import ArbScanner
+    scanner = ArbScanner(['okx', 'mexc'], ['BTC-USDT'])
+    scanner.on_funding('okx', 'BTC-USDT-SWAP', -0.0001)
+    scanner.on_funding('mexc', 'BTC_USDT', 0.0005)
+    opportunities = scanner.scan()
+    if opportunities:
+        return f'没有价格也报了机会 {opportunities}'
+    scanner.on_perp('okx', 'BTC-USDT-SWAP', 60000, 60001)
+    scanner.on_perp('mexc', 'BTC_USDT', 60002, 60003)
+    opportunities = scanner.scan()
+    if [item['kind'] for item in opportunities] != ['funding']:
+        return f'价格到了没有报资金费率机会 {opportunities}'
+    return None
+
+
+def load_module(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+async def check_signal_payload():
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    texts = ["[开多] 数量:6 市场:BTC-USDT-SWAP 返回", "[开多] 数量:6 市场:BTC-USDT-SWAP 返回{'code': '0', 'data': [}"]
+    for package in ('10th-okx', '10th-okxPro'):
+        parser = load_module(package.replace('-', '_') + '_signalParser', os.path.join(root, package, 'utils', 'signalParser.py')).default_parser
+        for text in texts:
+            result = parser.parse(text)
+            if result is not None:
+                return f'{package} 返回体不对也当成信号 {result}'
+        result = parser.parse("[开多] 数量:6 市场:BTC-USDT-SWAP 返回{'code': '0', 'data': []}")
+        if result is None or result['response_json'] != {"code": '0', "data": []}:
+            return f'{package} 正常信号没有解析出来 {result}'
+    return None
+
+
+async def check_mexc_message():
+    from exchanges.arbScanner import ArbScanner
+    from exchanges.mexc.mexcWebsocket import MEXCTickerWebsocket
+    scanner = ArbScanner(['okx', 'mexc'], ['BTC-USDT'])
+    websocket = MEXCTickerWebsocket(['BTC-USDT'], scanner)
+    try:
+        websocket._on_message('not json')
+        websocket._on_message('{"channel": "push.ticker", "data": {"bid1": 60000}}')
+        websocket._on_message('{"channel": "push.ticker", "data": {"symbol": "BTC_USDT", "bid1": 60500, "ask1": 60501}}')
+    except Exception as error:
+        return f'推送出错抛到了 run_forever {error!r}'
+    scanner.on_perp('okx', 'BTC-USDT-SWAP', 60000, 60001)
+    opportunities = scanner.scan()
+    if [item['kind'] for item in opportunities] != ['spread']:
+        return f'坏推送之后的价格没有更新 {opportunities}'
+    return None
+
+
+class StubClient:
+    def __init__(self, ticker):
+        self.ticker = ticker
+        self.calls = []
+
+    async def get(self, path, params = None, auth = True):
+        self.calls.append(path)
+        if path == '/api/v5/market/ticker' and self.ticker:
+            return {"code": '0', "data": [{"instId": params['instId'], "last": self.ticker, "ts": '0'}]}
+        return {"code": '50001', "msg": 'unavailable', "data": []}
+
+    async def post(self, path, params = None, auth = True):
+        self.calls.append(path)
+        return {"code": '0', "data": [{"ordId": str(len(self.calls)), "px": params.get('px')}]}
+
+
+async def check_pro_stale():
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    # okxPro 的 ok 包只在 10th-okxPro 下 放到最后不会盖住本包的 utils
+    sys.path.append(os.path.join(root, '10th-okxPro'))
+    from ok.okxPro import OkxPro
+    order = {"market": 'BTC-USDT-SWAP', "operation": '开多', "side": 'buy', "posSide": 'long'}
+    trader = OkxPro('key', 'secret', 'passphrase', '1', price_max_age=5)
+    trader.public_websocket._on_message('not json')
+    trader.public_websocket.subscribe({"channel": 'tickers', "instId": 'BTC-USDT-SWAP'}, trader.prices.on_ticker)
+    trader.public_websocket._on_message('{"arg": {"channel": "tickers"}, "data": [{"instId": "BTC-USDT-SWAP"}, {"instId": "BTC-USDT-SWAP", "last": "90000", "ts": "0"}]}')
+    if trader.prices.price('BTC-USDT-SWAP', 5) != 90000.0:
+        return f'坏数据之后的推送没有更新价格 {trader.prices.get("BTC-USDT-SWAP")}'
+    trader.prices.get('BTC-USDT-SWAP')['last_at'] -= 60
+    trader.client = StubClient(None)
+    if await trader.process_order(order) is not None or '/api/v5/trade/order' in trader.client.calls:
+        return f'价格过期 REST 也查不到还下单 {trader.client.calls}'
+    trader.client = StubClient('80000')
+    working = await trader.process_order(order)
+    if trader.client.calls[0] != '/api/v5/market/ticker' or not working or working['prices'] != [80000.0]:
+        return f'价格过期没有用 REST 的价格 {trader.client.calls} {working}'
+    return None
+
+
+CHECKS = {
+    "roll_cross": check_roll_cross,
+    "kill_hedge": check_kill_hedge,
+    "kill_roll": check_kill_roll,
+    "arb_prices": check_arb_prices,
+    "signal_payload": check_signal_payload,
+    "mexc_message": check_mexc_message,
+    "pro_stale": check_pro_stale
+}
+
+
+async def main(args):
+    global_const._init()
+    global_const.set_value('flag', '1')
+    names = args.only.split(',') if args.only else list(CHECKS)
+    failed = 0
+    for name in names:
+        error = await CHECKS[name]()
+        print(f"{name:>14}: {error or '通过'}")
+        failed += error is not None
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='下单安全检查')
+    parser.add_argument('--only', default='', help='只跑这些 逗号分隔 ' + ','.join(CHECKS))
+    sys.exit(asyncio.run(main(parser.parse_args())))
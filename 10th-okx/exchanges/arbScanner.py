@@ -0,0 +1,199 @@
+import asyncio
+import time
+
+import numpy as np
+
+'''
+    跨交易所套利扫描 资金费率差 / 永续价差 / 期现基差
+    行情按 (交易所, 币种) 存在 NumPy 数组里 websocket 推送只改对应的一个格子
+    同一轮事件循环里来的推送合并 下一轮对所有币种做一次向量化计算
+    符合条件的机会交给 on_opportunity 回调 例如 TradeManager.open_hedge 直接下对冲单
+
+    机会类型
+        funding  两个交易所永续资金费率(年化)差 做空费率高的 做多费率低的
+        spread   两个交易所永续价差 在便宜的买入做多 在贵的卖出做空
+        basis    同一个交易所永续比现货贵 买现货空永续 只提示 现在只能交易永续
+'''
+
+# 数组里的价格/费率
+SPOT_BID, SPOT_ASK, PERP_BID, PERP_ASK, FUNDING, INTERVAL, UPDATED = range(7)
+FIELDS = 7
+HOURS_PER_YEAR = 24 * 365
+
+
+# BTC-USDT-SWAP / BTC-USDT / BTC_USDT -> BTC-USDT
+def pair_of(symbol):
+    base, quote = symbol.replace('_', '-').split('-')[:2]
+    return base + '-' + quote
+
+
+class ArbScanner:
+    def __init__(self, venues, pairs, min_funding_apr = 0.2, min_spread = 0.002, min_basis = 0.003, stale_after = 10, cooldown = 60, on_opportunity = None):
+        self.venues = list(venues)
+        self.pairs = [pair_of(pair) for pair in pairs]
+        self._venue_index = {venue: index for index, venue in enumerate(self.venues)}
+        self._pair_index = {pair: index for index, pair in enumerate(self.pairs)}
+        # (字段, 交易所, 币种) 没有数据是 NaN 资金费率周期默认 8 小时
+        self.data = np.full((FIELDS, len(self.venues), len(self.pairs)), np.nan)
+        self.data[INTERVAL] = 8.0
+        self.min_funding_apr = min_funding_apr
+        self.min_spread = min_spread
+        self.min_basis = min_basis
+        # 超过这么多秒没更新的行情不参与计算
+        self.stale_after = stale_after
+        # 同一个机会多少秒内不重复提示
+        self.cooldown = cooldown
+        self.on_opportunity = on_opportunity
+        self._columns = np.arange(len(self.pairs))
+        self._venue_rows = np.repeat(np.arange(len(self.venues))[:, None], len(self.pairs), axis=1)
+        # 每种机会上次提示的时间和两条腿的交易所 基差是 (交易所, 币种) 其他是 (币种,)
+        self._cooldowns = {}
+        for kind, shape in (('funding', len(self.pairs)), ('spread', len(self.pairs)), ('basis', self._venue_rows.shape)):
+            self._cooldowns[kind] = (np.full(shape, -np.inf), np.full(shape, -1), np.full(shape, -1))
+        self._scheduled = False
+        self.scans = 0
+
+    def _cell(self, venue, symbol):
+        venue_index = self._venue_index.get(venue)
+        pair_index = self._pair_index.get(pair_of(symbol))
+        if venue_index is None or pair_index is None:
+            return None
+        return venue_index, pair_index
+
+    def on_spot(self, venue, symbol, bid, ask):
+        self._update(venue, symbol, ((SPOT_BID, bid), (SPOT_ASK, ask)))
+
+    def on_perp(self, venue, symbol, bid, ask):
+        self._update(venue, symbol, ((PERP_BID, bid), (PERP_ASK, ask)))
+
+    # rate 是每个周期的费率 interval 是周期小时数
+    def on_funding(self, venue, symbol, rate, interval = None):
+        values = [(FUNDING, rate)]
+        if interval:
+            values.append((INTERVAL, interval))
+        self._update(venue, symbol, values)
+
+    def _update(self, venue, symbol, values):
+        cell = self._cell(venue, symbol)
+        if cell is None:
+            return
+        for field, value in values:
+            if value not in (None, ''):
+                self.data[field][cell] = float(value)
+        self.data[UPDATED][cell] = time.time()
+        self._schedule()
+
+    def _schedule(self):
+        if self._scheduled:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # 没有事件循环(回测/离线) 由调用方自己 scan
+            return
+        self._scheduled = True
+        loop.call_soon(self._run_scan)
+
+    def _run_scan(self):
+        self._scheduled = False
+        self.scan()
+
+    # 对所有币种算一遍 返回这次符合条件的机会
+    def scan(self, now = None):
+        self.scans += 1
+        now = time.time() if now is None else now
+        data = self.data
+        stale = ~(now - data[UPDATED] <= self.stale_after)
+        perp_bid = np.where(stale, np.nan, data[PERP_BID])
+        perp_ask = np.where(stale, np.nan, data[PERP_ASK])
+        spot_ask = np.where(stale, np.nan, data[SPOT_ASK])
+        funding = np.where(stale, np.nan, data[FUNDING] * (HOURS_PER_YEAR / data[INTERVAL]))
+        columns = self._columns
+        opportunities = []
+
+        # 资金费率差: 做空年化费率最高的交易所 做多最低的 两边都要有盘口价格 否则没法按名义价值算数量
+        high = np.argmax(np.where(np.isnan(funding), -np.inf, funding), axis=0)
+        low = np.argmin(np.where(np.isnan(funding), np.inf, funding), axis=0)
+        funding_diff = funding[high, columns] - funding[low, columns]
+        priced = np.isfinite(perp_ask[low, columns]) & np.isfinite(perp_bid[high, columns])
+        mask = self._due('funding', (funding_diff >= self.min_funding_apr) & (high != low) & priced, low, high, now)
+        for column in np.flatnonzero(mask):
+            opportunities.append(self._opportunity('funding', column, funding_diff[column], low[column], high[column], perp_ask, perp_bid))
+
+        # 永续价差: 在卖一最低的交易所买 在买一最高的交易所卖
+        buy = np.argmin(np.where(np.isnan(perp_ask), np.inf, perp_ask), axis=0)
+        sell = np.argmax(np.where(np.isnan(perp_bid), -np.inf, perp_bid), axis=0)
+        spread = perp_bid[sell, columns] / perp_ask[buy, columns] - 1
+        mask = self._due('spread', (spread >= self.min_spread) & (buy != sell), buy, sell, now)
+        for column in np.flatnonzero(mask):
+            opportunities.append(self._opportunity('spread', column, spread[column], buy[column], sell[column], perp_ask, perp_bid))
+
+        # 期现基差: 同一个交易所 永续买一比现货卖一高多少
+        basis = perp_bid / spot_ask - 1
+        mask = self._due('basis', basis >= self.min_basis, self._venue_rows, self._venue_rows, now)
+        for venue, column in zip(*np.nonzero(mask)):
+            opportunities.append(self._opportunity('basis', column, basis[venue, column], venue, venue, spot_ask, perp_bid))
+
+        if self.on_opportunity:
+            for item in opportunities:
+                self.on_opportunity(item)
+        return opportunities
+
+    # 同一个币种同一对交易所 cooldown 秒内只提示一次 换了交易所马上提示
+    def _due(self, kind, mask, long_index, short_index, now):
+        last, longs, shorts = self._cooldowns[kind]
+        mask = mask & ((now - last >= self.cooldown) | (longs != long_index) | (shorts != short_index))
+        last[mask] = now
+        longs[mask] = long_index[mask]
+        shorts[mask] = short_index[mask]
+        return mask
+
+    def _opportunity(self, kind, column, value, long_index, short_index, long_prices, short_prices):
+        return {
+            "kind": kind,
+            "pair": self.pairs[column],
+            "instId": self.pairs[column] + '-SWAP',
+            "value": float(value),
+            "long": self.venues[long_index],
+            "short": self.venues[short_index],
+            "longPx": float(long_prices[long_index, column]),
+            "shortPx": float(short_prices[short_index, column])
+        }
+
+
+# OKX 公共频道 tickers(现货和永续) 和 funding-rate 推送接到扫描器
+def subscribe_okx(websocket, scanner, venue = 'okx'):
+    def on_ticker(item):
+        if item['instId'].endswith('-SWAP'):
+            scanner.on_perp(venue, item['instId'], item.get('bidPx'), item.get('askPx'))
+        else:
+            scanner.on_spot(venue, item['instId'], item.get('bidPx'), item.get('askPx'))
+
+    def on_funding(item):
+        interval = None
+        if item.get('fundingTime') and item.get('nextFundingTime'):
+            interval = (int(item['nextFundingTime']) - int(item['fundingTime'])) / 3600000
+        scanner.on_funding(venue, item['instId'], item.get('fundingRate'), interval)
+
+    for pair in scanner.pairs:
+        websocket.subscribe({"channel": "tickers", "instId": pair}, on_ticker)
+        websocket.subscribe({"channel": "tickers", "instId": pair + '-SWAP'}, on_ticker)
+        websocket.subscribe({"channel": "funding-rate", "instId": pair + '-SWAP'}, on_funding)
+
+
+async def main(pairs = ('BTC-USDT', 'ETH-USDT', 'SOL-USDT')):
+    from exchanges.okx.okxWebsocket import OKXWebsocket, PUBLIC_WS_URL
+    from exchanges.mexc.mexcWebsocket import MEXCTickerWebsocket
+
+    def show(item):
+        print(f"[{item['kind']}] {item['pair']} {item['value']:.4%} 多 {item['long']} {item['longPx']} 空 {item['short']} {item['shortPx']}")
+
+    scanner = ArbScanner(['okx', 'mexc'], pairs, on_opportunity=show)
+    okx = OKXWebsocket(PUBLIC_WS_URL)
+    subscribe_okx(okx, scanner)
+    mexc = MEXCTickerWebsocket(pairs, scanner)
+    await asyncio.gather(okx.run_forever(), mexc.run_forever())
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
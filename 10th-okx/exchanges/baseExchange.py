@@ -0,0 +1,55 @@
+import asyncio
+
+
+# 交易所适配器接口 所有方法都是协程
+# 下单参数和返回的订单统一用 OKX v5 的字段(instId/side/posSide/sz/avgPx/fee/lever...)
+# 其他交易所在适配器里自己转换 出错时返回 {"code": 非 '0', "msg": ...}
+class BaseExchange:
+    name = None
+    # 账户状态缓存(exchanges/okx/accountState.py) 没有的交易所风控只看 kill switch
+    account = None
+
+    # 建立长连接 加载合约信息等
+    async def start(self):
+        pass
+
+    async def place_order(self, parameters, trace_id = None):
+        raise NotImplementedError
+
+    async def cancel_order(self, instId, ordId):
+        raise NotImplementedError
+
+    async def get_order(self, instId, ordId):
+        raise NotImplementedError
+
+    async def get_positions(self, instId = None):
+        raise NotImplementedError
+
+    async def set_leverage(self, parameters):
+        raise NotImplementedError
+
+    async def set_position_mode(self, posMode):
+        raise NotImplementedError
+
+    async def get_account_balance(self):
+        raise NotImplementedError
+
+    # 历史仓位 最新的在前 字段同 /api/v5/account/positions-history
+    async def get_positions_history(self, instId = None, limit = 100):
+        raise NotImplementedError
+
+    # 等 since(毫秒) 之后 (instId, posSide) 的平仓记录 字段同 positions-history 超时返回 None
+    # 默认等 timeout 秒后查最新一条 有推送的交易所自己实现
+    async def wait_close(self, instId, posSide, since, timeout = 15):
+        await asyncio.sleep(timeout)
+        result = await self.get_positions_history(instId, 1)
+        if result.get('code') == '0' and result['data']:
+            return result['data'][0]
+        return None
+
+    # 平仓后的收益信息 返回给 telegram 的文本
+    async def get_order_list(self):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
@@ -0,0 +1,314 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import queue
+import time
+from decimal import Decimal
+
+'''
+    多账户跟单
+    监听进程照常给主账户下单 同时把信号发给跟单工作进程 每个进程负责一部分账户
+    每个工作进程有自己的事件循环 同一进程的账户共用一个连接池 每个账户自己的限速器
+    工作进程只等下单回报(ordId) 不开私有 websocket 回报按信号汇总后交给监听进程
+    工作进程数默认等于 CPU 核数(不超过账户数) 账户多了加核就能摊开
+    信号只发给已就绪且还活着的进程 其他进程的账户记为跳过
+    进程退出马上告警 result_timeout 秒没回报的信号按已收到的结果汇总 不会一直挂着
+
+    ./config/accounts.json
+        [{"name": "sub1", "apikey": ..., "secretkey": ..., "Passphrase": ..., "size_multiplier": 1, "max_sz": "10"},
+         {"name": "sub2", "apikey": ..., "secretkey": ..., "Passphrase": ..., "sz": "2"}]
+    每个账户的数量: 配置了 sz 就固定张数 否则 信号数量 * size_multiplier(没配置用 trade 里的) 换算成张数 再按 max_sz 封顶
+
+    这个文件会在工作进程里重新导入 不要在顶层导入 telethon 等启动慢的模块
+'''
+
+# 发给工作进程的信号字段
+SIGNAL_FIELDS = ('market', 'operation', 'side', 'posSide', 'quantity', 'trace_id', 'clOrdId', 'expTime')
+
+
+def load_accounts(path = './config/accounts.json'):
+    if not os.path.isfile(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as file:
+        content = file.read().strip()
+    accounts = json.loads(content) if content else []
+    for index, account in enumerate(accounts):
+        for key in ('apikey', 'secretkey', 'Passphrase'):
+            if not account.get(key):
+                raise ValueError(f'accounts.json 第{index + 1}个账户缺少 {key}')
+        account.setdefault('name', 'account' + str(index + 1))
+    return accounts
+
+
+# 轮流分 每个进程的账户数最多差一个
+def shard_accounts(accounts, workers):
+    return [accounts[index::workers] for index in range(workers) if accounts[index::workers]]
+
+
+# 返回张数字符串 返回 None 表示这个账户不跟这一单
+def account_size(account, instruments, instId, quantity, size_multiplier):
+    if account.get('sz'):
+        sz = instruments.to_contracts(instId, account['sz'])
+    else:
+        multiplier = account.get('size_multiplier', size_multiplier)
+        coin = instruments.to_coin(instId, float(quantity) * float(multiplier))
+        sz = instruments.from_coin(instId, coin)
+    if account.get('max_sz') and Decimal(sz) > Decimal(str(account['max_sz'])):
+        sz = instruments.to_contracts(instId, account['max_sz'])
+    return sz if Decimal(sz) > 0 else None
+
+
+# 工作进程 负责一组账户
+class CopyWorker:
+    def __init__(self, index, accounts, trade, base_url, flag):
+        self.index = index
+        self.accounts = accounts
+        self.trade = trade
+        self.base_url = base_url
+        self.flag = flag
+        self.exchanges = {}
+        self._tasks = set()
+
+    async def setup(self):
+        import aiohttp
+        import global_const
+        from exchanges.okx.okx import OKXExchange
+        global_const._init()
+        global_const.set_value('flag', self.flag)
+        self.connector = aiohttp.TCPConnector(limit=200, keepalive_timeout=60, ttl_dns_cache=300)
+        for account in self.accounts:
+            exchange = OKXExchange(account['apikey'], account['secretkey'], account['Passphrase'], self.base_url, connector=self.connector)
+            # 一个账户一个信号只有一笔单 不用等合并窗口
+            exchange.batcher.window = 0
+            self.exchanges[account['name']] = exchange
+
+        # 合约信息是公共的 只拉一次 其他账户直接复用
+        first = next(iter(self.exchanges.values()))
+        await first.instruments.load_instruments()
+        shared = first.instruments.dump()
+        for exchange in self.exchanges.values():
+            exchange.instruments.restore(shared)
+        await self.exchanges[self.accounts[0]['name']].client.warm(4)
+        await asyncio.gather(*(self.sync_account(exchange) for exchange in self.exchanges.values()))
+
+    # 持仓模式和杠杆跟主账户的配置一致
+    async def sync_account(self, exchange):
+        trade = self.trade
+        await exchange.instruments.load_account(trade['instIds'], trade['tdMode'])
+        if exchange.instruments.posMode != trade['posMode']:
+            await exchange.set_position_mode(trade['posMode'])
+        for instId in trade['instIds']:
+            if exchange.instruments.get_leverage(instId, trade['tdMode']) != trade['lever']:
+                result = await exchange.client.post('/api/v5/account/set-leverage', {"instId": instId, "lever": trade['lever'], "mgnMode": trade['tdMode']})
+                if result['code'] == '0':
+                    exchange.instruments.set_leverage(instId, trade['tdMode'], trade['lever'])
+                else:
+                    print(result)
+
+    async def place(self, account, signal):
+        exchange = self.exchanges[account['name']]
+        sz = account_size(account, exchange.instruments, signal['market'], signal['quantity'], self.trade['size_multiplier'])
+        if sz is None:
+            return account['name'], {"code": '1', "msg": '数量为 0'}, 0.0
+        parameters = {
+            "instId": signal['market'],
+            "tdMode": self.trade['tdMode'],
+            "side": signal['side'],
+            "posSide": signal['posSide'],
+            "ordType": "market",
+            "sz": sz,
+            "clOrdId": signal['clOrdId']
+        }
+        if signal.get('expTime'):
+            parameters['expTime'] = signal['expTime']
+        begin = time.perf_counter()
+        try:
+            result = await exchange.submit_order(parameters)
+        except Exception as error:
+            result = {"code": '1', "msg": f'下单失败 {error!r}'}
+        return account['name'], result, (time.perf_counter() - begin) * 1000
+
+    async def execute(self, signal, results):
+        received = time.time()
+        placed = await asyncio.gather(*(self.place(account, signal) for account in self.accounts))
+        # 回报只带 ordId 和错误信息 跨进程传的越少越好
+        summary = [(name, result.get('msg') if 'code' in result else result['ordId'], 'code' not in result, elapsed) for name, result, elapsed in placed]
+        results.put(('result', self.index, signal['trace_id'], (received - signal['published']) * 1000, summary))
+
+    def create_task(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def run(self, signals, results):
+        await self.setup()
+        results.put(('ready', self.index, len(self.accounts)))
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                message = await loop.run_in_executor(None, signals.get)
+                if message is None:
+                    break
+                kind, payload = message
+                if kind == 'signal':
+                    self.create_task(self.execute(payload, results))
+                elif kind == 'config':
+                    self.trade = payload
+                    self.create_task(self.apply_config())
+        finally:
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+            for exchange in self.exchanges.values():
+                await exchange.close()
+            await self.connector.close()
+
+    async def apply_config(self):
+        await asyncio.gather(*(self.sync_account(exchange) for exchange in self.exchanges.values()))
+
+
+def run_worker(index, accounts, trade, signals, results, base_url, flag):
+    try:
+        asyncio.run(CopyWorker(index, accounts, trade, base_url, flag).run(signals, results))
+    except KeyboardInterrupt:
+        pass
+
+
+# 监听进程这边 启动工作进程 分发信号 汇总回报
+class CopyTradingPool:
+    def __init__(self, accounts, workers = None, base_url = None, flag = '1', report = print, alert = print, result_timeout = 30):
+        from exchanges.okx.okxClient import API_URL
+        self._accounts = accounts
+        self._workers = max(1, min(workers or os.cpu_count() or 1, len(accounts)))
+        self._base_url = base_url or API_URL
+        self._flag = flag
+        # 每个信号所有进程都回报后调用 report(文本) 工作进程退出时调用 alert(文本)
+        self.report = report
+        self.alert = alert
+        self.result_timeout = result_timeout
+        self._context = multiprocessing.get_context('spawn')
+        self._results = self._context.Queue()
+        self._queues = []
+        self._processes = []
+        # 每个进程负责的账户数
+        self._shards = []
+        # trace_id -> 还没回报的进程和汇总
+        self._pending = {}
+        self._ready = set()
+        self._dead = set()
+        self._closing = False
+        self.ready = 0
+
+    # 用 spawn 启动 不继承监听进程的事件循环和线程
+    def start(self, trade):
+        for index, shard in enumerate(shard_accounts(self._accounts, self._workers)):
+            signals = self._context.Queue()
+            process = self._context.Process(
+                target=run_worker,
+                args=(index, shard, trade.to_dict(), signals, self._results, self._base_url, self._flag),
+                name='copy-worker-' + str(index),
+                daemon=True
+            )
+            process.start()
+            self._queues.append(signals)
+            self._processes.append(process)
+            self._shards.append(len(shard))
+        print(f'跟单 {len(self._accounts)} 个账户 {len(self._processes)} 个工作进程')
+
+    # 只是放进队列 序列化和发送在队列自己的线程里 不阻塞下单
+    def publish(self, current_order, clOrdId):
+        signal = {key: current_order[key] for key in SIGNAL_FIELDS if key in current_order}
+        signal['clOrdId'] = clOrdId
+        signal['published'] = time.time()
+        workers = {index for index in self._ready if index not in self._dead}
+        skipped = [f'进程 {index} {"已退出" if index in self._dead else "未就绪"} 跳过 {self._shards[index]} 个账户' for index in range(len(self._queues)) if index not in workers]
+        self._pending[signal['trace_id']] = {"workers": workers, "ok": 0, "failed": [], "skipped": skipped, "slowest": 0.0, "lag": 0.0, "published": signal['published']}
+        if not workers:
+            self._finish(signal['trace_id'])
+            return
+        for index in workers:
+            self._queues[index].put(('signal', signal))
+
+    def apply_config(self, trade):
+        for signals in self._queues:
+            signals.put(('config', trade.to_dict()))
+
+    def _on_result(self, message):
+        if message[0] == 'ready':
+            self._ready.add(message[1])
+            self.ready = len(self._ready)
+            print(f'跟单进程 {message[1]} 就绪 {message[2]} 个账户')
+            return
+        _, index, trace_id, lag, summary = message
+        pending = self._pending.get(trace_id)
+        if pending is None:
+            return
+        pending['lag'] = max(pending['lag'], lag)
+        for name, detail, success, elapsed in summary:
+            if success:
+                pending['ok'] += 1
+            else:
+                pending['failed'].append(f'{name}: {detail}')
+            pending['slowest'] = max(pending['slowest'], elapsed)
+        pending['workers'].discard(index)
+        if not pending['workers']:
+            self._finish(trace_id)
+
+    def _finish(self, trace_id):
+        pending = self._pending.pop(trace_id)
+        text = f"跟单 成功 {pending['ok']} 失败 {len(pending['failed'])} 分发 {pending['lag']:.1f}ms 最慢下单 {pending['slowest']:.1f}ms"
+        if pending['failed']:
+            text += '\n' + '\n'.join(pending['failed'][:10])
+        if pending['skipped']:
+            text += '\n' + '\n'.join(pending['skipped'])
+        self.report(text)
+
+    # 退出的进程告警一次 它负责的信号不再等 超时的信号按已收到的结果汇总
+    def check_workers(self, now = None):
+        if self._closing:
+            return
+        for index, process in enumerate(self._processes):
+            if index in self._dead or process.is_alive():
+                continue
+            self._dead.add(index)
+            self._ready.discard(index)
+            self.ready = len(self._ready)
+            self.alert(f'跟单进程 {index} 已退出 exitcode {process.exitcode} {self._shards[index]} 个账户不再跟单')
+            for trace_id, pending in list(self._pending.items()):
+                if index in pending['workers']:
+                    pending['workers'].discard(index)
+                    pending['skipped'].append(f'进程 {index} 已退出 {self._shards[index]} 个账户没有回报')
+                    if not pending['workers']:
+                        self._finish(trace_id)
+        now = time.time() if now is None else now
+        for trace_id, pending in list(self._pending.items()):
+            if now - pending['published'] >= self.result_timeout:
+                pending['skipped'].extend(f'进程 {index} {self.result_timeout}秒没有回报' for index in sorted(pending['workers']))
+                self._finish(trace_id)
+
+    # 每 interval 秒检查一次进程 一直有回报时也会检查
+    async def collect_forever(self, interval = 1):
+        loop = asyncio.get_running_loop()
+        checked = time.monotonic()
+        while True:
+            try:
+                message = await loop.run_in_executor(None, self._results.get, True, interval)
+            except queue.Empty:
+                message = False
+            if message is None:
+                return
+            if message:
+                self._on_result(message)
+            if time.monotonic() - checked >= interval:
+                checked = time.monotonic()
+                self.check_workers()
+
+    async def close(self, timeout = 5):
+        self._closing = True
+        for signals in self._queues:
+            signals.put(None)
+        for process in self._processes:
+            await asyncio.to_thread(process.join, timeout)
+            if process.is_alive():
+                process.terminate()
+        self._results.put(None)
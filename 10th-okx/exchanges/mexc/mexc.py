@@ -1,75 +1,275 @@
-import okx.Account as Account
-import okx.Trade as Trade
-from utils.time import format_timestamp
-import global_const
-
-
-class MEXCExchange():
-    def __init__(self, api_key, api_secret, passphrase):
-        flag = global_const.get_value('flag')  
-        self.accountAPI = Account.AccountAPI(api_key, api_secret, passphrase, False, flag, debug=False)
-        self.TradeAPI = Trade.TradeAPI(api_key, api_secret, passphrase, False, flag, debug=False)
-        
-    def get_account_balance(self):
-        result = self.accountAPI.get_account_balance()
-        return result
-    
-    def set_leverage(self, parameters):
-        result = self.accountAPI.set_leverage(**parameters)
-        if result["code"] == '0':
-            for item in result['data']:
-                print("\n" + '杠杆设置成功,信息如下')
-                print('instId: ' + item['instId'])
-                print('lever: ' + item['lever'])
-                print('mgnMode: ' + item['mgnMode'])
-                print('posSide: ' + item['posSide'])
-                print('=======================')
+import asyncio
+import hashlib
+import hmac
+import json
+import time
+from decimal import Decimal
+from urllib.parse import urlencode
+
+import aiohttp
+
+from exchanges.baseExchange import BaseExchange
+from exchanges.okx.instruments import InstrumentRegistry
+from utils.recorder import recorder, now_ms
+
+API_URL = 'https://contract.mexc.com'
+
+# OKX 的方向 -> MEXC 的 side  1 开多 2 平空 3 开空 4 平多
+SIDES = {
+    ('buy', 'long'): 1,
+    ('buy', 'short'): 2,
+    ('sell', 'short'): 3,
+    ('sell', 'long'): 4,
+}
+OKX_SIDES = {value: key for key, value in SIDES.items()}
+# MEXC 订单状态 1 待报 2 未完成 3 已完成 4 已撤销 5 无效
+STATES = {1: 'live', 2: 'partially_filled', 3: 'filled', 4: 'canceled', 5: 'canceled'}
+POS_MODES = {1: 'long_short_mode', 2: 'net_mode'}
+
+
+# BTC-USDT-SWAP -> BTC_USDT
+def to_symbol(instId):
+    base, quote = instId.split('-')[:2]
+    return base + '_' + quote
+
+
+def to_instId(symbol):
+    return symbol.replace('_', '-') + '-SWAP'
+
+
+# MEXC 合约 REST 客户端 一个实例共用一个长连接池
+class MEXCClient:
+    def __init__(self, api_key, api_secret, base_url = API_URL, timeout = 10):
+        self._api_key = api_key
+        self._api_secret = api_secret
+        self._base_url = base_url
+        self._timeout = timeout
+        self._session = None
+
+    async def get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=100, keepalive_timeout=60, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(
+                self._base_url,
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self._timeout)
+            )
+        return self._session
+
+    def _headers(self, param_string, auth):
+        headers = {'Content-Type': 'application/json'}
+        if auth:
+            timestamp = str(int(time.time() * 1000))
+            message = self._api_key + timestamp + param_string
+            headers['ApiKey'] = self._api_key
+            headers['Request-Time'] = timestamp
+            headers['Signature'] = hmac.new(self._api_secret.encode('utf-8'), message.encode('utf-8'), hashlib.sha256).hexdigest()
+        return headers
+
+    async def request(self, method, path, params = None, auth = True):
+        session = await self.get_session()
+        body = ''
+        request_path = path
+        if method == 'GET':
+            if params:
+                query = urlencode(sorted((key, value) for key, value in params.items() if value is not None))
+                request_path = path + '?' + query
+                param_string = query
+            else:
+                param_string = ''
         else:
+            body = json.dumps(params) if params is not None else ''
+            param_string = body
+
+        started = now_ms()
+        begin = time.perf_counter()
+        async with session.request(method, request_path, data=body or None, headers=self._headers(param_string, auth)) as response:
+            result = await response.json(content_type=None)
+        if recorder.enabled:
+            recorder.record_exchange('mexc', method, path, params, result, started, (time.perf_counter() - begin) * 1000)
+        if not result.get('success'):
+            return {"code": str(result.get('code', '1')), "msg": result.get('message', ''), "data": result.get('data')}
+        return {"code": '0', "msg": '', "data": result.get('data')}
+
+    # 提前建好几条 TLS 长连接 第一笔下单不用再握手
+    async def warm(self, connections = 2):
+        session = await self.get_session()
+
+        async def ping():
+            async with session.get('/api/v1/contract/ping') as response:
+                await response.read()
+
+        await asyncio.gather(*(ping() for _ in range(connections)), return_exceptions=True)
+
+    # 空闲连接超过 keepalive_timeout 会被关掉 定时 ping 保持连接
+    async def keep_warm(self, interval = 30, connections = 2):
+        while True:
+            await asyncio.sleep(interval)
+            await self.warm(connections)
+
+    async def get(self, path, params = None, auth = True):
+        return await self.request('GET', path, params, auth)
+
+    async def post(self, path, params = None, auth = True):
+        return await self.request('POST', path, params, auth)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            await asyncio.sleep(0.25)
+
+
+# MEXC 的合约信息换成和 OKX 一样的字段 张数换算逻辑复用 InstrumentRegistry
+class MEXCInstruments(InstrumentRegistry):
+    async def load_instruments(self):
+        result = await self._client.get('/api/v1/contract/detail', auth=False)
+        if result['code'] != '0':
             print(result)
-    
-    def place_order(self, parameters):
-        order_result = self.TradeAPI.place_order(**parameters)
-        if order_result['code'] == '0':
-            result_data = order_result['data']
-            for item in result_data:
-                order_id = item['ordId']
-                if order_id:
-                    self.get_order(parameters['instId'], order_id)
-                    self.get_order_list()
-        else:
+            return
+        instruments = {}
+        for item in result['data']:
+            instId = to_instId(item['symbol'])
+            instruments[instId] = {
+                "instId": instId,
+                "ctVal": Decimal(str(item['contractSize'])),
+                "lotSz": Decimal(str(item['volUnit'])),
+                "minSz": Decimal(str(item['minVol'])),
+                "tickSz": Decimal(str(item['priceUnit'])),
+                "maxLever": int(item['maxLeverage']),
+                "state": 'live' if item.get('state', 0) == 0 else 'suspend'
+            }
+        self._instruments = instruments
+        self.updated_at = time.time()
+
+    async def load_account(self, instIds, mgnMode):
+        config = await self._client.get('/api/v1/private/position/position_mode')
+        if config['code'] == '0':
+            self.posMode = POS_MODES.get(config['data'])
+        for instId in instIds:
+            result = await self._client.get('/api/v1/private/position/leverage', {"symbol": to_symbol(instId)})
+            if result['code'] != '0':
+                print(result)
+                continue
+            for item in result['data']:
+                item_mgnMode = 'isolated' if item['openType'] == 1 else 'cross'
+                self._leverage[(instId, item_mgnMode)] = str(item['leverage'])
+
+
+class MEXCExchange(BaseExchange):
+    name = 'mexc'
+
+    def __init__(self, api_key, api_secret, passphrase = None, base_url = API_URL):
+        self.client = MEXCClient(api_key, api_secret, base_url)
+        self.instruments = MEXCInstruments(self.client)
+        # 市价单提交后查成交的次数和间隔
+        self.fill_retries = 5
+        self.fill_interval = 0.2
+        self._warm_task = None
+
+    async def start(self):
+        if self._warm_task is None:
+            await self.client.warm()
+            self._warm_task = asyncio.create_task(self.client.keep_warm())
+
+    def _order_item(self, data):
+        side, posSide = OKX_SIDES.get(data['side'], ('', ''))
+        return {
+            "instId": to_instId(data['symbol']),
+            "ordId": str(data['orderId']),
+            "clOrdId": data.get('externalOid', ''),
+            "side": side,
+            "posSide": posSide,
+            "sz": str(data.get('dealVol') or data['vol']),
+            "avgPx": str(data.get('dealAvgPrice', '')),
+            "fee": str(-(float(data.get('takerFee', 0)) + float(data.get('makerFee', 0)))),
+            "lever": str(data['leverage']),
+            "state": STATES.get(data['state'], ''),
+            "ts": str(data['createTime'])
+        }
+
+    async def get_account_balance(self):
+        result = await self.client.get('/api/v1/private/account/assets')
+        return result
+
+    async def set_leverage(self, parameters):
+        openType = 1 if parameters['mgnMode'] == 'isolated' else 2
+        result = None
+        # 双向持仓下多空两边的杠杆要分别设置
+        for positionType in (1, 2):
+            result = await self.client.post('/api/v1/private/position/change_leverage', {
+                "symbol": to_symbol(parameters['instId']),
+                "leverage": int(parameters['lever']),
+                "openType": openType,
+                "positionType": positionType
+            })
+            if result['code'] != '0':
+                print(result)
+                return result
+        print('MEXC 杠杆设置成功 ' + parameters['instId'] + ' ' + str(parameters['lever']))
+        self.instruments.set_leverage(parameters['instId'], parameters['mgnMode'], parameters['lever'])
+        return result
+
+    async def set_position_mode(self, posMode):
+        positionMode = 1 if posMode == 'long_short_mode' else 2
+        result = await self.client.post('/api/v1/private/position/change_position_mode', {"positionMode": positionMode})
+        if result['code'] == '0':
+            self.instruments.posMode = posMode
+        return result
+
+    async def place_order(self, parameters, trace_id = None):
+        instId = parameters['instId']
+        lever = self.instruments.get_leverage(instId, parameters['tdMode'])
+        order = {
+            "symbol": to_symbol(instId),
+            "vol": float(parameters['sz']),
+            "side": SIDES[(parameters['side'], parameters['posSide'])],
+            "type": 5 if parameters['ordType'] == 'market' else 1,
+            "openType": 1 if parameters['tdMode'] == 'isolated' else 2
+        }
+        if parameters.get('px'):
+            order['price'] = float(parameters['px'])
+        if lever:
+            order['leverage'] = int(lever)
+        if parameters.get('clOrdId'):
+            order['externalOid'] = parameters['clOrdId']
+
+        order_result = await self.client.post('/api/v1/private/order/submit', order)
+        if order_result['code'] != '0':
             print(order_result)
-        
-
-    def get_order(self, instId, ordId):
-        current_order_result = self.TradeAPI.get_order(instId, ordId)  
-        if current_order_result['code'] == '0':
-            result_data = current_order_result['data']
-            for item in result_data:
-              print('id:' + item['ordId'])
-              print('杠杆:' + item['lever'])
-              print('方向:' + item['posSide'])
-              print('张数:' + item['sz'])
-              print('时间:' + format_timestamp(item['fillTime']))
-              print('-----------------------')
-
-
-    def get_order_list(self):
-        order_list_result = self.accountAPI.get_positions()
-        if order_list_result['code'] == '0':
-            positions_data = order_list_result['data']
-            for item in positions_data:
-                print('**********************')
-                print('创建时间:' + format_timestamp(item['cTime']))
-                print('指数价格:' + item['idxPx'])
-                print('可用持仓数量( / 1000):' + item['availPos'])
-                print('平均成交价:' + item['avgPx'])
-                print('保证金率(*100):' + item['mgnRatio'])
-                print('强平价格:' + item['liqPx'])
-                print('杠杆:' + item['lever'])
-                print('未实现盈亏:' + item['uplLastPx'])
-                print('未实现盈亏比例:' + item['uplRatioLastPx'])
-                print('标记价格:' + item['markPx'])
-                print('手续费:' + item['fee'])
-                print('最新成交价:' + item['last'])
-                print('实现盈亏:' + item['realizedPnl'])
-                print('**********************')
\ No newline at end of file
+            return order_result
+
+        ordId = str(order_result['data'])
+        order_item = await self.get_order(instId, ordId)
+        for _ in range(self.fill_retries):
+            if 'code' in order_item or order_item['state'] == 'filled' or parameters['ordType'] != 'market':
+                break
+            await asyncio.sleep(self.fill_interval)
+            order_item = await self.get_order(instId, ordId)
+        return order_item
+
+    async def cancel_order(self, instId, ordId):
+        result = await self.client.post('/api/v1/private/order/cancel', [int(ordId)])
+        return result
+
+    async def get_order(self, instId, ordId):
+        result = await self.client.get('/api/v1/private/order/get/' + str(ordId))
+        if result['code'] != '0':
+            return result
+        return self._order_item(result['data'])
+
+    async def get_positions(self, instId = None):
+        result = await self.client.get('/api/v1/private/position/open_positions', {"symbol": to_symbol(instId) if instId else None})
+        return result
+
+    async def get_order_list(self):
+        result = await self.client.get('/api/v1/private/position/list/history_positions', {"page_num": 1, "page_size": 1})
+        if result['code'] != '0' or not result['data']:
+            return str(result)
+        position = result['data'][0]
+        return f"状态：  全部平仓\n最终收益:   {position.get('realised')}\n平仓收益:   {position.get('closeProfitLoss')}\n"
+
+    async def close(self):
+        self.instruments.stop_refresh()
+        if self._warm_task:
+            self._warm_task.cancel()
+        await self.client.close()
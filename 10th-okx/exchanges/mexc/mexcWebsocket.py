@@ -0,0 +1,65 @@
+import asyncio
+import json
+
+import aiohttp
+
+from exchanges.mexc.mexc import to_symbol
+from utils.eventLog import events
+
+WS_URL = 'wss://contract.mexc.com/edge'
+
+
+# MEXC 合约公共频道 ticker 推送里有买一卖一和资金费率 接到套利扫描器
+# 断线自动重连 每 15 秒发一次 ping
+class MEXCTickerWebsocket:
+    def __init__(self, pairs, scanner, venue = 'mexc', url = WS_URL, ping_interval = 15):
+        self._symbols = [to_symbol(pair) for pair in pairs]
+        self._scanner = scanner
+        self._venue = venue
+        self._url = url
+        self._ping_interval = ping_interval
+
+    def _dispatch(self, message):
+        message = json.loads(message)
+        if message.get('channel') != 'push.ticker':
+            return
+        item = message['data']
+        self._scanner.on_perp(self._venue, item['symbol'], item.get('bid1'), item.get('ask1'))
+        if item.get('fundingRate') is not None:
+            self._scanner.on_funding(self._venue, item['symbol'], item['fundingRate'])
+
+    # 单条推送解析或者扫描器出错只记日志 不让 run_forever 退出 不然扫描器一直用冻住的 MEXC 价格
+    def _on_message(self, data):
+        try:
+            self._dispatch(data)
+        except Exception as error:
+            events.error('mexc', 'message_failed', venue=self._venue, error=repr(error), data=data[:200])
+
+    async def _keepalive(self, ws):
+        while not ws.closed:
+            await asyncio.sleep(self._ping_interval)
+            await ws.send_json({"method": "ping"})
+
+    async def run_forever(self):
+        delay = 1
+        async with aiohttp.ClientSession() as session:
+            while True:
+                keepalive = None
+                try:
+                    async with session.ws_connect(self._url) as ws:
+                        for symbol in self._symbols:
+                            await ws.send_json({"method": "sub.ticker", "param": {"symbol": symbol}})
+                        delay = 1
+                        keepalive = asyncio.create_task(self._keepalive(ws))
+                        async for message in ws:
+                            if message.type == aiohttp.WSMsgType.TEXT:
+                                self._on_message(message.data)
+                            elif message.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                                break
+                except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                    events.warning('mexc', 'disconnected', venue=self._venue, error=repr(error), delay=delay)
+                finally:
+                    if keepalive:
+                        keepalive.cancel()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
@@ -0,0 +1,96 @@
+'''
+    账户状态缓存 account / positions 频道推送更新 下单前的风控检查直接读内存 不走 REST
+    account 推送: 权益 totalEq 可用保证金 availEq(USDT) 维持保证金率 mgnRatio
+    positions 推送: 每个 (instId, posSide) 的持仓张数/名义价值/标记价格 总名义价值和持仓数增量维护
+    启动时 prime 用 REST 拉一次余额/持仓/标记价格 之后只靠推送
+    prime 完成前先用交易记录里恢复的持仓(restore)占位 风控不会把已有仓位当成空仓
+'''
+
+PRICE_PATH = '/api/v5/public/mark-price'
+
+
+def to_float(value, default = None):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class AccountState:
+    def __init__(self, client = None, ccy = 'USDT'):
+        self.client = client
+        self.ccy = ccy
+        self.equity = None
+        self.available = None
+        # OKX 的 mgnRatio 越大越安全 没有持仓时为空
+        self.margin_ratio = None
+        # (instId, posSide) -> {"pos", "notional", "markPx", "lever"}
+        self.positions = {}
+        # 所有持仓名义价值(USDT)之和
+        self.notional = 0.0
+        # instId -> 最近的标记价格/成交价 新开仓算名义价值用
+        self.prices = {}
+        self.updated = 0
+
+    async def prime(self):
+        balance = await self.client.get('/api/v5/account/balance')
+        if balance['code'] == '0' and balance['data']:
+            self.on_account(balance['data'][0])
+        positions = await self.client.get('/api/v5/account/positions', {"instType": 'SWAP'})
+        if positions['code'] == '0':
+            # 交易所的持仓是准的 替换掉 restore 放进来的
+            self.positions = {}
+            self.notional = 0.0
+            for item in positions['data']:
+                self.on_position(item)
+        marks = await self.client.get(PRICE_PATH, {"instType": 'SWAP'})
+        if marks['code'] == '0':
+            for item in marks['data']:
+                self.set_price(item['instId'], item.get('markPx'))
+
+    # account 频道推送
+    def on_account(self, item):
+        self.equity = to_float(item.get('totalEq'), self.equity)
+        self.margin_ratio = to_float(item.get('mgnRatio'))
+        for detail in item.get('details', ()):
+            if detail.get('ccy') == self.ccy:
+                self.available = to_float(detail.get('availEq') or detail.get('availBal'), self.available)
+        self.updated = int(item.get('uTime') or 0) or self.updated
+
+    # 重启后用 journal 恢复持仓 positions 是 journal.open_positions() 的记录 pos 是张数 名义价值先按开仓均价算
+    def restore(self, positions, instruments):
+        for position in positions:
+            coin = instruments.to_coin(position['instId'], abs(position['pos']))
+            self.on_position({"instId": position['instId'], "posSide": position['posSide'], "pos": position['pos'], "notionalUsd": coin * position['avgPx'], "markPx": position['avgPx']})
+
+    # positions 频道推送 pos 为 0 的是已经平掉的
+    def on_position(self, item):
+        key = (item['instId'], item.get('posSide', 'net'))
+        old = self.positions.pop(key, None)
+        if old:
+            self.notional -= old['notional']
+        self.set_price(item['instId'], item.get('markPx'))
+        pos = to_float(item.get('pos'), 0.0)
+        if pos:
+            position = {
+                "pos": pos,
+                "notional": abs(to_float(item.get('notionalUsd'), 0.0)),
+                "markPx": to_float(item.get('markPx')),
+                "lever": to_float(item.get('lever'))
+            }
+            self.positions[key] = position
+            self.notional += position['notional']
+        self.updated = int(item.get('uTime') or 0) or self.updated
+
+    # orders 频道推送 成交价也当作最新价格
+    def on_order(self, item):
+        if item.get('state') in ('filled', 'partially_filled'):
+            self.set_price(item['instId'], item.get('avgPx'))
+
+    def set_price(self, instId, price):
+        price = to_float(price)
+        if price:
+            self.prices[instId] = price
+
+    def has_position(self, instId, posSide):
+        return (instId, posSide) in self.positions
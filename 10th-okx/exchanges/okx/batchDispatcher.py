@@ -0,0 +1,87 @@
+import asyncio
+
+# OKX 批量下单一次最多 20 笔
+MAX_BATCH = 20
+
+
+# 下单合并 一小段时间(window 秒)内提交的订单合成一次 batch-orders 请求
+# 每笔订单拿到自己的回报 {"ordId", "clOrdId", "sCode", "sMsg", "ts"} 失败时是 {"code", "msg"}
+# 没有排队和在途的下单时立即发 单笔信号不等窗口 有请求在途时后来的订单排队
+# 在途请求都回来或者窗口到了就合并发出 窗口内只有一笔就走普通下单接口 window 为 0 时不合并
+class BatchDispatcher:
+    def __init__(self, client, window = 0.005, max_batch = MAX_BATCH):
+        self._client = client
+        self.window = window
+        self.max_batch = min(max_batch, MAX_BATCH)
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+        # 已发出还没回报的请求数
+        self._inflight = 0
+        # 发出去的请求数和订单数 看合并效果
+        self.requests = 0
+        self.orders = 0
+
+    async def submit(self, parameters):
+        future = asyncio.get_running_loop().create_future()
+        if not self.window or (not self._pending and not self._inflight):
+            await self._dispatch([(parameters, future)])
+            return future.result()
+        self._pending.append((parameters, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+        if self._pending:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        if batch:
+            task = asyncio.create_task(self._dispatch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, batch):
+        self._inflight += 1
+        try:
+            results = await self._send([parameters for parameters, _ in batch])
+        except Exception as error:
+            # -1 表示请求没有拿到回报(超时/断线) 订单可能已经下了 带 clOrdId 的可以安全重试
+            results = [{"code": '-1', "msg": f'下单失败 {error!r}'}] * len(batch)
+        finally:
+            self._inflight -= 1
+            if not self._inflight and self._pending:
+                self._flush()
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    # 返回和 orders 一一对应的回报
+    async def _send(self, orders):
+        self.requests += 1
+        self.orders += len(orders)
+        if len(orders) == 1:
+            result = await self._client.post('/api/v5/trade/order', orders[0])
+        else:
+            result = await self._client.post('/api/v5/trade/batch-orders', orders)
+
+        data = result.get('data') or []
+        # 整个请求失败且没有逐笔回报 每笔都返回同一个错误
+        if len(data) != len(orders):
+            return [{"code": result.get('code', '1'), "msg": result.get('msg', '')}] * len(orders)
+
+        # 回报和请求顺序一致 有 clOrdId 时再按 clOrdId 校对一次
+        by_clOrdId = {item['clOrdId']: item for item in data if item.get('clOrdId')}
+        results = []
+        for parameters, item in zip(orders, data):
+            item = by_clOrdId.get(parameters.get('clOrdId'), item)
+            if item.get('sCode', '0') != '0':
+                results.append({"code": item['sCode'], "msg": item.get('sMsg', '')})
+            else:
+                results.append(item)
+        return results
@@ -0,0 +1,164 @@
+import asyncio
+import time
+from decimal import Decimal, ROUND_DOWN
+
+
+# 合约元数据缓存 启动时加载一次 之后后台按 ttl 刷新
+# 信号数量换算成张数只查内存 不走网络
+class InstrumentRegistry:
+    def __init__(self, client, instType = 'SWAP', ttl = 300):
+        self._client = client
+        self._instType = instType
+        self._ttl = ttl
+        self._instruments = {}
+        self._leverage = {}
+        self.posMode = None
+        self.updated_at = 0
+        # 合约信息是从本地缓存恢复的 启动后台刷新时先拉一次最新的
+        self.restored = False
+        self._refresh_task = None
+
+    async def load_instruments(self):
+        result = await self._client.get('/api/v5/public/instruments', {"instType": self._instType}, auth=False)
+        if result['code'] != '0':
+            print(result)
+            return
+        instruments = {}
+        for item in result['data']:
+            instruments[item['instId']] = {
+                "instId": item['instId'],
+                "ctVal": Decimal(item['ctVal']),
+                "lotSz": Decimal(item['lotSz']),
+                "minSz": Decimal(item['minSz']),
+                "tickSz": Decimal(item['tickSz']),
+                "maxLever": int(float(item['lever'] or 0)),
+                "state": item.get('state', 'live')
+            }
+        self._instruments = instruments
+        self.updated_at = time.time()
+
+    # 当前杠杆和持仓模式是账户级别的 只查关心的合约
+    async def load_account(self, instIds, mgnMode):
+        config = await self._client.get('/api/v5/account/config')
+        if config['code'] == '0':
+            self.posMode = config['data'][0]['posMode']
+        if not instIds:
+            return
+        result = await self._client.get('/api/v5/account/leverage-info', {"instId": ','.join(instIds), "mgnMode": mgnMode})
+        if result['code'] == '0':
+            for item in result['data']:
+                self._leverage[(item['instId'], item['mgnMode'])] = item['lever']
+        else:
+            print(result)
+
+    async def load(self, instIds = (), mgnMode = 'cross'):
+        # 没有客户端的是手动 add 的本地合约表 不用加载
+        if self._client is None:
+            return
+        # 合约信息用了缓存只查账户设置 合约信息交给 start_refresh 在后台更新
+        if self.restored:
+            await self.load_account(list(instIds), mgnMode)
+            return
+        await asyncio.gather(self.load_instruments(), self.load_account(list(instIds), mgnMode))
+
+    # 存到本地缓存的格式 Decimal 转成字符串
+    def dump(self):
+        return {
+            "updated_at": self.updated_at,
+            "instruments": {
+                instId: {key: str(value) if isinstance(value, Decimal) else value for key, value in item.items()}
+                for instId, item in self._instruments.items()
+            }
+        }
+
+    # 缓存超过 max_age 秒就不用 返回是否恢复成功
+    def restore(self, data, max_age = 86400):
+        if not data or not data.get('instruments') or time.time() - data.get('updated_at', 0) > max_age:
+            return False
+        instruments = {}
+        for instId, item in data['instruments'].items():
+            instruments[instId] = {
+                **item,
+                "ctVal": Decimal(item['ctVal']),
+                "lotSz": Decimal(item['lotSz']),
+                "minSz": Decimal(item['minSz']),
+                "tickSz": Decimal(item['tickSz'])
+            }
+        self._instruments = instruments
+        self.updated_at = data['updated_at']
+        self.restored = True
+        return True
+
+    async def refresh_forever(self):
+        while True:
+            if self.restored:
+                self.restored = False
+            else:
+                await asyncio.sleep(self._ttl)
+            try:
+                await self.load_instruments()
+            except Exception as error:
+                print('合约信息刷新失败: ' + str(error))
+
+    def start_refresh(self):
+        if self._refresh_task is None and self._client is not None:
+            self._refresh_task = asyncio.create_task(self.refresh_forever())
+
+    def stop_refresh(self):
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+
+    # 手动加一个合约 没有网络的模拟/回放环境用
+    def add(self, instId, ctVal, lotSz = '1', minSz = '1', tickSz = '0.1', maxLever = 100):
+        self._instruments[instId] = {
+            "instId": instId,
+            "ctVal": Decimal(str(ctVal)),
+            "lotSz": Decimal(str(lotSz)),
+            "minSz": Decimal(str(minSz)),
+            "tickSz": Decimal(str(tickSz)),
+            "maxLever": maxLever,
+            "state": 'live'
+        }
+
+    def get(self, instId):
+        return self._instruments.get(instId)
+
+    def get_leverage(self, instId, mgnMode = 'cross'):
+        return self._leverage.get((instId, mgnMode))
+
+    def set_leverage(self, instId, mgnMode, lever):
+        self._leverage[(instId, mgnMode)] = str(lever)
+
+    # 张数按 lotSz 向下取整 不足 minSz 按 minSz 没有元数据时原样返回
+    def to_contracts(self, instId, contracts):
+        instrument = self._instruments.get(instId)
+        contracts = Decimal(str(contracts))
+        if instrument is None:
+            return str(contracts)
+        lotSz = instrument['lotSz']
+        contracts = (contracts / lotSz).to_integral_value(ROUND_DOWN) * lotSz
+        contracts = max(contracts, instrument['minSz'])
+        return '{:f}'.format(contracts.normalize())
+
+    # 张数换算成币的数量 例如 BTC-USDT-SWAP 1 张 = 0.01 BTC
+    def to_coin(self, instId, sz):
+        instrument = self._instruments.get(instId)
+        if instrument is None:
+            return float(sz)
+        return float(Decimal(str(sz)) * instrument['ctVal'])
+
+    # 币的数量换算成张数 多个交易所开同样的仓位时用
+    def from_coin(self, instId, coin):
+        instrument = self._instruments.get(instId)
+        if instrument is None:
+            return str(coin)
+        return self.to_contracts(instId, Decimal(str(coin)) / instrument['ctVal'])
+
+    # 价格按 tickSz 取整
+    def round_price(self, instId, px):
+        instrument = self._instruments.get(instId)
+        if instrument is None:
+            return str(px)
+        tickSz = instrument['tickSz']
+        return '{:f}'.format(((Decimal(str(px)) / tickSz).to_integral_value() * tickSz).normalize())
@@ -1,50 +1,138 @@
-import okx.Account as Account
-import okx.Trade as Trade
+import asyncio
+from exchanges.baseExchange import BaseExchange
+from exchanges.okx.okxClient import OKXClient, API_URL
+from exchanges.okx.instruments import InstrumentRegistry
+from exchanges.okx.batchDispatcher import BatchDispatcher
+from exchanges.okx.pnlReconciler import PnlReconciler
+from exchanges.okx.accountState import AccountState
+from exchanges.okx.okxWebsocket import OKXWebsocket, OrderStateCache, PRIVATE_WS_URL, DEMO_PRIVATE_WS_URL
 from utils.time import format_timestamp
+from utils.latency import tracer
+from utils.eventLog import events
+from utils.clock import clock
 import global_const
 
-class OKXExchange():
-    def __init__(self, api_key, api_secret, passphrase):
-        flag = global_const.get_value('flag')  
-        self.accountAPI = Account.AccountAPI(api_key, api_secret, passphrase, False, flag, debug=False)
-        self.TradeAPI = Trade.TradeAPI(api_key, api_secret, passphrase, False, flag, debug=False)
-        
-    def get_account_balance(self):
-        result = self.accountAPI.get_account_balance()
+# 请求没有回报/限流/系统繁忙/接口超时 可以带同一个 clOrdId 重试
+RETRY_CODES = ('-1', '50001', '50004', '50011', '50013', '50026')
+DUPLICATED_CLORDID = '51016'
+
+
+class OKXExchange(BaseExchange):
+    name = 'okx'
+
+    def __init__(self, api_key, api_secret, passphrase, base_url = API_URL, ws_url = None, connector = None):
+        flag = global_const.get_value('flag')
+        self.client = OKXClient(api_key, api_secret, passphrase, flag, base_url, connector=connector)
+        self.instruments = InstrumentRegistry(self.client)
+        self.batcher = BatchDispatcher(self.client)
+        # orders 频道推送的订单状态 下单后直接等推送 不再 REST 轮询
+        self.orders = OrderStateCache()
+        self.websocket = OKXWebsocket(ws_url or (DEMO_PRIVATE_WS_URL if flag == '1' else PRIVATE_WS_URL), api_key, api_secret, passphrase)
+        self.websocket.subscribe({"channel": "orders", "instType": "SWAP"}, self.orders.update)
+        # positions 频道推送平仓后 按 posId 增量查平仓收益
+        self.reconciler = PnlReconciler(self.client)
+        self.websocket.subscribe({"channel": "positions", "instType": "SWAP"}, self.reconciler.on_position)
+        # 权益/可用保证金/保证金率/持仓 下单前风控直接读这里
+        self.account = AccountState(self.client)
+        self.websocket.subscribe({"channel": "account"}, self.account.on_account)
+        self.websocket.subscribe({"channel": "positions", "instType": "SWAP"}, self.account.on_position)
+        self.websocket.subscribe({"channel": "orders", "instType": "SWAP"}, self.account.on_order)
+        self._websocket_task = None
+        self._prime_task = None
+        self._warm_task = None
+        # 等待成交推送的超时时间(秒) 超时后退回 REST 查询
+        self.fill_timeout = 3
+        # 下单失败可重试的次数和第一次重试的间隔(秒)
+        self.retries = 2
+        self.retry_delay = 0.1
+
+    async def start(self):
+        if self._websocket_task is None:
+            self._websocket_task = asyncio.create_task(self.websocket.run_forever())
+        if self._prime_task is None:
+            self._prime_task = asyncio.create_task(self.prime())
+        # 和交易所对时 所有账户共用一个时钟
+        clock.start(self.client.sample_clock)
+        if self._warm_task is None:
+            await self.client.warm()
+            self._warm_task = asyncio.create_task(self.client.keep_warm())
+
+    # 收益对账的游标和账户状态 推送之前先用 REST 拉一次
+    async def prime(self):
+        await asyncio.gather(self.reconciler.prime(), self.account.prime())
+
+    async def cancel_order(self, instId, ordId):
+        result = await self.client.post('/api/v5/trade/cancel-order', {"instId": instId, "ordId": ordId})
         return result
-    
-    def set_leverage(self, parameters):
-        result = self.accountAPI.set_leverage(**parameters)
+
+    async def get_positions(self, instId = None):
+        result = await self.client.get('/api/v5/account/positions', {"instType": 'SWAP', "instId": instId})
+        return result
+
+    async def get_account_balance(self):
+        result = await self.client.get('/api/v5/account/balance')
+        return result
+
+    async def set_leverage(self, parameters):
+        result = await self.client.post('/api/v5/account/set-leverage', parameters)
         if result["code"] == '0':
             for item in result['data']:
-                print("\n" + '杠杆设置成功,信息如下')
-                print('instId: ' + item['instId'])
-                print('lever: ' + item['lever'])
-                print('mgnMode: ' + item['mgnMode'])
-                print('posSide: ' + item['posSide'])
-                print('=======================')
-        else:
-            print(result)
-    
-    def place_order(self, parameters):
-
-        order_result = self.TradeAPI.place_order(**parameters)
-        if order_result['code'] == '0':
-            result_data = order_result['data']
-            for item in result_data:
-                order_id = item['ordId']
-                if order_id:
-                    order_item = self.get_order(parameters['instId'], order_id)
-                    order_item['ts'] = order_result['data'][0]['ts']
-                    return order_item
+                events.info('okx', 'leverage_set', instId=item['instId'], lever=item['lever'], mgnMode=item['mgnMode'], posSide=item['posSide'])
+                self.instruments.set_leverage(item['instId'], item['mgnMode'], item['lever'])
         else:
-            print(order_result)
-            return order_result
+            events.error('okx', 'leverage_failed', instId=parameters.get('instId'), code=result.get('code'), msg=result.get('msg'))
+        return result
 
-        
+    async def set_position_mode(self, posMode):
+        result = await self.client.post('/api/v5/account/set-position-mode', {"posMode": posMode})
+        if result['code'] == '0':
+            self.instruments.posMode = posMode
+        return result
+
+    # 同一时间的多笔订单由 batcher 合并成一次批量下单 每笔单独等成交
+    async def place_order(self, parameters, trace_id = None):
+        tracer.stamp(trace_id, 'submit', parameters['instId'])
+        item = await self.submit_order(parameters)
+        if 'code' in item:
+            tracer.discard(trace_id)
+            events.error('okx', 'order_failed', instId=parameters['instId'], clOrdId=parameters.get('clOrdId'), code=item['code'], msg=item.get('msg'))
+            return item
+        tracer.stamp(trace_id, 'ack')
+        order_item = await self.wait_order(parameters['instId'], item['ordId'])
+        order_item = {**order_item, 'ts': item['ts']}
+        tracer.stamp(trace_id, 'fill')
+        return order_item
+
+    # 超时/限流/系统繁忙时重试 clOrdId 由消息 id 生成 重复提交会被 OKX 以 51016 拒绝 这时查出之前那笔订单
+    # 第一次就 51016 说明这个信号已经下过(例如热备接手后补下) 同样按之前那笔订单处理
+    async def submit_order(self, parameters):
+        clOrdId = parameters.get('clOrdId')
+        delay = self.retry_delay
+        for attempt in range(self.retries + 1):
+            item = await self.batcher.submit(parameters)
+            if 'code' not in item:
+                return item
+            if item['code'] == DUPLICATED_CLORDID and clOrdId:
+                existing = await self.get_order_by_clOrdId(parameters['instId'], clOrdId)
+                if 'code' not in existing:
+                    return {"ordId": existing['ordId'], "clOrdId": clOrdId, "ts": existing['cTime']}
+            if item['code'] not in RETRY_CODES or not clOrdId or attempt == self.retries:
+                return item
+            events.warning('okx', 'order_retry', clOrdId=clOrdId, attempt=attempt + 1, code=item['code'], msg=item['msg'])
+            await asyncio.sleep(delay)
+            delay *= 2
+        return item
 
-    def get_order(self, instId, ordId):
-        current_order_result = self.TradeAPI.get_order(instId, ordId)  
+    # 优先用 websocket 推送的成交信息 连接不可用或超时才走 REST
+    async def wait_order(self, instId, ordId):
+        if self.websocket.ready.is_set():
+            order_item = await self.orders.wait_final(ordId, self.fill_timeout)
+            if order_item:
+                return order_item
+        return await self.get_order(instId, ordId)
+
+    async def get_order(self, instId, ordId):
+        current_order_result = await self.client.get('/api/v5/trade/order', {"instId": instId, "ordId": ordId})
         if current_order_result['code'] == '0':
             result_data = current_order_result['data'][0]
             # for item in result_data:
@@ -54,13 +142,27 @@ class OKXExchange():
             #   print('张数:' + item['sz'])
             #   print('时间:' + format_timestamp(item['fillTime']))
             #   print('-----------------------')
+        else:
+            result_data = current_order_result
 
         return result_data
 
 
-    def get_order_list(self):
-        # order_list_result = self.accountAPI.get_positions()
-        order_list_result = self.accountAPI.get_positions_history(instType='SWAP')
+    async def get_order_by_clOrdId(self, instId, clOrdId):
+        result = await self.client.get('/api/v5/trade/order', {"instId": instId, "clOrdId": clOrdId})
+        if result['code'] == '0' and result['data']:
+            return result['data'][0]
+        return result
+
+    async def get_positions_history(self, instId = None, limit = 100):
+        return await self.client.get('/api/v5/account/positions-history', {"instType": 'SWAP', "instId": instId, "limit": str(limit)})
+
+    async def wait_close(self, instId, posSide, since, timeout = 15):
+        return await self.reconciler.wait_close(instId, posSide, since, timeout)
+
+    async def get_order_list(self):
+        # order_list_result = await self.client.get('/api/v5/account/positions')
+        order_list_result = await self.get_positions_history(limit=1)
         print('**********************')
         if order_list_result['code'] == '0':
             positions_data = order_list_result['data'][0]
@@ -93,4 +195,16 @@ class OKXExchange():
             #     print('**********************')
             #     final_string = f"创建时间:    {format_timestamp(item['cTime'])}\n持仓数:    {int(item['availPos'])/1000} \n强平价格:     {item['liqPx']}\n未实现盈亏:     { item['uplLastPx']}$\n实现盈亏:     {item['realizedPnl']} \n"
             #     return final_string
-            
+        else:
+            return str(order_list_result)
+
+    async def close(self):
+        self.instruments.stop_refresh()
+        if self._warm_task:
+            self._warm_task.cancel()
+        if self._websocket_task:
+            self._websocket_task.cancel()
+            await asyncio.gather(self._websocket_task, return_exceptions=True)
+        clock.stop()
+        await self.client.close()
+
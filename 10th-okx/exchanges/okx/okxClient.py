@@ -0,0 +1,145 @@
+import asyncio
+import base64
+import datetime
+import hmac
+import json
+import time
+from urllib.parse import urlencode
+
+import aiohttp
+
+from exchanges.okx.rateLimiter import RateLimiter, request_priority
+from utils.recorder import recorder, now_ms
+from utils.clock import clock
+
+API_URL = 'https://www.okx.com'
+
+
+def sign(api_secret, message):
+    digest = hmac.new(api_secret.encode('utf-8'), message.encode('utf-8'), 'sha256').digest()
+    return base64.b64encode(digest).decode('utf-8')
+
+
+# 下单参数里的 expTime 是请求头 不放在 body 里 批量下单取最早的
+# 不改传进来的参数 重试时还要用
+def split_expTime(params):
+    if isinstance(params, dict):
+        if 'expTime' not in params:
+            return params, None
+        return {key: value for key, value in params.items() if key != 'expTime'}, params['expTime']
+    if isinstance(params, list) and any(isinstance(item, dict) and 'expTime' in item for item in params):
+        expTimes = [int(item['expTime']) for item in params if item.get('expTime')]
+        return [{key: value for key, value in item.items() if key != 'expTime'} for item in params], min(expTimes) if expTimes else None
+    return params, None
+
+
+# OKX v5 REST 的 asyncio 客户端 一个实例共用一个长连接池
+class OKXClient:
+    # connector 传进来时多个账户共用一个连接池 由调用方关闭
+    def __init__(self, api_key, api_secret, passphrase, flag = '1', base_url = API_URL, timeout = 10, connector = None):
+        self._api_key = api_key
+        self._api_secret = api_secret
+        self._passphrase = passphrase
+        self._flag = flag
+        self._base_url = base_url
+        self._timeout = timeout
+        self._session = None
+        self._connector = connector
+        # 每个账户一个限速器 超过 OKX 的频率限制就排队
+        self.limiter = RateLimiter()
+
+    async def get_session(self):
+        if self._session is None or self._session.closed:
+            connector = self._connector or aiohttp.TCPConnector(limit=100, keepalive_timeout=60, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(
+                self._base_url,
+                connector=connector,
+                connector_owner=self._connector is None,
+                timeout=aiohttp.ClientTimeout(total=self._timeout)
+            )
+        return self._session
+
+    def _sign(self, timestamp, method, request_path, body):
+        return sign(self._api_secret, timestamp + method + request_path + body)
+
+    def _headers(self, method, request_path, body, auth, expTime = None):
+        headers = {'Content-Type': 'application/json'}
+        if self._flag == '1':
+            headers['x-simulated-trading'] = '1'
+        # 交易所收到请求时已经过了 expTime(毫秒) 直接拒绝 50102 排队太久的订单不会晚成交
+        if expTime:
+            headers['expTime'] = str(expTime)
+        if auth:
+            # 签名时间戳用校准后的时钟 本机时间偏了也不会超出交易所允许的范围
+            timestamp = datetime.datetime.fromtimestamp(clock.now(), datetime.timezone.utc).isoformat(timespec='milliseconds')[:-6] + 'Z'
+            headers['OK-ACCESS-KEY'] = self._api_key
+            headers['OK-ACCESS-SIGN'] = self._sign(timestamp, method, request_path, body)
+            headers['OK-ACCESS-TIMESTAMP'] = timestamp
+            headers['OK-ACCESS-PASSPHRASE'] = self._passphrase
+        return headers
+
+    # priority 不传时按请求内容判断 平仓/止损优先 查询最后
+    async def request(self, method, path, params = None, auth = True, priority = None):
+        if priority is None:
+            priority = request_priority(method, path, params)
+        await self.limiter.acquire(method, path, len(params) if isinstance(params, list) else 1, priority)
+        session = await self.get_session()
+        body = ''
+        request_path = path
+        expTime = None
+        if method == 'GET':
+            if params:
+                request_path = path + '?' + urlencode({key: value for key, value in params.items() if value is not None})
+        elif params is not None:
+            params, expTime = split_expTime(params)
+            body = json.dumps(params)
+
+        headers = self._headers(method, request_path, body, auth, expTime)
+        started = now_ms()
+        begin = time.perf_counter()
+        async with session.request(method, request_path, data=body or None, headers=headers) as response:
+            result = await response.json(content_type=None)
+        if recorder.enabled:
+            recorder.record_exchange('okx', method, path, params, result, started, (time.perf_counter() - begin) * 1000)
+        return result
+
+    # 提前建好几条 TLS 长连接 第一笔下单不用再握手
+    async def warm(self, connections = 2):
+        session = await self.get_session()
+
+        async def ping():
+            async with session.get('/api/v5/public/time') as response:
+                await response.read()
+
+        await asyncio.gather(*(ping() for _ in range(connections)), return_exceptions=True)
+
+    # 时钟同步的一次采样 (本机发送毫秒, 交易所毫秒, 本机收到毫秒) 不走限速器 排队时间不算进往返
+    async def sample_clock(self):
+        session = await self.get_session()
+        sent = time.time() * 1000
+        async with session.get('/api/v5/public/time') as response:
+            result = await response.json(content_type=None)
+        received = time.time() * 1000
+        if result.get('code') != '0' or not result.get('data'):
+            return None
+        return sent, int(result['data'][0]['ts']), received
+
+    # 空闲连接超过 keepalive_timeout 会被关掉 定时 ping 保持连接
+    async def keep_warm(self, interval = 30, connections = 2):
+        while True:
+            await asyncio.sleep(interval)
+            await self.warm(connections)
+
+    async def get(self, path, params = None, auth = True):
+        return await self.request('GET', path, params, auth)
+
+    async def post(self, path, params = None, auth = True, priority = None):
+        return await self.request('POST', path, params, auth, priority)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            if self._connector is not None:
+                return
+            # 给 ssl 连接一点时间优雅关闭
+            await asyncio.sleep(0.25)
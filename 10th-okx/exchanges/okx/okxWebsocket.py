@@ -0,0 +1,166 @@
+import asyncio
+import json
+from collections import OrderedDict
+
+import aiohttp
+
+from exchanges.okx.okxClient import sign
+from utils.clock import clock
+
+PRIVATE_WS_URL = 'wss://ws.okx.com:8443/ws/v5/private'
+DEMO_PRIVATE_WS_URL = 'wss://wspap.okx.com:8443/ws/v5/private'
+PUBLIC_WS_URL = 'wss://ws.okx.com:8443/ws/v5/public'
+DEMO_PUBLIC_WS_URL = 'wss://wspap.okx.com:8443/ws/v5/public'
+
+# 订单走到这些状态就不会再变了
+FINAL_STATES = ('filled', 'canceled', 'mmp_canceled')
+
+
+# 订单状态缓存 按 ordId / clOrdId 索引 由 orders 频道推送更新
+class OrderStateCache:
+    def __init__(self, max_orders = 4096):
+        self._max_orders = max_orders
+        self._orders = OrderedDict()
+        self._waiters = {}
+
+    def _store(self, key, item):
+        self._orders[key] = item
+        self._orders.move_to_end(key)
+        while len(self._orders) > self._max_orders:
+            self._orders.popitem(last=False)
+
+    def update(self, item):
+        keys = [key for key in (item.get('ordId'), item.get('clOrdId')) if key]
+        for key in keys:
+            self._store(key, item)
+        if item.get('state') in FINAL_STATES:
+            for key in keys:
+                for waiter in self._waiters.pop(key, ()):
+                    if not waiter.done():
+                        waiter.set_result(item)
+
+    def get(self, key):
+        return self._orders.get(key)
+
+    # 等订单走到最终状态 超时返回 None
+    async def wait_final(self, key, timeout = 5):
+        item = self._orders.get(key)
+        if item and item.get('state') in FINAL_STATES:
+            return item
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(key, []).append(waiter)
+        try:
+            return await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            waiters = self._waiters.get(key)
+            if waiters and waiter in waiters:
+                waiters.remove(waiter)
+                if not waiters:
+                    self._waiters.pop(key, None)
+
+
+# OKX v5 WebSocket 连接 断线自动重连并重新订阅
+# 私有频道传 api_key 会先登录 公共频道不传
+class OKXWebsocket:
+    def __init__(self, url, api_key = None, api_secret = None, passphrase = None, ping_interval = 20):
+        self._url = url
+        self._api_key = api_key
+        self._api_secret = api_secret
+        self._passphrase = passphrase
+        self._ping_interval = ping_interval
+        self._channels = []
+        self._handlers = {}
+        self._ws = None
+        self._session = None
+        self.ready = asyncio.Event()
+
+    # channel_args 例如 {"channel": "orders", "instType": "SWAP"}
+    # 同一个频道可以挂多个 handler 推送按订阅顺序依次调用 相同的参数只订阅一次
+    def subscribe(self, channel_args, handler):
+        handlers = self._handlers.setdefault(channel_args['channel'], [])
+        if handler not in handlers:
+            handlers.append(handler)
+        if channel_args in self._channels:
+            return
+        self._channels.append(channel_args)
+        if self._ws is not None and not self._ws.closed:
+            asyncio.create_task(self._ws.send_json({"op": "subscribe", "args": [channel_args]}))
+
+    def _login_args(self):
+        timestamp = str(int(clock.now()))
+        return {
+            "apiKey": self._api_key,
+            "passphrase": self._passphrase,
+            "timestamp": timestamp,
+            "sign": sign(self._api_secret, timestamp + 'GET' + '/users/self/verify')
+        }
+
+    async def _keepalive(self, ws):
+        while not ws.closed:
+            await asyncio.sleep(self._ping_interval)
+            await ws.send_str('ping')
+
+    async def _connect(self):
+        ws = await self._session.ws_connect(self._url, autoping=True)
+        if self._api_key:
+            await ws.send_json({"op": "login", "args": [self._login_args()]})
+            message = await ws.receive_json(timeout=10)
+            if message.get('event') != 'login' or message.get('code') != '0':
+                await ws.close()
+                raise ConnectionError('websocket 登录失败: ' + str(message))
+        if self._channels:
+            await ws.send_json({"op": "subscribe", "args": self._channels})
+        return ws
+
+    def _dispatch(self, message):
+        if message == 'pong':
+            return
+        message = json.loads(message)
+        if 'data' not in message:
+            if message.get('event') == 'error':
+                print(message)
+            return
+        handlers = self._handlers.get(message.get('arg', {}).get('channel'))
+        if handlers:
+            for item in message['data']:
+                for handler in handlers:
+                    # 一个 handler 出错不影响其他 handler 和后面的推送
+                    try:
+                        handler(item)
+                    except Exception as error:
+                        print(f"websocket {message['arg']['channel']} 处理推送出错: {error!r} {item}")
+
+    async def run_forever(self):
+        self._session = aiohttp.ClientSession()
+        delay = 1
+        try:
+            while True:
+                keepalive = None
+                try:
+                    self._ws = await self._connect()
+                    self.ready.set()
+                    delay = 1
+                    keepalive = asyncio.create_task(self._keepalive(self._ws))
+                    async for message in self._ws:
+                        if message.type == aiohttp.WSMsgType.TEXT:
+                            self._dispatch(message.data)
+                        elif message.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                            break
+                except (aiohttp.ClientError, ConnectionError, asyncio.TimeoutError) as error:
+                    print('websocket 断开: ' + str(error))
+                except Exception as error:
+                    # 其他错误(例如推送不是 JSON)也按断线处理 重连 不让任务退出
+                    print('websocket 出错 重新连接: ' + repr(error))
+                finally:
+                    self.ready.clear()
+                    if keepalive:
+                        keepalive.cancel()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+        finally:
+            if self._ws is not None:
+                await self._ws.close()
+            await self._session.close()
@@ -0,0 +1,159 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+from utils.clock import clock
+
+'''
+    平仓收益对账
+    positions 频道推送仓位变化 平仓(pos 变成 0 或者 realizedPnl 变了)后马上去查 positions-history
+    查询带游标 before=上次看到的最新 uTime 只拿新的记录 一页满了再用 after 往下翻
+    记录按 posId 对到平仓的那个仓位 同一个 posId 平仓后再开会复用 所以再用 uTime >= 平仓时间过滤
+    positions-history 一条记录是一个仓位从开到平 部分平仓时同一条记录(posId + cTime)会更新
+    累计收益按记录的增量算 同一条记录更新多次不会重复计算
+'''
+
+HISTORY_PATH = '/api/v5/account/positions-history'
+PAGE_LIMIT = 100
+
+
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class PnlReconciler:
+    def __init__(self, client, poll_interval = 1, max_records = 1024):
+        self.client = client
+        # 推送没来或者历史记录还没生成时 隔多久再查一次
+        self.poll_interval = poll_interval
+        self._max_records = max_records
+        # (instId, posSide) -> 最近推送的 posId
+        self._posIds = {}
+        self._realized = {}
+        # (posId, cTime) -> 最新的一版历史记录 算增量用
+        self._records = OrderedDict()
+        self._cursor = None
+        self._waiters = []
+        self._lock = asyncio.Lock()
+        self._kick_task = None
+        # instId -> {"realizedPnl", "fee", "pnl", "closes"} 启动后累计
+        self.totals = {}
+
+    # 启动时只记下最新记录的时间 之前的历史不算
+    async def prime(self):
+        result = await self.client.get(HISTORY_PATH, {"instType": 'SWAP', "limit": '1'})
+        if result['code'] != '0':
+            print(result)
+            return
+        if result['data']:
+            self._cursor = result['data'][0]['uTime']
+        else:
+            self._cursor = str(clock.now_ms())
+
+    # positions 频道推送
+    def on_position(self, item):
+        posId = item.get('posId')
+        if not posId:
+            return
+        key = (item['instId'], item.get('posSide', 'net'))
+        self._posIds[key] = posId
+        realized = item.get('realizedPnl')
+        changed = self._realized.get(key) != realized
+        self._realized[key] = realized
+        # 平仓(全部或部分)或者有人在等 马上查一次
+        if to_float(item.get('pos')) == 0 or changed or self._waiters:
+            self._kick()
+
+    def _kick(self):
+        if self._kick_task is None or self._kick_task.done():
+            self._kick_task = asyncio.create_task(self.backfill())
+
+    # 只查游标之后的新记录 一页满了往下翻到游标为止
+    async def backfill(self):
+        async with self._lock:
+            if self._cursor is None:
+                await self.prime()
+                if self._cursor is None:
+                    return 0
+            newest = int(self._cursor)
+            after = None
+            count = 0
+            while True:
+                parameters = {"instType": 'SWAP', "before": self._cursor, "limit": str(PAGE_LIMIT)}
+                if after:
+                    parameters['after'] = after
+                result = await self.client.get(HISTORY_PATH, parameters)
+                if result['code'] != '0':
+                    print(result)
+                    break
+                data = result['data']
+                for item in data:
+                    self._ingest(item)
+                    newest = max(newest, int(item['uTime']))
+                count += len(data)
+                if len(data) < PAGE_LIMIT:
+                    break
+                after = min(data, key=lambda item: int(item['uTime']))['uTime']
+            self._cursor = str(newest)
+            return count
+
+    def _ingest(self, item):
+        key = (item.get('posId'), item.get('cTime'))
+        previous = self._records.get(key)
+        if previous is not None and previous['uTime'] == item['uTime']:
+            return
+        self._records[key] = item
+        self._records.move_to_end(key)
+        while len(self._records) > self._max_records:
+            self._records.popitem(last=False)
+
+        total = self.totals.setdefault(item['instId'], {"realizedPnl": 0.0, "fee": 0.0, "pnl": 0.0, "closes": 0})
+        for field in ('realizedPnl', 'fee', 'pnl'):
+            total[field] += to_float(item.get(field)) - (to_float(previous.get(field)) if previous else 0.0)
+        total['closes'] += 1
+
+        for waiter in list(self._waiters):
+            instId, posSide, since, future = waiter
+            if not future.done() and self._matches(item, instId, posSide, since):
+                future.set_result(item)
+
+    def _matches(self, item, instId, posSide, since):
+        if item['instId'] != instId or int(item['uTime']) < since:
+            return False
+        if posSide not in (item.get('posSide'), item.get('direction')):
+            return False
+        posId = self._posIds.get((instId, posSide)) or self._posIds.get((instId, 'net'))
+        return posId is None or item.get('posId') == posId
+
+    def find(self, instId, posSide, since = 0):
+        for item in reversed(self._records.values()):
+            if self._matches(item, instId, posSide, since):
+                return item
+        return None
+
+    # 等 since(毫秒) 之后这个仓位的平仓记录 超时返回 None
+    async def wait_close(self, instId, posSide, since = 0, timeout = 15):
+        since = int(since)
+        item = self.find(instId, posSide, since)
+        if item:
+            return item
+        future = asyncio.get_running_loop().create_future()
+        waiter = (instId, posSide, since, future)
+        self._waiters.append(waiter)
+        deadline = time.monotonic() + timeout
+        try:
+            while not future.done():
+                await self.backfill()
+                remaining = deadline - time.monotonic()
+                if future.done() or remaining <= 0:
+                    break
+                # 推送触发的查询会先把 future 完成 不用等满一个间隔
+                await asyncio.wait([future], timeout=min(self.poll_interval, remaining))
+            return future.result() if future.done() else None
+        finally:
+            self._waiters.remove(waiter)
+            if not future.done():
+                future.cancel()
@@ -0,0 +1,124 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+'''
+    OKX 限速 令牌桶 每个接口一个桶 下单类接口再共用一个账户级别的桶
+    一个 OKXClient 对应一个账户 各自一个 RateLimiter
+    令牌不够时按优先级排队: 平仓/止损 > 开仓 > 查询 同优先级先来先得
+'''
+
+CLOSE = 0
+OPEN = 1
+INFO = 2
+
+# (方法, 路径) -> (次数, 秒) 来自 OKX v5 文档
+OKX_LIMITS = {
+    ('POST', '/api/v5/trade/order'): (60, 2),
+    # 批量下单按订单数算
+    ('POST', '/api/v5/trade/batch-orders'): (300, 2),
+    ('POST', '/api/v5/trade/cancel-order'): (60, 2),
+    ('POST', '/api/v5/trade/amend-order'): (60, 2),
+    ('POST', '/api/v5/trade/order-algo'): (20, 2),
+    ('GET', '/api/v5/trade/order'): (60, 2),
+    ('GET', '/api/v5/account/positions'): (10, 2),
+    ('GET', '/api/v5/account/positions-history'): (10, 2),
+    ('GET', '/api/v5/account/balance'): (10, 2),
+    ('GET', '/api/v5/account/config'): (5, 2),
+    ('GET', '/api/v5/account/leverage-info'): (20, 2),
+    ('POST', '/api/v5/account/set-leverage'): (20, 2),
+    ('POST', '/api/v5/account/set-position-mode'): (5, 2),
+    ('GET', '/api/v5/public/instruments'): (20, 2),
+    ('GET', '/api/v5/public/time'): (10, 2),
+}
+DEFAULT_LIMIT = (10, 2)
+# 账户级别 所有下单/改单/撤单加起来
+ACCOUNT_ORDER_LIMIT = (1000, 2)
+
+
+# 平多(sell long)、平空(buy short)、只减仓、止损类委托都算平仓
+def order_priority(parameters):
+    if parameters.get('reduceOnly') or parameters.get('ordType') in ('conditional', 'oco', 'trigger', 'move_order_stop'):
+        return CLOSE
+    posSide = parameters.get('posSide')
+    if (posSide == 'long' and parameters.get('side') == 'sell') or (posSide == 'short' and parameters.get('side') == 'buy'):
+        return CLOSE
+    return OPEN
+
+
+def request_priority(method, path, params):
+    if method != 'POST' or not path.startswith('/api/v5/trade/'):
+        return INFO
+    if isinstance(params, list):
+        return min((order_priority(item) for item in params), default=OPEN)
+    return order_priority(params or {})
+
+
+class TokenBucket:
+    def __init__(self, capacity, per = 2):
+        self.capacity = capacity
+        self.rate = capacity / per
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._waiters = []
+        self._seq = itertools.count()
+        self._timer = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, cost = 1, priority = INFO):
+        cost = min(cost, self.capacity)
+        self._refill()
+        if not self._waiters and self.tokens >= cost:
+            self.tokens -= cost
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), cost, future))
+        self._schedule()
+        await future
+
+    def _schedule(self):
+        if self._timer is None and self._waiters:
+            cost = self._waiters[0][2]
+            delay = max(0.0, (cost - self.tokens) / self.rate)
+            self._timer = asyncio.get_running_loop().call_later(delay, self._grant)
+
+    # 令牌够了按优先级放行
+    def _grant(self):
+        self._timer = None
+        self._refill()
+        while self._waiters:
+            priority, seq, cost, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self.tokens < cost:
+                break
+            heapq.heappop(self._waiters)
+            self.tokens -= cost
+            future.set_result(None)
+        self._schedule()
+
+
+class RateLimiter:
+    def __init__(self, limits = None, account_limit = ACCOUNT_ORDER_LIMIT, default = DEFAULT_LIMIT):
+        self._limits = limits or OKX_LIMITS
+        self._default = default
+        self._buckets = {}
+        self._account = TokenBucket(*account_limit)
+
+    def bucket(self, method, path):
+        key = (method, path)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(*self._limits.get(key, self._default))
+        return bucket
+
+    async def acquire(self, method, path, cost = 1, priority = INFO):
+        await self.bucket(method, path).acquire(cost, priority)
+        if method == 'POST' and path.startswith('/api/v5/trade/'):
+            await self._account.acquire(cost, priority)
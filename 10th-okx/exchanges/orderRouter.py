@@ -0,0 +1,53 @@
+import asyncio
+
+from utils.eventLog import events
+
+
+# 一个信号同时发到多个交易所
+# 每个交易所单独处理异常 谁先成交先回调谁 慢的不会拖住快的
+# 超时只记慢单 不取消下单 订单可能已经提交 取消会把已经成交的单当成失败
+# place_order 自己有重试次数和等成交的上限 一定会返回
+class OrderRouter:
+    def __init__(self, exchanges, timeouts = None, default_timeout = 5):
+        self._exchanges = exchanges
+        self._timeouts = timeouts or {}
+        self._default_timeout = default_timeout
+
+    def set_timeout(self, name, timeout):
+        self._timeouts[name] = timeout
+
+    async def _place(self, name, exchange, parameters, trace_id):
+        timeout = self._timeouts.get(name, self._default_timeout)
+        task = asyncio.ensure_future(exchange.place_order(parameters, trace_id))
+        try:
+            try:
+                result = await asyncio.wait_for(asyncio.shield(task), timeout)
+            except asyncio.TimeoutError:
+                events.warning('router', 'order_slow', venue=name, instId=parameters['instId'], clOrdId=parameters.get('clOrdId'), timeout=timeout)
+                result = await task
+            if result is None:
+                result = {"code": '1', "msg": '没有返回订单'}
+        except Exception as error:
+            result = {"code": '1', "msg": f'{name} 下单失败 {error!r}'}
+        return name, result
+
+    # build_parameters(name, exchange) 返回该交易所的下单参数 返回 None 表示跳过
+    # on_result(name, orderInfo) 每个交易所返回后立刻调用
+    # trace_id 只给第一个交易所 延迟统计按主交易所算
+    async def fan_out(self, build_parameters, on_result, trace_id = None):
+        tasks = []
+        for name, exchange in self._exchanges.items():
+            parameters = build_parameters(name, exchange)
+            if parameters is None:
+                continue
+            tasks.append(asyncio.create_task(self._place(name, exchange, parameters, trace_id if not tasks else None)))
+
+        results = {}
+        for task in asyncio.as_completed(tasks):
+            name, result = await task
+            results[name] = result
+            try:
+                await on_result(name, result)
+            except Exception as error:
+                events.error('router', 'result_failed', venue=name, error=repr(error))
+        return results
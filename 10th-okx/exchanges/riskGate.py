@@ -0,0 +1,95 @@
+'''
+    下单前风控 只看内存里的账户状态(exchanges/okx/accountState.py) 每个信号都检查 不走网络
+    只拦开仓 平仓是减少风险 总是放行
+        kill_switch       打开后拒绝所有开仓
+        min_margin_ratio  维持保证金率低于这个值拒绝开仓
+        max_positions     持仓数达到上限时拒绝新的 (instId, posSide) 已有的仓位还可以加
+        max_notional      所有持仓的名义价值(USDT)加上这一单不超过上限 超出时缩小这一单
+        可用保证金        这一单需要的保证金超过可用保证金时缩小
+    0 表示不限制 没有价格时不能算名义价值 只做前三项
+    已经提交还没回报的开仓单先 reserve 占住名义价值/保证金/仓位数 回报(成交或失败)后 release
+    否则同时到的几个信号看到的是同一份账户状态 会一起超过上限
+'''
+
+import itertools
+
+OPEN_SIDES = (('buy', 'long'), ('sell', 'short'))
+
+
+def is_open(side, posSide):
+    return (side, posSide) in OPEN_SIDES
+
+
+class RiskGate:
+    def __init__(self, max_notional = 0, max_positions = 0, min_margin_ratio = 0, kill_switch = False, margin_buffer = 0.95):
+        self.max_notional = max_notional
+        self.max_positions = max_positions
+        self.min_margin_ratio = min_margin_ratio
+        self.kill_switch = kill_switch
+        # 可用保证金只用这么多 留一点给手续费和价格变动
+        self.margin_buffer = margin_buffer
+        # 在途开仓单 编号 -> (账户状态, (instId, posSide), 名义价值, 保证金)
+        self._pending = {}
+        self._ids = itertools.count(1)
+
+    def configure(self, trade):
+        self.max_notional = trade.risk_max_notional
+        self.max_positions = trade.risk_max_positions
+        self.min_margin_ratio = trade.risk_min_margin_ratio
+        self.kill_switch = trade.risk_kill_switch
+
+    # 返回 (允许的币数量, 拒绝或缩小的原因) 数量为 0 表示拒绝 原因为 None 表示原样通过
+    def check(self, state, instId, side, posSide, coin, lever):
+        if not is_open(side, posSide):
+            return coin, None
+        if self.kill_switch:
+            return 0, 'kill switch 已打开'
+        if state is None:
+            return coin, None
+        if self.min_margin_ratio and state.margin_ratio is not None and state.margin_ratio < self.min_margin_ratio:
+            return 0, f'保证金率 {state.margin_ratio:.2f} 低于 {self.min_margin_ratio}'
+        pending = [item for item in self._pending.values() if item[0] is state]
+        if self.max_positions:
+            slots = set(state.positions)
+            slots.update(item[1] for item in pending)
+            if len(slots) >= self.max_positions and (instId, posSide) not in slots:
+                return 0, f'持仓数已达上限 {self.max_positions}'
+
+        price = state.prices.get(instId)
+        if not price:
+            return coin, None
+        allowed = coin
+        reason = None
+        if self.max_notional:
+            used = state.notional + sum(item[2] for item in pending)
+            room = (self.max_notional - used) / price
+            if room < allowed:
+                allowed, reason = max(room, 0), f'名义价值上限 {self.max_notional} 已用 {used:.2f}'
+        if state.available is not None and lever:
+            available = state.available - sum(item[3] for item in pending)
+            room = available * self.margin_buffer * float(lever) / price
+            if room < allowed:
+                allowed, reason = max(room, 0), f'可用保证金 {available:.2f} 不够'
+        return allowed, reason
+
+    # check 的结果换成张数 缩小后不到最小张数(from_coin 会补到最小张数)也算拒绝
+    # 返回 (张数, 原因) 张数为 '0' 表示拒绝 信号开仓/套利对冲/滚仓加仓都走这里
+    def size(self, state, instruments, instId, side, posSide, coin, lever):
+        allowed, reason = self.check(state, instId, side, posSide, coin, lever)
+        sz = instruments.from_coin(instId, allowed) if allowed > 0 else '0'
+        if reason and instruments.to_coin(instId, sz) > allowed:
+            sz = '0'
+        return sz, reason
+
+    # 开仓单提交前调用 返回编号 回报后交给 release 平仓单和没有账户状态的返回 None
+    def reserve(self, state, instId, side, posSide, coin, lever):
+        if state is None or not is_open(side, posSide):
+            return None
+        notional = coin * (state.prices.get(instId) or 0)
+        token = next(self._ids)
+        self._pending[token] = (state, (instId, posSide), notional, notional / float(lever) if lever else 0)
+        return token
+
+    def release(self, token):
+        if token is not None:
+            self._pending.pop(token, None)
@@ -0,0 +1,347 @@
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+from utils.eventLog import events
+
+'''
+    自动滚仓 盈利后用浮盈加仓 到目标止盈 离强平价太近先减仓
+    持仓按列存在 NumPy 数组里 每次标记价格推送对所有持仓做一次向量化判断 下单还是走 exchange.place_order
+    规则
+        加仓: 价格从上次加仓价(第一次是开仓均价)朝有利方向走了 add_step 且加仓次数 < max_adds
+              用浮盈的 reinvest 比例做保证金 按杠杆换算加仓张数
+        止盈: 价格相对开仓均价朝有利方向走了 take_profit 全部平仓
+        强平缓冲: 标记价格离强平价不到 liq_buffer 平掉 reduce_ratio 的仓位 一直在缓冲区里就继续减 直到平完
+    同一个仓位有单在途时跳过 成交回来更新均价/张数/强平价后再参与判断
+    加仓和信号开仓一样过风控(exchanges/riskGate.py) kill switch 打开时不加仓 减仓/止盈不受影响
+    强平价优先用交易所给的 liqPx 没有时逐仓按 均价 * (1 ∓ (1/杠杆 - mmr)) 估算
+    全仓的强平价取决于整个账户 没法按单个仓位估 等 positions 推送的 liqPx 到了才做强平缓冲判断
+
+    回测: python -m exchanges.rollEngine ticks.jsonl --open BTC-USDT-SWAP:long:1
+        行情格式同 SimExchange.load_ticks 用模拟交易所撮合
+'''
+
+TAKE_PROFIT = 'take_profit'
+ADD = 'add'
+REDUCE = 'reduce'
+
+
+class RollEngine:
+    def __init__(self, exchange, add_step = 0.05, max_adds = 3, reinvest = 0.5, take_profit = 0.3, liq_buffer = 0.02, reduce_ratio = 0.5, mmr = 0.004, tdMode = 'cross', capacity = 64, risk = None):
+        self.exchange = exchange
+        # 风控 回测时为 None
+        self.risk = risk
+        self.add_step = add_step
+        self.max_adds = max_adds
+        self.reinvest = reinvest
+        self.take_profit = take_profit
+        self.liq_buffer = liq_buffer
+        self.reduce_ratio = reduce_ratio
+        self.mmr = mmr
+        self.tdMode = tdMode
+        # instId -> 价格数组的下标
+        self._inst_index = {}
+        self._instIds = []
+        self.marks = np.full(8, np.nan)
+        # (instId, posSide) -> 行号
+        self._rows = {}
+        self._keys = [None] * capacity
+        self._allocate(capacity)
+        self._tasks = set()
+        # 每次判断的耗时(秒) 和各动作次数
+        self.step_time = 0.0
+        self.steps = 0
+        self.actions = {TAKE_PROFIT: 0, ADD: 0, REDUCE: 0}
+
+    def _allocate(self, capacity):
+        old = getattr(self, 'active', None)
+        columns = {
+            "inst": np.zeros(capacity, dtype=np.int64),
+            "sign": np.zeros(capacity),
+            "size": np.zeros(capacity),
+            "ct_val": np.ones(capacity),
+            "avg": np.zeros(capacity),
+            "last_add": np.zeros(capacity),
+            "liq": np.zeros(capacity),
+            "lever": np.ones(capacity),
+            "adds": np.zeros(capacity, dtype=np.int64),
+            "active": np.zeros(capacity, dtype=bool),
+            "busy": np.zeros(capacity, dtype=bool),
+        }
+        for name, column in columns.items():
+            if old is not None:
+                column[:len(old)] = getattr(self, name)
+            setattr(self, name, column)
+        self._keys += [None] * (capacity - len(self._keys))
+
+    def _inst(self, instId):
+        index = self._inst_index.get(instId)
+        if index is None:
+            index = self._inst_index[instId] = len(self._instIds)
+            self._instIds.append(instId)
+            if index >= len(self.marks):
+                self.marks = np.concatenate([self.marks, np.full(len(self.marks), np.nan)])
+        return index
+
+    def estimate_liq(self, avg, sign, lever):
+        return avg * (1 - sign * (1 / lever - self.mmr))
+
+    # 没有 liqPx 的全仓仓位返回 NaN 不参与强平缓冲判断
+    def liq_price(self, avg, sign, lever, liqPx = None):
+        if liqPx:
+            return float(liqPx)
+        if self.tdMode == 'isolated':
+            return self.estimate_liq(avg, sign, lever)
+        return np.nan
+
+    # ========== 持仓表 ==========
+
+    # pos 是张数(正数) posSide long/short
+    def track(self, instId, posSide, pos, avgPx, lever, liqPx = None):
+        key = (instId, posSide)
+        row = self._rows.get(key)
+        if row is None:
+            free = np.flatnonzero(~self.active)
+            if not len(free):
+                self._allocate(len(self.active) * 2)
+                free = np.flatnonzero(~self.active)
+            row = int(free[0])
+            self._rows[key] = row
+            self._keys[row] = key
+            self.adds[row] = 0
+            self.last_add[row] = float(avgPx)
+        sign = -1.0 if posSide == 'short' else 1.0
+        instrument = self.exchange.instruments.get(instId)
+        self.inst[row] = self._inst(instId)
+        self.sign[row] = sign
+        self.size[row] = float(pos)
+        self.ct_val[row] = float(instrument['ctVal']) if instrument else 1.0
+        self.avg[row] = float(avgPx)
+        self.lever[row] = float(lever)
+        self.liq[row] = self.liq_price(float(avgPx), sign, float(lever), liqPx)
+        self.active[row] = True
+        self.busy[row] = False
+        return row
+
+    def untrack(self, instId, posSide):
+        row = self._rows.pop((instId, posSide), None)
+        if row is not None:
+            self.active[row] = False
+            self.busy[row] = False
+            self._keys[row] = None
+
+    # 从交易所拉一次当前持仓
+    async def sync_positions(self):
+        result = await self.exchange.get_positions()
+        if result.get('code') != '0':
+            print(result)
+            return
+        for item in result['data']:
+            pos = float(item['pos'] or 0)
+            if not pos:
+                continue
+            posSide = item['posSide'] if item['posSide'] != 'net' else ('long' if pos > 0 else 'short')
+            self.track(item['instId'], posSide, abs(pos), item['avgPx'], item.get('lever') or 1, item.get('liqPx'))
+
+    # TradeManager 下单成交后调用 开仓加到表里 平仓减掉
+    def on_fill(self, orderInfo):
+        instId, posSide = orderInfo['instId'], orderInfo['posSide']
+        sz = float(orderInfo.get('accFillSz') or orderInfo['sz'])
+        px = float(orderInfo['avgPx'])
+        row = self._rows.get((instId, posSide))
+        opening = (orderInfo['side'] == 'buy') == (posSide != 'short')
+        if opening:
+            if row is None:
+                self.track(instId, posSide, sz, px, orderInfo.get('lever') or 1)
+            else:
+                size = self.size[row] + sz
+                avg = (self.avg[row] * self.size[row] + px * sz) / size
+                self.size[row] = size
+                self.avg[row] = avg
+                # 加仓后原来的 liqPx 不准了 全仓等下一次推送
+                self.liq[row] = self.liq_price(avg, self.sign[row], self.lever[row])
+        elif row is not None:
+            self.size[row] -= sz
+            if self.size[row] <= 1e-12:
+                self.untrack(instId, posSide)
+
+    # 私有频道 positions 推送 更新已跟踪仓位的强平价
+    def on_position(self, item):
+        posSide = item.get('posSide')
+        if posSide == 'net':
+            pos = float(item.get('pos') or 0)
+            posSide = 'long' if pos > 0 else 'short'
+        row = self._rows.get((item['instId'], posSide))
+        if row is not None and item.get('liqPx'):
+            self.liq[row] = float(item['liqPx'])
+
+    # ========== 判断 ==========
+
+    def on_mark(self, instId, px):
+        index = self._inst_index.get(instId)
+        if index is None:
+            return []
+        self.marks[index] = float(px)
+        return self.step()
+
+    # 所有持仓一次算完 返回 [(动作, 行号, 张数, 价格)]
+    def step(self):
+        begin = time.perf_counter()
+        px = self.marks[self.inst]
+        rows = self.active & ~self.busy & ~np.isnan(px)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            gain = (px / self.avg - 1) * self.sign
+            since_add = (px / self.last_add - 1) * self.sign
+            liq_distance = np.abs(px - self.liq) / px
+        take = rows & (gain >= self.take_profit)
+        reduce = rows & ~take & (liq_distance < self.liq_buffer)
+        add = rows & ~take & ~reduce & (since_add >= self.add_step) & (self.adds < self.max_adds)
+        # 浮盈 * reinvest 做保证金 乘杠杆换成张数
+        upl = (px - self.avg) * self.sign * self.size * self.ct_val
+        add_size = np.where(add, upl * self.reinvest * self.lever / (px * self.ct_val), 0.0)
+
+        decisions = []
+        for row in np.flatnonzero(take):
+            decisions.append((TAKE_PROFIT, int(row), float(self.size[row]), float(px[row])))
+        for row in np.flatnonzero(reduce):
+            decisions.append((REDUCE, int(row), float(self.size[row] * self.reduce_ratio), float(px[row])))
+        for row in np.flatnonzero(add):
+            decisions.append((ADD, int(row), float(add_size[row]), float(px[row])))
+        self.steps += 1
+        self.step_time += time.perf_counter() - begin
+
+        for decision in decisions:
+            self._execute(*decision)
+        return decisions
+
+    # ========== 下单 ==========
+
+    def _execute(self, action, row, size, px):
+        instId, posSide = self._keys[row]
+        instruments = self.exchange.instruments
+        instrument = instruments.get(instId)
+        # 不足最小下单量的加仓等下次
+        if action == ADD and instrument and size < float(instrument['minSz']):
+            return
+        sz = instruments.to_contracts(instId, min(size, self.size[row]) if action != ADD else size)
+        opening = action == ADD
+        side = 'buy' if (posSide == 'long') == opening else 'sell'
+        parameters = {"instId": instId, "tdMode": self.tdMode, "side": side, "posSide": posSide, "ordType": 'market', "sz": sz}
+        if not opening:
+            parameters['reduceOnly'] = True
+        token = None
+        if opening and self.risk is not None:
+            account = self.exchange.account
+            sz, reason = self.risk.size(account, instruments, instId, side, posSide, instruments.to_coin(instId, sz), self.lever[row])
+            if float(sz) <= 0:
+                # 每次标记价格都会再判断 只记事件日志 不刷屏
+                events.warning('roll', 'risk_reject', instId=instId, posSide=posSide, reason=reason)
+                return
+            parameters['sz'] = sz
+            token = self.risk.reserve(account, instId, side, posSide, instruments.to_coin(instId, sz), self.lever[row])
+        self.busy[row] = True
+        self.actions[action] += 1
+        task = asyncio.ensure_future(self._place(action, row, parameters, px, token))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _place(self, action, row, parameters, px, token = None):
+        key = self._keys[row]
+        try:
+            orderInfo = await self.exchange.place_order(parameters)
+        except Exception as error:
+            orderInfo = {"code": '1', "msg": repr(error)}
+        finally:
+            if self.risk is not None:
+                self.risk.release(token)
+        if self._rows.get(key) != row:
+            return orderInfo
+        self.busy[row] = False
+        if 'code' in orderInfo:
+            print(f'滚仓 {action} {key} 下单失败: {orderInfo}')
+            return orderInfo
+        self.on_fill(orderInfo)
+        if action == ADD and key in self._rows:
+            self.adds[row] += 1
+            self.last_add[row] = float(orderInfo.get('avgPx') or px)
+        print(f"滚仓 {action} {key[0]} {key[1]} {parameters['sz']} 张 @ {orderInfo.get('avgPx')}")
+        return orderInfo
+
+    # 等所有在途的单回来 回测每个行情后调用
+    async def drain(self):
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    def positions(self):
+        return [
+            {"instId": key[0], "posSide": key[1], "pos": float(self.size[row]), "avgPx": float(self.avg[row]), "liqPx": float(self.liq[row]), "adds": int(self.adds[row])}
+            for key, row in self._rows.items()
+        ]
+
+
+# OKX 公共频道 mark-price 推送接到滚仓引擎
+def subscribe_marks(websocket, engine, instIds):
+    def on_mark(item):
+        engine.on_mark(item['instId'], item['markPx'])
+
+    for instId in instIds:
+        websocket.subscribe({"channel": "mark-price", "instId": instId}, on_mark)
+
+
+# 用录制的行情回测 opens: [(instId, posSide, 张数)] 第一条行情后开仓
+async def backtest(ticks, opens, balance = 10000.0, lever = '20', **rules):
+    from exchanges.sim.simExchange import SimExchange
+    exchange = SimExchange(balance=balance, lever=lever)
+    engine = RollEngine(exchange, mmr=exchange.mmr, **rules)
+    pending = list(opens)
+    for tick in ticks:
+        exchange.apply(tick)
+        # 每个合约第一条行情到了再开仓
+        for item in [item for item in pending if item[0] == tick['instId']]:
+            pending.remove(item)
+            instId, posSide, sz = item
+            orderInfo = await exchange.place_order({"instId": instId, "tdMode": engine.tdMode, "side": 'buy' if posSide == 'long' else 'sell', "posSide": posSide, "ordType": 'market', "sz": str(sz)})
+            if 'code' in orderInfo:
+                print(orderInfo)
+            else:
+                engine.on_fill(orderInfo)
+        # 模拟交易所强平了的仓位从表里去掉
+        for instId, posSide in list(engine._rows):
+            if exchange._position_key(instId, posSide) not in exchange.positions:
+                engine.untrack(instId, posSide)
+        mark = exchange.mark_price(tick['instId'])
+        if mark is not None:
+            engine.on_mark(tick['instId'], mark)
+            await engine.drain()
+
+    result = {
+        "equity": exchange.equity(),
+        "pnl": exchange.equity() - balance,
+        "actions": dict(engine.actions),
+        "closes": len(exchange.history),
+        "positions": engine.positions(),
+        "step_us": engine.step_time / max(engine.steps, 1) * 1e6,
+        "steps": engine.steps
+    }
+    return result
+
+
+def load_ticks(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='滚仓回测')
+    parser.add_argument('ticks', help='录制的行情 jsonl')
+    parser.add_argument('--open', action='append', default=[], help='开仓 instId:posSide:张数 可以多个')
+    parser.add_argument('--lever', default='20')
+    parser.add_argument('--add-step', type=float, default=0.05)
+    parser.add_argument('--take-profit', type=float, default=0.3)
+    args = parser.parse_args()
+    opens = [(item.split(':')[0], item.split(':')[1], item.split(':')[2]) for item in args.open]
+    result = asyncio.run(backtest(load_ticks(args.ticks), opens, lever=args.lever, add_step=args.add_step, take_profit=args.take_profit))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
@@ -0,0 +1,406 @@
+import itertools
+import json
+import math
+import time
+
+from exchanges.baseExchange import BaseExchange
+from exchanges.okx.instruments import InstrumentRegistry
+from utils.latency import tracer
+
+'''
+    本地模拟交易所 接口和 OKXExchange 一样 不需要网络
+    行情: on_tick / on_book 推进 或者 load_ticks 载入录制的行情后用 advance(ts) 推进
+        {"instId": "BTC-USDT-SWAP", "ts": 毫秒, "bid": 价格, "ask": 价格, "bidSz": 张数, "askSz": 张数}
+        {"instId": ..., "ts": ..., "bids": [[价格, 张数], ...], "asks": [[价格, 张数], ...]}
+        {"instId": ..., "ts": ..., "last": 价格}
+    撮合: 市价单吃盘口 吃不完的撤掉 限价单能成交的部分吃单 剩下的挂着 后面的行情穿价时按挂单价成交
+    费用: 吃单 taker_fee 挂单 maker_fee 手续费按 OKX 的习惯记为负数
+    保证金: 全仓共用账户权益 逐仓每个仓位单独占用保证金 低于维持保证金强平
+'''
+
+# positions-history 的 type 1 部分平仓 2 完全平仓 3 强平
+CLOSE_PARTIAL = '1'
+CLOSE_ALL = '2'
+LIQUIDATION = '3'
+
+
+def error(code, msg):
+    return {"code": code, "msg": msg, "data": []}
+
+
+class SimExchange(BaseExchange):
+    name = 'sim'
+
+    def __init__(self, balance = 10000.0, maker_fee = 0.0002, taker_fee = 0.0005, mmr = 0.004, lever = '50', posMode = 'long_short_mode'):
+        self.balance = balance
+        self.maker_fee = maker_fee
+        self.taker_fee = taker_fee
+        self.mmr = mmr
+        self.default_lever = lever
+        self.instruments = InstrumentRegistry(None)
+        self.instruments.add('BTC-USDT-SWAP', '0.01', '0.01', '0.01', '0.1')
+        self.instruments.add('ETH-USDT-SWAP', '0.1', '0.01', '0.01', '0.01')
+        self.instruments.add('SOL-USDT-SWAP', '1', '0.01', '0.01', '0.001')
+        self.instruments.posMode = posMode
+        self.books = {}
+        self.orders = {}
+        self.positions = {}
+        self.history = []
+        self._open_orders = {}
+        self._ordIds = itertools.count(1)
+        self._posIds = itertools.count(1)
+        self._ticks = []
+        self._tick_index = 0
+        self._now = None
+
+    # ========== 行情 ==========
+
+    def now(self):
+        return self._now if self._now is not None else int(time.time() * 1000)
+
+    def on_book(self, instId, bids, asks, ts = None):
+        self.books[instId] = {
+            "bids": [[float(px), float(sz)] for px, sz in bids],
+            "asks": [[float(px), float(sz)] for px, sz in asks]
+        }
+        if ts is not None:
+            self._now = int(ts)
+        self._match_resting(instId)
+        self._check_liquidation(instId)
+
+    def on_tick(self, instId, bid, ask, bidSz = math.inf, askSz = math.inf, ts = None):
+        self.on_book(instId, [[bid, bidSz]], [[ask, askSz]], ts)
+
+    def apply(self, tick):
+        if 'bids' in tick:
+            self.on_book(tick['instId'], tick['bids'], tick['asks'], tick.get('ts'))
+        elif 'bid' in tick:
+            self.on_tick(tick['instId'], tick['bid'], tick['ask'], tick.get('bidSz', math.inf), tick.get('askSz', math.inf), tick.get('ts'))
+        else:
+            self.on_tick(tick['instId'], tick['last'], tick['last'], ts=tick.get('ts'))
+
+    def load_ticks(self, path):
+        with open(path, 'r', encoding='utf-8') as file:
+            self._ticks = [json.loads(line) for line in file if line.strip()]
+        self._tick_index = 0
+
+    # 把录制的行情推进到 ts(毫秒) 为止
+    def advance(self, ts):
+        while self._tick_index < len(self._ticks) and self._ticks[self._tick_index]['ts'] <= ts:
+            self.apply(self._ticks[self._tick_index])
+            self._tick_index += 1
+
+    def mark_price(self, instId):
+        book = self.books.get(instId)
+        if not book or not book['bids'] or not book['asks']:
+            return None
+        return (book['bids'][0][0] + book['asks'][0][0]) / 2
+
+    # ========== 撮合 ==========
+
+    # 吃盘口 返回 [(价格, 张数)] 盘口数量会被扣掉 直到下一次行情刷新
+    def _take(self, instId, side, sz, limit_px = None):
+        book = self.books.get(instId)
+        if not book:
+            return []
+        levels = book['asks'] if side == 'buy' else book['bids']
+        fills = []
+        while sz > 1e-12 and levels:
+            px, level_sz = levels[0]
+            if limit_px is not None and ((side == 'buy' and px > limit_px) or (side == 'sell' and px < limit_px)):
+                break
+            take = min(sz, level_sz)
+            fills.append((px, take))
+            sz -= take
+            if level_sz - take <= 1e-12:
+                levels.pop(0)
+            else:
+                levels[0][1] = level_sz - take
+        return fills
+
+    def _match_resting(self, instId):
+        ordIds = self._open_orders.get(instId)
+        if not ordIds:
+            return
+        for ordId in list(ordIds):
+            order = self.orders[ordId]
+            remaining = float(order['sz']) - float(order['accFillSz'])
+            fills = self._take(instId, order['side'], remaining, float(order['px']))
+            if fills:
+                # 挂单被动成交 按挂单价算
+                filled = sum(sz for _, sz in fills)
+                self._fill(order, [(float(order['px']), filled)], self.maker_fee)
+            if order['state'] == 'filled':
+                ordIds.remove(ordId)
+
+    def _position_key(self, instId, posSide):
+        if self.instruments.posMode == 'net_mode':
+            return (instId, 'net')
+        return (instId, posSide)
+
+    def _lever(self, instId, mgnMode):
+        return float(self.instruments.get_leverage(instId, mgnMode) or self.default_lever)
+
+    # 下单前检查: 平仓单不能超过持仓 开仓单保证金要够
+    def _check(self, parameters, sz, px):
+        instId = parameters['instId']
+        key = self._position_key(instId, parameters.get('posSide', 'net'))
+        position = self.positions.get(key)
+        if self.instruments.posMode != 'net_mode' and self._closing(parameters['side'], parameters['posSide']):
+            if position is None or position['pos'] + 1e-12 < sz:
+                return error('51169', '没有可平的仓位')
+            return None
+        coin = self.instruments.to_coin(instId, sz)
+        required = coin * px / self._lever(instId, parameters['tdMode']) + coin * px * self.taker_fee
+        if required > self.available() + 1e-9:
+            return error('51008', '保证金不足')
+        return None
+
+    @staticmethod
+    def _closing(side, posSide):
+        return (posSide == 'long' and side == 'sell') or (posSide == 'short' and side == 'buy')
+
+    def _fill(self, order, fills, fee_rate):
+        instId = order['instId']
+        for px, sz in fills:
+            coin = self.instruments.to_coin(instId, sz)
+            fee = -coin * px * fee_rate
+            self._trade(order, px, sz, fee)
+            filled = float(order['accFillSz'])
+            order['avgPx'] = str((float(order['avgPx'] or 0) * filled + px * sz) / (filled + sz))
+            order['accFillSz'] = str(filled + sz)
+            order['fillPx'] = str(px)
+            order['fillSz'] = str(sz)
+            order['fee'] = str(float(order['fee']) + fee)
+            order['fillTime'] = str(self.now())
+        order['uTime'] = str(self.now())
+        order['state'] = 'filled' if float(order['accFillSz']) + 1e-12 >= float(order['sz']) else 'partially_filled'
+
+    # ========== 仓位 ==========
+
+    def _trade(self, order, px, sz, fee):
+        instId = order['instId']
+        key = self._position_key(instId, order['posSide'])
+        direction = 1 if order['side'] == 'buy' else -1
+        if key[1] == 'short':
+            direction = -direction
+        position = self._position(key, order)
+        position['fee'] += fee
+        self.balance += fee
+
+        # long/short 仓位 pos 恒为正 net 仓位 pos 带方向
+        if key[1] == 'net':
+            signed = direction * sz
+            if position['pos'] == 0 or (position['pos'] > 0) == (signed > 0):
+                self._open(position, px, signed)
+            else:
+                closed = min(abs(position['pos']), sz)
+                self._close(position, px, closed, CLOSE_ALL if closed >= abs(position['pos']) else CLOSE_PARTIAL)
+                if sz - closed > 1e-12:
+                    # 反手 平完剩下的部分开一个新仓位
+                    self._open(self._position(key, order), px, direction * (sz - closed))
+        elif direction > 0:
+            self._open(position, px, sz)
+        else:
+            self._close(position, px, sz, CLOSE_ALL if sz >= position['pos'] else CLOSE_PARTIAL)
+
+    def _position(self, key, order):
+        position = self.positions.get(key)
+        if position is None:
+            position = self.positions[key] = {
+                "instId": key[0], "posSide": key[1], "posId": str(next(self._posIds)), "pos": 0.0, "avgPx": 0.0,
+                "mgnMode": order['tdMode'], "lever": self._lever(key[0], order['tdMode']), "margin": 0.0,
+                "realizedPnl": 0.0, "fee": 0.0, "cTime": self.now()
+            }
+        return position
+
+    def _open(self, position, px, qty):
+        total = position['pos'] + qty
+        position['avgPx'] = (position['avgPx'] * abs(position['pos']) + px * abs(qty)) / abs(total)
+        position['pos'] = total
+        if position['mgnMode'] == 'isolated':
+            margin = self.instruments.to_coin(position['instId'], abs(qty)) * px / position['lever']
+            position['margin'] += margin
+            self.balance -= margin
+
+    def _sign(self, position):
+        if position['posSide'] == 'net':
+            return 1 if position['pos'] > 0 else -1
+        return 1 if position['posSide'] == 'long' else -1
+
+    def _close(self, position, px, qty, close_type):
+        sign = self._sign(position)
+        held = abs(position['pos'])
+        coin = self.instruments.to_coin(position['instId'], qty)
+        pnl = (px - position['avgPx']) * coin * sign
+        position['realizedPnl'] += pnl
+        self.balance += pnl
+        if position['mgnMode'] == 'isolated':
+            released = position['margin'] * qty / held
+            position['margin'] -= released
+            self.balance += released
+        position['pos'] -= qty * (sign if position['posSide'] == 'net' else 1)
+
+        fully_closed = abs(position['pos']) <= 1e-12
+        self.history.append({
+            "instId": position['instId'],
+            "posId": position['posId'],
+            "posSide": position['posSide'],
+            "mgnMode": position['mgnMode'],
+            "lever": '{:g}'.format(position['lever']),
+            "type": close_type if close_type == LIQUIDATION or not fully_closed else CLOSE_ALL,
+            "openAvgPx": str(position['avgPx']),
+            "closeAvgPx": str(px),
+            "closeTotalPos": str(qty),
+            "pnl": str(pnl),
+            "fee": str(position['fee']),
+            "realizedPnl": str(position['realizedPnl'] + position['fee']),
+            "cTime": str(position['cTime']),
+            "uTime": str(self.now())
+        })
+        if fully_closed:
+            del self.positions[(position['instId'], position['posSide'])]
+
+    def unrealized(self, position):
+        mark = self.mark_price(position['instId']) or position['avgPx']
+        coin = self.instruments.to_coin(position['instId'], abs(position['pos']))
+        return (mark - position['avgPx']) * coin * self._sign(position)
+
+    def _notional(self, position):
+        mark = self.mark_price(position['instId']) or position['avgPx']
+        return self.instruments.to_coin(position['instId'], abs(position['pos'])) * mark
+
+    # 账户权益 = 现金 + 逐仓保证金 + 所有未实现盈亏
+    def equity(self):
+        return self.balance + sum(position['margin'] + self.unrealized(position) for position in self.positions.values())
+
+    # 可用保证金 = 现金 + 全仓未实现盈亏 - 全仓占用保证金
+    def available(self):
+        cross = [position for position in self.positions.values() if position['mgnMode'] == 'cross']
+        return self.balance + sum(self.unrealized(position) - self._notional(position) / position['lever'] for position in cross)
+
+    def _liquidate(self, position):
+        px = self.mark_price(position['instId'])
+        self._close(position, px, abs(position['pos']), LIQUIDATION)
+
+    def _check_liquidation(self, instId):
+        for position in list(self.positions.values()):
+            if position['instId'] == instId and position['mgnMode'] == 'isolated':
+                if position['margin'] + self.unrealized(position) <= self._notional(position) * self.mmr:
+                    self._liquidate(position)
+
+        cross = [position for position in self.positions.values() if position['mgnMode'] == 'cross']
+        if cross:
+            cross_equity = self.balance + sum(self.unrealized(position) for position in cross)
+            if cross_equity <= sum(self._notional(position) * self.mmr for position in cross):
+                for position in cross:
+                    self._liquidate(position)
+
+    # ========== 和 OKXExchange 一样的接口 ==========
+
+    async def place_order(self, parameters, trace_id = None):
+        tracer.stamp(trace_id, 'submit', parameters['instId'])
+        instId = parameters['instId']
+        if self.instruments.get(instId) is None:
+            tracer.discard(trace_id)
+            return error('51001', '合约不存在')
+        sz = float(parameters['sz'])
+        ordType = parameters['ordType']
+        book = self.books.get(instId)
+        if ordType == 'market' and not book:
+            tracer.discard(trace_id)
+            return error('51000', '没有行情')
+        px = float(parameters['px']) if parameters.get('px') else self.mark_price(instId)
+        failed = self._check(parameters, sz, px)
+        if failed:
+            tracer.discard(trace_id)
+            return failed
+
+        ts = str(self.now())
+        order = {
+            "instId": instId,
+            "ordId": str(next(self._ordIds)),
+            "clOrdId": parameters.get('clOrdId', ''),
+            "side": parameters['side'],
+            "posSide": parameters.get('posSide', 'net'),
+            "ordType": ordType,
+            "tdMode": parameters['tdMode'],
+            "sz": str(parameters['sz']),
+            "px": str(parameters.get('px', '')),
+            "lever": str(int(self._lever(instId, parameters['tdMode']))),
+            "state": 'live',
+            "avgPx": '',
+            "fee": '0',
+            "accFillSz": '0',
+            "cTime": ts,
+            "uTime": ts,
+            "ts": ts
+        }
+        self.orders[order['ordId']] = order
+        tracer.stamp(trace_id, 'ack')
+
+        limit_px = None if ordType == 'market' else float(parameters['px'])
+        fills = [] if ordType == 'post_only' else self._take(instId, order['side'], sz, limit_px)
+        if fills:
+            self._fill(order, fills, self.taker_fee)
+        if order['state'] != 'filled':
+            if ordType == 'market':
+                # 市价单吃不完的部分撤掉
+                order['state'] = 'canceled'
+            else:
+                self._open_orders.setdefault(instId, []).append(order['ordId'])
+        tracer.stamp(trace_id, 'fill')
+        return dict(order)
+
+    async def cancel_order(self, instId, ordId):
+        order = self.orders.get(ordId)
+        if order is None or order['state'] in ('filled', 'canceled'):
+            return error('51400', '撤单失败')
+        order['state'] = 'canceled'
+        self._open_orders.get(instId, []).remove(ordId)
+        return {"code": '0', "msg": '', "data": [{"ordId": ordId, "clOrdId": order['clOrdId'], "sCode": '0'}]}
+
+    async def get_order(self, instId, ordId):
+        order = self.orders.get(ordId)
+        if order is None:
+            return error('51603', '订单不存在')
+        return dict(order)
+
+    async def get_positions(self, instId = None):
+        data = []
+        for position in self.positions.values():
+            if instId and position['instId'] != instId:
+                continue
+            item = {key: str(value) for key, value in position.items()}
+            item['lever'] = '{:g}'.format(position['lever'])
+            item['upl'] = str(self.unrealized(position))
+            item['markPx'] = str(self.mark_price(position['instId']) or '')
+            data.append(item)
+        return {"code": '0', "msg": '', "data": data}
+
+    async def get_positions_history(self, instId = None, limit = 100):
+        data = [item for item in reversed(self.history) if not instId or item['instId'] == instId]
+        return {"code": '0', "msg": '', "data": data[:limit]}
+
+    async def set_leverage(self, parameters):
+        self.instruments.set_leverage(parameters['instId'], parameters['mgnMode'], parameters['lever'])
+        return {"code": '0', "msg": '', "data": [{**parameters, "posSide": parameters.get('posSide', '')}]}
+
+    async def set_position_mode(self, posMode):
+        if self.positions:
+            return error('59000', '有持仓时不能切换持仓模式')
+        self.instruments.posMode = posMode
+        return {"code": '0', "msg": '', "data": [{"posMode": posMode}]}
+
+    async def get_account_balance(self):
+        return {"code": '0', "msg": '', "data": [{
+            "totalEq": str(self.equity()),
+            "details": [{"ccy": 'USDT', "eq": str(self.equity()), "cashBal": str(self.balance), "availEq": str(self.available())}]
+        }]}
+
+    async def get_order_list(self):
+        if not self.history:
+            return '没有平仓记录'
+        positions_data = self.history[-1]
+        state = '部分平仓' if positions_data['type'] == CLOSE_PARTIAL else '全部平仓'
+        return f"状态：  {state}\n最终收益:   {positions_data['realizedPnl']}\n手续费:   {positions_data['fee']}\n平仓收益:   {positions_data['pnl']}\n"
@@ -0,0 +1,69 @@
+import asyncio
+import itertools
+import time
+
+from exchanges.baseExchange import BaseExchange
+from exchanges.okx.instruments import InstrumentRegistry
+from utils.latency import tracer
+
+
+# 假交易所 下单按固定价格立刻成交 回放/压测时替代真实交易所
+class StubExchange(BaseExchange):
+    name = 'stub'
+
+    def __init__(self, price = 60000.0, lever = '50', latency = 0.0, fee_rate = 0.0005):
+        self.price = price
+        self.lever = lever
+        self.latency = latency
+        self.fee_rate = fee_rate
+        self.orders = {}
+        self._ids = itertools.count(1)
+        self.instruments = InstrumentRegistry(None)
+        self.instruments.add('BTC-USDT-SWAP', '0.01', '0.01', '0.01', '0.1')
+        self.instruments.add('ETH-USDT-SWAP', '0.1', '0.01', '0.01', '0.01')
+        self.instruments.add('SOL-USDT-SWAP', '1', '0.01', '0.01', '0.001')
+
+    async def place_order(self, parameters, trace_id = None):
+        tracer.stamp(trace_id, 'submit', parameters['instId'])
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        tracer.stamp(trace_id, 'ack')
+        ordId = str(next(self._ids))
+        sz = parameters['sz']
+        coin = self.instruments.to_coin(parameters['instId'], sz)
+        order = {
+            **parameters,
+            "ordId": ordId,
+            "clOrdId": parameters.get('clOrdId', ''),
+            "state": "filled",
+            "avgPx": str(self.price),
+            "fee": str(-coin * self.price * self.fee_rate),
+            "lever": self.lever,
+            "ts": str(int(time.time() * 1000))
+        }
+        self.orders[ordId] = order
+        tracer.stamp(trace_id, 'fill')
+        return order
+
+    async def cancel_order(self, instId, ordId):
+        return {"code": '0', "data": [{"ordId": ordId, "sCode": '0'}]}
+
+    async def get_order(self, instId, ordId):
+        return self.orders.get(ordId, {"code": '51603', "msg": 'Order does not exist'})
+
+    async def get_positions(self, instId = None):
+        return {"code": '0', "data": []}
+
+    async def set_leverage(self, parameters):
+        self.instruments.set_leverage(parameters['instId'], parameters['mgnMode'], parameters['lever'])
+        return {"code": '0', "data": [parameters]}
+
+    async def set_position_mode(self, posMode):
+        self.instruments.posMode = posMode
+        return {"code": '0', "data": [{"posMode": posMode}]}
+
+    async def get_account_balance(self):
+        return {"code": '0', "data": []}
+
+    async def get_order_list(self):
+        return "状态：  全部平仓\n"
@@ -1,83 +1,413 @@
-from time import sleep
-from exchanges.okx.okx import OKXExchange
-# from exchanges.mexc.mexc import MEXCExchange
+from exchanges.orderRouter import OrderRouter
+from exchanges.riskGate import RiskGate, is_open
+from utils.journal import journal
+from utils.config import TradeConfig
+from utils.notifier import notifier, CRITICAL, TRADE, INFO
+from utils.eventLog import events
+from utils.clock import clock
 import global_const
 import asyncio
+import importlib
+import traceback
+
+# 交易所模块用到时才导入 没配置的交易所不拖慢启动
+EXCHANGES = {
+    "okx": ('exchanges.okx.okx', 'OKXExchange'),
+    "mexc": ('exchanges.mexc.mexc', 'MEXCExchange')
+}
+
+
+def exchange_class(name):
+    module, attr = EXCHANGES[name]
+    return getattr(importlib.import_module(module), attr)
+
+
+# 同一条消息每次生成的 clOrdId 都一样 超时重发不会重复开单
+# OKX 要求字母开头 只能有字母数字 最长 32 位
+def client_order_id(chat_id, message_id):
+    return 't' + format(abs(chat_id), 'x') + 'm' + format(message_id, 'x')
+
+# positions-history 的一条记录 type 1 是部分平仓
+def close_summary(name, item):
+    state = '部分平仓' if item.get('type') == '1' else '全部平仓'
+    return f"[{state}] {name} {item['instId']}\n最终收益:   {item.get('realizedPnl')}\n手续费:   {item.get('fee')}\n平仓收益:   {item.get('pnl')}\n"
+
 
 class TradeManager:
-    def __init__(self, exchange_name):
-        self._exchange_config = None
-        self._exchange_name = exchange_name
-        self._apikey = None
-        self._secretkey = None
-        self._passphrase = None
+    def __init__(self, exchange_names):
+        if isinstance(exchange_names, str):
+            exchange_names = [exchange_names]
+        self._exchange_names = list(exchange_names)
+        # 第一个是主交易所 信号数量按它的合约换算
+        self._exchange_name = self._exchange_names[0]
+        self._exchange_configs = {}
         self._exchanges = None
         self._exchange = None
+        self._router = None
+        # 后台任务需要持有引用 否则可能被回收
+        self._tasks = set()
+        # 下单前风控 读各交易所的账户状态缓存
+        self.risk = RiskGate()
+        # 杠杆、保证金模式、数量倍数等 默认值见 utils/config.py
+        self.configure(TradeConfig())
+        # 多账户跟单 见 exchanges/copyTrading.py 没配置 accounts.json 时为 None
+        self.copy_pool = None
+        # 套利扫描 配置了 arb_pairs 才启动
+        self.scanner = None
+        self._scanner_tasks = []
+        # 自动下的对冲单 (币种, 多头交易所, 空头交易所) -> 名义价值 同一组还开着时不再下
+        self._hedges = {}
+        # 自动滚仓 配置了 roll_add_step 才启动
+        self.roll_engine = None
+
+    def configure(self, trade):
+        self.trade = trade
+        # 预热时设置杠杆的合约 其他合约信号也能开单 只是不会预先设置杠杆
+        self._instIds = list(trade.instIds)
+        self._lever = trade.lever
+        self._mgnMode = trade.tdMode # cross 全仓 # isolated 逐仓
+        self._posMode = trade.posMode
+        self._size_multiplier = trade.size_multiplier
+        self._close_query_delay = trade.close_query_delay
+        self._batch_window = trade.batch_window
+        self._arb_notional = trade.arb_notional
+        self._arb_max_exposure = trade.arb_max_exposure
+        self._order_ttl = trade.order_ttl
+        events.configure(trade.log_levels)
+        self.risk.configure(trade)
+        for exchange in (self._exchanges or {}).values():
+            self.set_batch_window(exchange)
+
+    def set_batch_window(self, exchange):
+        if hasattr(exchange, 'batcher'):
+            exchange.batcher.window = self._batch_window
 
-    def set_exchange_config(self, exchange_config):
-        self._exchange_config = exchange_config
-        self._apikey = exchange_config['apikey']
-        self._secretkey = exchange_config['secretkey']
-        self._passphrase = exchange_config['Passphrase'] or ''
+    # 运行中改了配置 只补设有变化的持仓模式和杠杆 不重连交易所
+    async def apply_config(self, trade):
+        self.configure(trade)
+        if self.copy_pool:
+            self.copy_pool.apply_config(trade)
+        if self._exchanges:
+            await asyncio.gather(*(self.sync_account(exchange) for exchange in self._exchanges.values()))
+
+    def set_exchange_config(self, exchange_config, exchange_name = None):
+        self._exchange_configs[exchange_name or self._exchange_name] = exchange_config
 
     def set_exchanges(self):
-        self._exchanges = {
-            "okx": OKXExchange(self._apikey, self._secretkey, self._passphrase),
-            # "mexc": MEXCExchange(self._apikey, self._secretkey)
-        }
+        self._exchanges = {}
+        for name in self._exchange_names:
+            config = self._exchange_configs[name]
+            self.add_exchange(name, exchange_class(name)(config['apikey'], config['secretkey'], config.get('Passphrase') or ''))
+
+    # 直接挂一个交易所实例 回放/模拟盘用
+    def add_exchange(self, name, exchange):
+        if self._exchanges is None:
+            self._exchanges = {}
+        self._exchanges[name] = exchange
+        self.set_batch_window(exchange)
         self._exchange = self._exchanges.get(self._exchange_name)
+        self._router = OrderRouter(self._exchanges)
 
-    def get_account_balance(self):
-        account_balance = self._exchange.get_account_balance()
-        print(account_balance)
+    # 合约信息的本地缓存 {交易所名: InstrumentRegistry.dump()}
+    def restore_instruments(self, cached):
+        for name, exchange in self._exchanges.items():
+            if exchange.instruments.restore(cached.get(name)):
+                print(name + ' 合约信息使用本地缓存')
+
+    def dump_instruments(self):
+        return {name: exchange.instruments.dump() for name, exchange in self._exchanges.items() if exchange.instruments.updated_at}
+
+    # 建立交易所的 websocket 等长连接
+    async def start(self):
+        self.recover_positions()
+        for exchange in self._exchanges.values():
+            await exchange.start()
+        await asyncio.gather(*(self.warm_up(exchange) for exchange in self._exchanges.values()))
+
+    # 重启后从交易记录恢复持仓 放进各交易所的账户状态 交易所的持仓拉到之前风控按它检查
+    def recover_positions(self):
+        if not journal.enabled:
+            return
+        for position in journal.open_positions():
+            print(f"恢复持仓 {position['venue']} {position['instId']} {position['posSide']} {position['pos']} 均价 {position['avgPx']}")
+            exchange = self._exchanges.get(position['venue'])
+            if exchange is not None and exchange.account is not None:
+                exchange.account.restore([position], exchange.instruments)
+
+    # 启动时加载合约信息 杠杆和持仓模式跟目标不一致时才设置 每个合约只做一次
+    async def warm_up(self, exchange):
+        await exchange.instruments.load(self._instIds, self._mgnMode)
+        await self.sync_account(exchange)
+        exchange.instruments.start_refresh()
 
-    def set_lever(self):
-        mgnMode = "cross" # cross 全仓 # isolated 逐仓
+    async def sync_account(self, exchange):
+        instruments = exchange.instruments
+        if instruments.posMode != self._posMode:
+            await self.setpositions(exchange)
+        for instId in self._instIds:
+            if instruments.get_leverage(instId, self._mgnMode) != self._lever:
+                await self.set_lever(instId, exchange)
 
+    # 把协程放到事件循环里执行 不阻塞调用方
+    def create_task(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    # 后台任务没人 await 异常会被吞掉 记到事件日志并发告警
+    def _task_done(self, task):
+        self._tasks.discard(task)
+        if task.cancelled() or task.exception() is None:
+            return
+        error = task.exception()
+        name = getattr(task.get_coro(), '__qualname__', task.get_name())
+        events.error('trade', 'task_failed', task=name, error=repr(error), traceback=''.join(traceback.format_exception(error)))
+        notifier.notify(f'后台任务出错 {name}: {error!r}', CRITICAL)
+
+    async def get_account_balance(self):
+        account_balance = await self._exchange.get_account_balance()
+        print(account_balance)
+
+    async def set_lever(self, instId, exchange = None):
+        exchange = exchange or self._exchange
         leverage = {
-            "instId": 'BTC-USDT-SWAP',
-            "mgnMode": mgnMode,
-            "lever": "50"
+            "instId": instId,
+            "mgnMode": self._mgnMode,
+            "lever": self._lever
         }
 
         try:
-            self._exchange.set_leverage(leverage)
+            await exchange.set_leverage(leverage)
         except BaseException as error:
             print(error)
             print('杠杆失败')
 
-    def setpositions(self):
+    async def setpositions(self, exchange = None):
+        exchange = exchange or self._exchange
         try: 
-            self._exchange.accountAPI.set_position_mode(posMode="long_short_mode")
-            print('持仓模式设置成功')
+            await exchange.set_position_mode(self._posMode)
+            print(exchange.name + ' 持仓模式设置成功')
         except BaseException as error:
             print(error)
    
 
 
-    #  开单方法
+    #  开单方法 同一个信号同时发到所有交易所
     async def open_position(self, current_order):
         
         # current_flag = global_const.get_value('flag')
-        # 1 = 0.01BTC
-        # margin = float(current_order['quantity']) * 2
-        # mgnMode = "cross" # cross 全仓 # isolated 逐仓
-        parameters = {
-            "instId": current_order['market'],
-            "tdMode": "cross", 
-            "side": current_order['side'],
-            "posSide": current_order['posSide'],
-            "ordType": "market",
-            "sz":  float(current_order['quantity']) * 2
-        }
+        instId = current_order['market']
+        journal.record_signal(current_order)
+        # 先按主交易所换算成币的数量 各交易所再换成自己的张数
+        coin = self._exchange.instruments.to_coin(instId, float(current_order['quantity']) * self._size_multiplier)
+        clOrdId = client_order_id(*current_order['trace_id'])
+        # kill switch 打开时跟单账户也不开仓
+        if self.risk.kill_switch and is_open(current_order['side'], current_order['posSide']):
+            self.reject(current_order, 'kill switch 已打开')
+            return
+        # 订单过期时间从收到信号算 排队/重试超过 order_ttl 交易所会拒绝
+        if self._order_ttl:
+            current_order['expTime'] = current_order['which_time'] + int(self._order_ttl * 1000)
+            if clock.now_ms() > current_order['expTime']:
+                self.reject(current_order, f'信号已超过 {self._order_ttl} 秒')
+                return
+        # 先发给跟单进程 它们和主账户同时下单
+        if self.copy_pool:
+            self.copy_pool.publish(current_order, clOrdId)
+        # 各交易所在途开仓单的风控占用 回报后释放
+        reservations = {}
 
-        print(parameters)
+        def build_parameters(name, exchange):
+            if current_order.get('exchanges') and name not in current_order['exchanges']:
+                return None
+            if exchange is not self._exchange and exchange.instruments.get(instId) is None:
+                events.warning('trade', 'no_instrument', venue=name, instId=instId)
+                return None
+            sz, reason = self.risk.size(exchange.account, exchange.instruments, instId, current_order['side'], current_order['posSide'], coin, self._lever)
+            if float(sz) <= 0:
+                self.reject(current_order, f'{name} {reason or "数量为 0"}')
+                return None
+            if reason:
+                events.warning('risk', 'resize', venue=name, instId=instId, coin=coin, sz=sz, reason=reason)
+                notifier.notify(f"[风控缩单] {name} {instId} {exchange.instruments.from_coin(instId, coin)} -> {sz} 张\n{reason}", INFO)
+            parameters = {
+                "instId": instId,
+                "tdMode": self._mgnMode,
+                "side": current_order['side'],
+                "posSide": current_order['posSide'],
+                "ordType": "market",
+                "sz": sz,
+                "clOrdId": clOrdId
+            }
+            if current_order.get('expTime'):
+                parameters['expTime'] = current_order['expTime']
+            reservations[name] = self.risk.reserve(exchange.account, instId, current_order['side'], current_order['posSide'], exchange.instruments.to_coin(instId, sz), self._lever)
+            events.info('trade', 'order', venue=name, parameters=parameters)
+            return parameters
+
+        async def on_result(name, orderInfo):
+            self.risk.release(reservations.pop(name, None))
+            await self.report_order(self._exchanges[name], current_order, orderInfo)
 
         # 开单
-        orderInfo = self._exchange.place_order(parameters)
+        try:
+            await self._router.fan_out(build_parameters, on_result, current_order['trace_id'])
+        finally:
+            for token in reservations.values():
+                self.risk.release(token)
+
+    def reject(self, current_order, reason):
+        events.warning('risk', 'reject', operation=current_order['operation'], market=current_order['market'], reason=reason)
+        notifier.notify(f"[风控拒绝] [{current_order['operation']}] {current_order['market']} 数量 {current_order['quantity']}\n{reason}", CRITICAL)
+
+    # 不再是主实例时停掉会自己下单的套利扫描和滚仓 下次 start_arbitrage / start_roll 重新启动
+    def stop_auto(self):
+        for task in self._scanner_tasks:
+            task.cancel()
+        self._scanner_tasks = []
+        self.scanner = None
+        self.roll_engine = None
+
+    # 按配置的 arb_pairs 订阅 OKX 和 MEXC 的公共行情 扫描结果回调 on_opportunity
+    def start_arbitrage(self):
+        if not self.trade.arb_pairs or self._scanner_tasks:
+            return
+        from exchanges.arbScanner import ArbScanner, subscribe_okx
+        from exchanges.okx.okxWebsocket import OKXWebsocket, PUBLIC_WS_URL, DEMO_PUBLIC_WS_URL
+        venues = [name for name in self._exchange_names if name in ('okx', 'mexc')]
+        self.scanner = ArbScanner(venues, self.trade.arb_pairs, on_opportunity=self.on_opportunity)
+        if 'okx' in venues:
+            websocket = OKXWebsocket(DEMO_PUBLIC_WS_URL if global_const.get_value('flag') == '1' else PUBLIC_WS_URL)
+            subscribe_okx(websocket, self.scanner)
+            self._scanner_tasks.append(asyncio.create_task(websocket.run_forever()))
+        if 'mexc' in venues:
+            from exchanges.mexc.mexcWebsocket import MEXCTickerWebsocket
+            self._scanner_tasks.append(asyncio.create_task(MEXCTickerWebsocket(self.trade.arb_pairs, self.scanner).run_forever()))
+
+    # 主交易所的持仓交给滚仓引擎 标记价格从公共频道 mark-price 推送
+    async def start_roll(self):
+        if not self.trade.roll_add_step or self.roll_engine or self._exchange_name != 'okx':
+            return
+        from exchanges.rollEngine import RollEngine, subscribe_marks
+        from exchanges.okx.okxWebsocket import OKXWebsocket, PUBLIC_WS_URL, DEMO_PUBLIC_WS_URL
+        self.roll_engine = RollEngine(self._exchange, add_step=self.trade.roll_add_step, take_profit=self.trade.roll_take_profit, tdMode=self._mgnMode, risk=self.risk)
+        await self.roll_engine.sync_positions()
+        # 全仓仓位的强平价来自 positions 推送
+        self._exchange.websocket.subscribe({"channel": "positions", "instType": "SWAP"}, self.on_roll_position)
+        websocket = OKXWebsocket(DEMO_PUBLIC_WS_URL if global_const.get_value('flag') == '1' else PUBLIC_WS_URL)
+        subscribe_marks(websocket, self.roll_engine, self._instIds)
+        self._scanner_tasks.append(asyncio.create_task(websocket.run_forever()))
+
+    def on_roll_position(self, item):
+        if self.roll_engine:
+            self.roll_engine.on_position(item)
+
+    # 套利扫描器(exchanges/arbScanner.py)的回调 两个交易所同时下一多一空
+    # 基差机会要买现货 只通知 两条腿的交易所没有都配置也只通知
+    # 同一币种同一对交易所的对冲单还开着时跳过 合计名义价值超过 arb_max_exposure 时只通知
+    def on_opportunity(self, opportunity):
+        key = (opportunity['pair'], opportunity['long'], opportunity['short'])
+        if key in self._hedges:
+            events.debug('trade', 'hedge_skip', pair=key[0], long=key[1], short=key[2], reason='open')
+            return
+        text = f"[套利 {opportunity['kind']}] {opportunity['pair']} {opportunity['value']:.4%}\n多 {opportunity['long']} {opportunity['longPx']}\n空 {opportunity['short']} {opportunity['shortPx']}"
+        legs = {opportunity['long'], opportunity['short']}
+        if opportunity['kind'] == 'basis' or not self._arb_notional or not legs <= set(self._exchanges or {}):
+            notifier.notify(text, INFO)
+            return
+        if self.risk.kill_switch:
+            notifier.notify(text + "\nkill switch 已打开 不下单", INFO)
+            return
+        exposure = sum(self._hedges.values())
+        if exposure + self._arb_notional > self._arb_max_exposure:
+            notifier.notify(text + f"\n已开对冲 {exposure:.2f} 上限 {self._arb_max_exposure} 不下单", INFO)
+            return
+        # 下单前先占住 下单期间再来的同一个机会直接跳过
+        self._hedges[key] = self._arb_notional
+        notifier.notify(text, TRADE)
+        self.create_task(self.open_hedge(opportunity))
+
+    # 两条腿都没成交时释放占用 有一条成交就算开着 要手动平仓后 release_hedge
+    async def open_hedge(self, opportunity):
+        results = {}
+        try:
+            results = await self._open_hedge(opportunity)
+        finally:
+            if all('code' in item for item in results.values()):
+                self._hedges.pop((opportunity['pair'], opportunity['long'], opportunity['short']), None)
+        return results
 
-        if not ('code' in orderInfo and orderInfo['code'] == '1') :
+    # pair 是 BTC-USDT 这种格式
+    def release_hedge(self, pair, long, short):
+        return self._hedges.pop((pair, long, short), None)
+
+    # 两条腿都过风控才下单 一条被缩小另一条也按同样的币数量下 不留单边敞口
+    async def _open_hedge(self, opportunity):
+        instId = opportunity['instId']
+        coin = self._arb_notional / opportunity['longPx']
+        legs = {opportunity['long']: ('buy', 'long'), opportunity['short']: ('sell', 'short')}
+        reasons = []
+        for name, (side, posSide) in legs.items():
+            exchange = self._exchanges[name]
+            allowed, reason = self.risk.check(exchange.account, instId, side, posSide, coin, self._lever)
+            if reason:
+                coin = min(coin, allowed)
+                reasons.append(f'{name} {reason}')
+        sizes = {}
+        for name, (side, posSide) in legs.items():
+            exchange = self._exchanges[name]
+            sz, _ = self.risk.size(exchange.account, exchange.instruments, instId, side, posSide, coin, self._lever)
+            if float(sz) <= 0 or exchange.instruments.to_coin(instId, sz) > coin:
+                events.warning('risk', 'reject', operation='hedge', market=instId, reason=reasons)
+                notifier.notify(f"[风控拒绝] 套利 {opportunity['pair']} 多 {opportunity['long']} 空 {opportunity['short']}\n" + '\n'.join(reasons or [f'{name} 数量为 0']), CRITICAL)
+                return {}
+            sizes[name] = sz
+        # 各条腿在途的风控占用 回报后释放
+        reservations = {}
+
+        def build_parameters(name, exchange):
+            if name not in legs:
+                return None
+            side, posSide = legs[name]
+            parameters = {
+                "instId": instId,
+                "tdMode": self._mgnMode,
+                "side": side,
+                "posSide": posSide,
+                "ordType": "market",
+                "sz": sizes[name]
+            }
+            if self._order_ttl:
+                parameters['expTime'] = clock.now_ms() + int(self._order_ttl * 1000)
+            reservations[name] = self.risk.reserve(exchange.account, instId, side, posSide, exchange.instruments.to_coin(instId, sizes[name]), self._lever)
+            events.info('trade', 'hedge_order', venue=name, kind=opportunity['kind'], parameters=parameters)
+            return parameters
+
+        async def on_result(name, orderInfo):
+            self.risk.release(reservations.pop(name, None))
+            if 'code' in orderInfo:
+                notifier.notify(f"套利下单失败 {name} {orderInfo}", CRITICAL)
+            else:
+                journal.record_order(name, orderInfo)
+                notifier.notify(f"套利成交 {name} {orderInfo['side']} {orderInfo['posSide']} 均价 {orderInfo['avgPx']} 数量 {orderInfo['sz']}", TRADE)
+
+        try:
+            return await self._router.fan_out(build_parameters, on_result)
+        finally:
+            for token in reservations.values():
+                self.risk.release(token)
+
+    # 下单结果放进 telegram 通知队列 不等发送
+    async def report_order(self, exchange, current_order, orderInfo):
+        instruments = exchange.instruments
+        instId = current_order['market']
+
+        if 'code' not in orderInfo:
             import datetime
+            journal.record_order(exchange.name, orderInfo, current_order)
+            if self.roll_engine and exchange is self._exchange:
+                self.roll_engine.on_fill(orderInfo)
             open_amount = float(orderInfo['avgPx'])
             open_time = int(orderInfo['ts'])
             fee = float(orderInfo['fee'])
@@ -85,7 +415,7 @@ class TradeManager:
             direction = orderInfo['side']
             pos_side = orderInfo['posSide']
             ordId = orderInfo['ordId']
-            sz = int(orderInfo['sz'])
+            sz = float(orderInfo['sz'])
             # 根据买卖方向设置字符串
             # print(orderInfo)
 
@@ -107,19 +437,38 @@ class TradeManager:
             which_formatted_time =  datetime.datetime.fromtimestamp(which_time / 1000).strftime('%Y-%m-%d %H:%M:%S')
             formatted_open_time = datetime.datetime.fromtimestamp(open_time / 1000).strftime('%Y-%m-%d %H:%M:%S')
 
+            # 三个时间都在交易所时钟上(which_time 用校准后的时钟) 可以直接相减
             diff_time = (open_time - p_time) / 1000
-            # 1 = 0.001BTC
-            final_string = f"[{action_type}] \n订单id:    {ordId}\n持仓数:    {sz / 100} \n开单价格:   {open_amount}\n普哥开单时间:   {p_time}({p_formatted_open_time}) \n监听消息时间:    {which_time}({which_formatted_time}) \n开单时间:     {open_time}({formatted_open_time})\n相差时间:   {diff_time}秒\n手续费:   {fee}\n杠杆:     {leverage} \n"
-            
-            telegram_client = global_const.get_value('telegram_client')  
-            await telegram_client.send_message(1002143229912, str(final_string))
+            receive_time = (which_time - p_time) / 1000
+            # 张数换算成币 BTC-USDT-SWAP 1 张 = 0.01BTC
+            final_string = f"[{action_type}] {exchange.name}\n订单id:    {ordId}\n持仓数:    {instruments.to_coin(instId, sz)} \n开单价格:   {open_amount}\n普哥开单时间:   {p_time}({p_formatted_open_time}) \n监听消息时间:    {which_time}({which_formatted_time}) \n开单时间:     {open_time}({formatted_open_time})\n收到信号延迟:   {receive_time}秒\n相差时间:   {diff_time}秒\n手续费:   {fee}\n杠杆:     {leverage} \n"
+
+            notifier.notify(final_string, TRADE)
             if(action_type == '平空' or action_type == '平多'):
-                await telegram_client.send_message(1002143229912, str("15秒后进行该笔订单的信息查询……"))
-                sleep(15)
-                final_his = self._exchange.get_order_list()
-                await telegram_client.send_message(1002143229912, str(final_his))
+                notifier.notify(f"等待该笔订单的平仓收益(最多{self._close_query_delay}秒)……", INFO)
+                self.create_task(self.query_close_result(exchange, self._close_query_delay, instId, pos_side, open_time))
 
         else:
-            await telegram_client.send_message(1002143229912, str(orderInfo))
+            notifier.notify(exchange.name + ' ' + str(orderInfo), CRITICAL)
+
+    # 平仓后等这个仓位的平仓记录 放在后台任务里不占用下单流程
+    # OKX 收到 positions 推送就去查 最多等 timeout 秒 没有历史仓位接口的交易所等完再取文本
+    async def query_close_result(self, exchange, timeout, instId, posSide, since):
+        try:
+            item = await exchange.wait_close(instId, posSide, since, timeout)
+        except NotImplementedError:
+            notifier.notify(await exchange.get_order_list(), TRADE)
+            return
+        if item is None:
+            notifier.notify(f"{exchange.name} {instId} {timeout}秒内没有查到平仓记录", INFO)
+            return
+        notifier.notify(close_summary(exchange.name, item), TRADE)
+        journal.record_pnl(exchange.name, item)
 
-    
\ No newline at end of file
+    async def close(self):
+        for task in self._scanner_tasks:
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        for exchange in (self._exchanges or {}).values():
+            await exchange.close()
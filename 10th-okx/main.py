@@ -1,53 +1,59 @@
+# 最先导入 从这里开始计启动耗时
+from utils.startup import timer
 import sys
 import asyncio
 from utils.ioFile import create_file_content
+from utils.config import ConfigStore, ConfigError
 
-exchange_name = 'okx' # 开单平台 
+# 开单平台在 .config.json 的 exchanges 里配置 默认 ['okx'] 可以同时填多个 例如 ['okx', 'mexc'] 第一个为主交易所
+config_store = ConfigStore('./config/.config.json')
 
-# 检查telegram 配置
+# 检查telegram 配置 解析一次之后都用缓存 运行中改文件会热更新
 def checkout_telegram_config():
-    telegram_config_path = './config/.config.json'
-    telegram_config_center = create_file_content(telegram_config_path, 'api_id,api_hash,group_id')
-    if not telegram_config_center:
+    try:
+        config = config_store.load()
+    except FileNotFoundError:
+        # 生成一个空模板
+        create_file_content(config_store.path, 'api_id,api_hash,group_id')
         sys.exit()
-    else:
-        print('telegram配置正常')
-
-    api_id, api_hash, group_id = telegram_config_center['api_id'], telegram_config_center['api_hash'], telegram_config_center['group_id']
-    return {
-        "api_id": api_id,
-        "api_hash": api_hash,
-        "group_id": group_id
-    }
+    except (ConfigError, ValueError) as error:
+        print(error)
+        sys.exit()
+    print('telegram配置正常')
+    return config
 
 # 检查交易所配置
-def checkout_exchange_config():
-    if exchange_name == 'okx':
-        exchange_path = './exchanges/okx/key.json'
-    elif exchange_name == 'mexc':
-        exchange_path = './exchanges/mexc/key.json'
-    else:
-        print('请检查开单平台配置')
-        sys.exit()
+def checkout_exchange_config(exchange_names):
+    for exchange_name in exchange_names:
+        if exchange_name == 'okx':
+            exchange_path = './exchanges/okx/key.json'
+            exchange_keys = 'apikey,secretkey,Passphrase'
+        elif exchange_name == 'mexc':
+            exchange_path = './exchanges/mexc/key.json'
+            exchange_keys = 'apikey,secretkey'
+        else:
+            print('请检查开单平台配置')
+            sys.exit()
 
-    exchange_config_center = create_file_content(exchange_path, 'apikey,secretkey,Passphrase')
+        exchange_config_center = create_file_content(exchange_path, exchange_keys)
 
-    if not exchange_config_center:
-        sys.exit()
-    else:
-        print('交易所配置正常')
+        if not exchange_config_center:
+            sys.exit()
+        else:
+            print(exchange_name + ' 交易所配置正常')
 
 # 创建telegram 实例
-def create_telegram_client(telegram_API_config):
+def create_telegram_client(telegram_API_config, session = 'session_name'):
     import socks  # pysocks
     from telethon_client import telethon_client
-    api_id = telegram_API_config['api_id']
-    api_hash = telegram_API_config['api_hash']
-    group_id = telegram_API_config['group_id']
+    api_id = telegram_API_config.api_id
+    api_hash = telegram_API_config.api_hash
+    group_id = telegram_API_config.group_id
+    chats = telegram_API_config.chats
     
     proxy = (socks.SOCKS5, '127.0.0.1', 7890)
     # proxy = ""
-    telethonchen = telethon_client(api_id, api_hash, group_id, proxy)
+    telethonchen = telethon_client(api_id, api_hash, group_id, proxy, chats, session=session)
     if telethonchen:
         print('telegram 创建实例正常')
         return telethonchen
@@ -56,17 +62,31 @@ def create_telegram_client(telegram_API_config):
 
 # 检查环境
 def checkout_env():
-    telegram_API_config = checkout_telegram_config()
-    checkout_exchange_config()
-    return telegram_API_config
+    config = checkout_telegram_config()
+    checkout_exchange_config(config.exchanges)
+    return config
+
+
+# 热备 同一台机器跑多个实例 python main.py --instance a / python main.py --instance b
+# 每个实例用自己的 telegram session(每个 session 第一次要登录) 录制/缓存/事件日志分开 只有主实例下单 见 utils/leader.py
+def instance_options(instance):
+    if not instance:
+        return 'session_name', {}
+    return 'session_' + instance, {
+        "instance": instance,
+        "record_path": f'./config/record_{instance}.jsonl',
+        "cache_path": f'./config/cache_{instance}.json',
+        "events_path": f'./config/events_{instance}.jsonl'
+    }
 
 
 if __name__ == '__main__':
-    telegram_API_config = checkout_env()
-    telegram_client = create_telegram_client(telegram_API_config)
+    instance = sys.argv[sys.argv.index('--instance') + 1] if '--instance' in sys.argv[:-1] else None
+    config = checkout_env()
+    timer.mark('checkout')
+    session, options = instance_options(instance)
+    telegram_client = create_telegram_client(config.telegram, session)
+    timer.mark('imports')
     loop = asyncio.get_event_loop()
-    loop.run_until_complete(telegram_client.run(exchange_name))
-    # 考虑：
-    #     1 是否要做成多个交易所同时开单
-    #     2 是否要监听多个群聊
+    loop.run_until_complete(telegram_client.run(config.exchanges, config_store=config_store, **options))
 
@@ -0,0 +1,363 @@
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+
+from aiohttp import web, WSMsgType
+
+'''
+    本地替身 OKX 服务 不需要网络和真实账号
+    REST: 合约信息/账户配置/下单/查单/杠杆/持仓模式/余额/历史仓位
+    WebSocket: /ws/v5/private 登录后订阅 orders / positions / account 频道 下单后推送成交/仓位/账户变化
+    仓位按 (instId, posSide) 记 net 模式买入开仓卖出平仓 平仓后写历史仓位 posId 和 OKX 一样平了再开会复用
+    latency/jitter 给每个 REST 请求加延迟(秒) error_rate 按概率让下单返回 error_codes 里的错误 压测用
+    用法: python -m mock.okxServer [--latency 0.02 --jitter 0.01 --error-rate 0.05] 然后把 OKXExchange 的 base_url / ws_url 指到本地
+'''
+
+
+def now_ms():
+    return str(int(time.time() * 1000))
+
+
+def ok(data):
+    return web.json_response({"code": "0", "msg": "", "data": data})
+
+
+class MockOKXServer:
+    def __init__(self, price = 60000.0, lever = '50', equity = 10000.0, ct_val = 0.01, fee_rate = 0.0005, fill_delay = 0.005, latency = 0.0, jitter = 0.0, error_rate = 0.0, error_codes = ('50011', '50001'), seed = None):
+        self.price = price
+        self.lever = lever
+        self.posMode = 'net_mode'
+        self.equity = equity
+        self.clock_offset = 0
+        self.ct_val = ct_val
+        self.fee_rate = fee_rate
+        self.fill_delay = fill_delay
+        self.orders = {}
+        # 下单接口被调用的次数 对比批量下单省了几次往返
+        self.order_requests = 0
+        # 接下来的下单请求依次返回这些错误码 测试重试用 例如 ['50011']
+        self.inject_errors = []
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_codes = list(error_codes)
+        # 按 error_rate 注入的错误数 / 过了 expTime 被拒绝的请求数
+        self.injected = 0
+        self.expired = 0
+        self._random = random.Random(seed)
+        self._clOrdIds = {}
+        self.positions = {}
+        self.history = []
+        self._posIds = {}
+        self._ids = itertools.count(1)
+        self._subscribers = set()
+        self._runner = None
+        self.app = web.Application(middlewares=[self._delay])
+        self.app.add_routes([
+            web.get('/api/v5/public/time', self.public_time),
+            web.get('/api/v5/public/mark-price', self.mark_price),
+            web.get('/api/v5/account/positions', self.get_positions),
+            web.get('/api/v5/public/instruments', self.instruments),
+            web.get('/api/v5/account/config', self.account_config),
+            web.get('/api/v5/account/leverage-info', self.leverage_info),
+            web.post('/api/v5/trade/order', self.place_order),
+            web.post('/api/v5/trade/batch-orders', self.batch_orders),
+            web.get('/api/v5/trade/order', self.get_order),
+            web.post('/api/v5/account/set-leverage', self.set_leverage),
+            web.post('/api/v5/account/set-position-mode', self.set_position_mode),
+            web.get('/api/v5/account/balance', self.balance),
+            web.get('/api/v5/account/positions-history', self.positions_history),
+            web.get('/ws/v5/private', self.private_ws),
+        ])
+
+    async def start(self, host = '127.0.0.1', port = 8765):
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        return 'http://%s:%s' % (host, port), 'ws://%s:%s/ws/v5/private' % (host, port)
+
+    # 模拟网络和撮合延迟 websocket 不受影响
+    @web.middleware
+    async def _delay(self, request, handler):
+        if (self.latency or self.jitter) and request.path != '/ws/v5/private':
+            await asyncio.sleep(self.latency + self._random.uniform(0, self.jitter))
+        return await handler(request)
+
+    # 按概率抽一个错误码 不出错返回 None
+    def _random_error(self):
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.injected += 1
+            return self._random.choice(self.error_codes)
+        return None
+
+    async def stop(self):
+        for ws in list(self._subscribers):
+            await ws.close()
+        if self._runner:
+            await self._runner.cleanup()
+
+    # 交易所时间 = 本机时间 + clock_offset(毫秒) 模拟本机时钟不准
+    def server_ms(self):
+        return int(now_ms()) + self.clock_offset
+
+    async def public_time(self, request):
+        return ok([{"ts": str(self.server_ms())}])
+
+    async def mark_price(self, request):
+        return ok([{"instId": instId, "instType": "SWAP", "markPx": str(self.price), "ts": now_ms()} for instId in ('BTC-USDT-SWAP', 'ETH-USDT-SWAP')])
+
+    async def instruments(self, request):
+        return ok([{
+            "instId": "BTC-USDT-SWAP", "instType": "SWAP", "ctVal": str(self.ct_val), "ctValCcy": "BTC",
+            "lotSz": "0.01", "minSz": "0.01", "tickSz": "0.1", "lever": "100", "state": "live"
+        }, {
+            "instId": "ETH-USDT-SWAP", "instType": "SWAP", "ctVal": "0.1", "ctValCcy": "ETH",
+            "lotSz": "0.01", "minSz": "0.01", "tickSz": "0.01", "lever": "100", "state": "live"
+        }])
+
+    async def account_config(self, request):
+        return ok([{"posMode": self.posMode, "acctLv": "2"}])
+
+    async def leverage_info(self, request):
+        return ok([
+            {"instId": instId, "mgnMode": request.query.get('mgnMode', 'cross'), "posSide": "", "lever": self.lever}
+            for instId in request.query.get('instId', '').split(',') if instId
+        ])
+
+    # 请求头 expTime(毫秒) 已经过了就拒绝
+    def _expired(self, request):
+        expTime = request.headers.get('expTime')
+        if expTime and self.server_ms() > int(expTime):
+            self.expired += 1
+            return web.json_response({"code": "50102", "msg": "Timestamp request expired", "data": []})
+        return None
+
+    async def place_order(self, request):
+        self.order_requests += 1
+        expired = self._expired(request)
+        if expired:
+            return expired
+        if self.inject_errors:
+            return web.json_response({"code": self.inject_errors.pop(0), "msg": "injected", "data": []})
+        code = self._random_error()
+        if code:
+            return web.json_response({"code": code, "msg": "injected", "data": []})
+        return ok([self._accept(await request.json(), request.headers.get('OK-ACCESS-KEY', ''))])
+
+    async def batch_orders(self, request):
+        self.order_requests += 1
+        expired = self._expired(request)
+        if expired:
+            return expired
+        results = []
+        for parameters in await request.json():
+            code = self._random_error()
+            if code:
+                results.append({"ordId": "", "clOrdId": parameters.get('clOrdId', ''), "tag": "", "ts": now_ms(), "sCode": code, "sMsg": "injected"})
+            else:
+                results.append(self._accept(parameters, request.headers.get('OK-ACCESS-KEY', '')))
+        return ok(results)
+
+    # clOrdId 按账户(API key)区分 多个跟单账户可以用同一个
+    def _accept(self, parameters, account = ''):
+        clOrdId = parameters.get('clOrdId')
+        if clOrdId and (account, clOrdId) in self._clOrdIds:
+            return {"ordId": "", "clOrdId": clOrdId, "tag": "", "ts": now_ms(), "sCode": "51016", "sMsg": "Duplicated client order ID"}
+        ordId = str(next(self._ids))
+        if clOrdId:
+            self._clOrdIds[(account, clOrdId)] = ordId
+        ts = now_ms()
+        order = {
+            "instId": parameters['instId'],
+            "ordId": ordId,
+            "clOrdId": parameters.get('clOrdId', ''),
+            "side": parameters['side'],
+            "posSide": parameters.get('posSide', 'net'),
+            "ordType": parameters['ordType'],
+            "tdMode": parameters['tdMode'],
+            "sz": str(parameters['sz']),
+            "px": str(parameters.get('px', '')),
+            "lever": self.lever,
+            "state": "live",
+            "avgPx": "",
+            "fee": "0",
+            "accFillSz": "0",
+            "cTime": ts,
+            "uTime": ts,
+        }
+        self.orders[ordId] = order
+        asyncio.get_running_loop().call_later(self.fill_delay, self._fill, ordId)
+        return {"ordId": ordId, "clOrdId": order['clOrdId'], "tag": "", "ts": ts, "sCode": "0", "sMsg": ""}
+
+    def _fill(self, ordId):
+        order = self.orders[ordId]
+        sz = float(order['sz'])
+        order.update({
+            "state": "filled",
+            "avgPx": str(self.price),
+            "fillPx": str(self.price),
+            "accFillSz": order['sz'],
+            "fillSz": order['sz'],
+            "fee": str(-sz * self.ct_val * self.price * self.fee_rate),
+            "fillTime": now_ms(),
+            "uTime": now_ms(),
+        })
+        self.push('orders', {"channel": "orders", "instType": "SWAP"}, [dict(order)])
+        self._update_position(order)
+
+    def _update_position(self, order):
+        key = (order['instId'], order['posSide'])
+        sz = float(order['sz'])
+        fee = float(order['fee'])
+        ts = order['fillTime']
+        position = self.positions.get(key)
+        if (order['side'] == 'buy') == (order['posSide'] != 'short'):
+            if position is None:
+                posId = self._posIds.setdefault(key, str(next(self._ids)))
+                position = self.positions[key] = {
+                    "instId": order['instId'], "posId": posId, "posSide": order['posSide'], "pos": 0.0, "avgPx": 0.0,
+                    "realizedPnl": 0.0, "fee": 0.0, "pnl": 0.0, "cTime": ts, "uTime": ts
+                }
+            position['avgPx'] = (position['avgPx'] * position['pos'] + self.price * sz) / (position['pos'] + sz)
+            position['pos'] += sz
+            position['fee'] += fee
+            position['realizedPnl'] += fee
+        elif position is not None:
+            sz = min(sz, position['pos'])
+            direction = -1 if order['posSide'] == 'short' else 1
+            pnl = (self.price - position['avgPx']) * sz * self.ct_val * direction
+            position['pos'] -= sz
+            position['pnl'] += pnl
+            position['fee'] += fee
+            position['realizedPnl'] += pnl + fee
+            self._record_history(position, ts)
+        else:
+            return
+        position['uTime'] = ts
+        if position['pos'] <= 0:
+            self.positions.pop(key, None)
+        self.equity += fee
+        self.push('positions', {"channel": "positions", "instType": "SWAP"}, [self._position_data(position)])
+        self.push('account', {"channel": "account"}, [self._account_data()])
+
+    # 名义价值都按 BTC 的 ctVal 和当前价格算
+    def _position_data(self, position):
+        notional = position['pos'] * self.ct_val * self.price
+        return {
+            **{key: str(value) for key, value in position.items()},
+            "notionalUsd": str(notional), "markPx": str(self.price), "lever": self.lever, "mgnMode": "cross"
+        }
+
+    def _account_data(self):
+        notional = sum(position['pos'] * self.ct_val * self.price for position in self.positions.values())
+        imr = notional / float(self.lever)
+        mmr = notional * 0.004
+        return {
+            "totalEq": str(self.equity), "imr": str(imr), "mmr": str(mmr), "notionalUsd": str(notional),
+            "mgnRatio": str(self.equity / mmr) if mmr else "", "uTime": now_ms(),
+            "details": [{"ccy": "USDT", "eq": str(self.equity), "availEq": str(self.equity - imr), "availBal": str(self.equity - imr)}]
+        }
+
+    # 一个仓位一条记录 部分平仓时更新这条
+    def _record_history(self, position, ts):
+        item = {
+            "instId": position['instId'], "posId": position['posId'], "posSide": position['posSide'],
+            "direction": 'short' if position['posSide'] == 'short' else 'long',
+            "type": '2' if position['pos'] <= 0 else '1', "openAvgPx": str(position['avgPx']), "closeAvgPx": str(self.price),
+            "realizedPnl": str(position['realizedPnl']), "fee": str(position['fee']), "pnl": str(position['pnl']),
+            "cTime": position['cTime'], "uTime": ts
+        }
+        for index, existing in enumerate(self.history):
+            if existing['posId'] == item['posId'] and existing['cTime'] == item['cTime']:
+                self.history[index] = item
+                return
+        self.history.append(item)
+
+    def push(self, channel, arg, data):
+        message = json.dumps({"arg": arg, "data": data})
+        for ws in list(self._subscribers):
+            if channel in ws.channels:
+                asyncio.ensure_future(ws.send_str(message))
+
+    async def get_order(self, request):
+        ordId = request.query.get('ordId') or self._clOrdIds.get((request.headers.get('OK-ACCESS-KEY', ''), request.query.get('clOrdId')))
+        order = self.orders.get(ordId)
+        if order is None:
+            return web.json_response({"code": "51603", "msg": "Order does not exist", "data": []})
+        return ok([dict(order)])
+
+    async def set_leverage(self, request):
+        parameters = await request.json()
+        self.lever = str(parameters['lever'])
+        return ok([{"instId": parameters.get('instId', ''), "lever": self.lever, "mgnMode": parameters['mgnMode'], "posSide": parameters.get('posSide', '')}])
+
+    async def set_position_mode(self, request):
+        parameters = await request.json()
+        self.posMode = parameters['posMode']
+        return ok([{"posMode": self.posMode}])
+
+    async def balance(self, request):
+        return ok([self._account_data()])
+
+    async def get_positions(self, request):
+        return ok([self._position_data(position) for position in self.positions.values()])
+
+    # 最新的在前 before/after 按 uTime 过滤
+    async def positions_history(self, request):
+        query = request.query
+        data = sorted(self.history, key=lambda item: int(item['uTime']), reverse=True)
+        if query.get('instId'):
+            data = [item for item in data if item['instId'] == query['instId']]
+        if query.get('posId'):
+            data = [item for item in data if item['posId'] == query['posId']]
+        if query.get('before'):
+            data = [item for item in data if int(item['uTime']) > int(query['before'])]
+        if query.get('after'):
+            data = [item for item in data if int(item['uTime']) < int(query['after'])]
+        return ok(data[:int(query.get('limit', 100))])
+
+    async def private_ws(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        ws.channels = set()
+        self._subscribers.add(ws)
+        try:
+            async for message in ws:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                if message.data == 'ping':
+                    await ws.send_str('pong')
+                    continue
+                payload = json.loads(message.data)
+                if payload['op'] == 'login':
+                    await ws.send_json({"event": "login", "code": "0", "msg": ""})
+                elif payload['op'] == 'subscribe':
+                    for arg in payload['args']:
+                        ws.channels.add(arg['channel'])
+                        await ws.send_json({"event": "subscribe", "arg": arg})
+        finally:
+            self._subscribers.discard(ws)
+        return ws
+
+
+async def main(host = '127.0.0.1', port = 8765, latency = 0.0, jitter = 0.0, error_rate = 0.0):
+    server = MockOKXServer(latency=latency, jitter=jitter, error_rate=error_rate)
+    base_url, ws_url = await server.start(host, port)
+    print('mock OKX REST: ' + base_url)
+    print('mock OKX WS:   ' + ws_url)
+    while True:
+        await asyncio.sleep(3600)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='本地替身 OKX 服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='每个 REST 请求的固定延迟(秒)')
+    parser.add_argument('--jitter', type=float, default=0.0, help='额外的随机延迟上限(秒)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='下单返回错误的概率')
+    args = parser.parse_args()
+    asyncio.run(main(args.host, args.port, args.latency, args.jitter, args.error_rate))
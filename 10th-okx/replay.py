@@ -0,0 +1,99 @@
+import argparse
+import asyncio
+import time
+from types import SimpleNamespace
+
+import global_const
+from utils.recorder import read_records
+from utils.latency import tracer
+from utils.notifier import notifier
+
+'''
+    回放录制的消息 python replay.py ./config/record.jsonl --speed 10
+    消息按录制时的间隔(除以 speed)依次走 storage_messages -> exchange_interface -> open_position
+    交易所换成 StubExchange 不发真实订单 最后输出吞吐和各阶段延迟
+    --speed 0 表示不等待 全速回放
+    --ticks 给出录制的行情时换成 SimExchange 按行情撮合 每条消息之前先把行情推进到消息的时间
+'''
+
+
+# 回放时不真的发 telegram 只计数
+class SilentTelegram:
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, chat_id, message):
+        self.sent += 1
+
+
+async def replay(path, speed = 1.0, latency = 0.0, exchange = None, ticks = None):
+    from telethon_client import telethon_client
+    from exchanges.stubExchange import StubExchange
+
+    records = list(read_records(path, ('m',)))
+    if not records:
+        print('没有可回放的消息')
+        return
+
+    global_const._init()
+    global_const.set_value('flag', '1')
+    telegram = SilentTelegram()
+    global_const.set_value('telegram_client', telegram)
+    # 回放不需要合并和限速
+    notifier.client = telegram
+    notifier.coalesce_window = 0
+    notifier.min_interval = 0
+    notifier_task = asyncio.create_task(notifier.run_forever())
+
+    chats = [{"id": chat_id} for chat_id in dict.fromkeys(record['c'] for record in records)]
+    client = telethon_client(1, 'replay', chats[0]['id'], None, chats, session=None)
+    if exchange is None and ticks:
+        from exchanges.sim.simExchange import SimExchange
+        exchange = SimExchange()
+        exchange.load_ticks(ticks)
+    exchange = exchange or StubExchange(latency=latency)
+    advance = getattr(exchange, 'advance', None)
+    client.trade_manager = create_trade_manager(exchange)
+
+    start = time.perf_counter()
+    first_ts = records[0]['ts']
+    for record in records:
+        if speed:
+            delay = (record['ts'] - first_ts) / 1000 / speed - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        if advance:
+            advance(record['ts'])
+        message = SimpleNamespace(id=record['i'], chat_id=record['c'], message=record['x'])
+        await client.handle_message(message, bool(record.get('e')))
+
+    await client.trade_manager.close()
+    await notifier.flush()
+    notifier_task.cancel()
+    elapsed = time.perf_counter() - start
+
+    orders = len(getattr(exchange, 'orders', ()))
+    print(f"消息: {len(records)} 条  下单: {orders} 笔  耗时: {elapsed:.3f}秒")
+    print(f"吞吐: {len(records) / elapsed:,.0f} 消息/秒  {orders / elapsed:,.0f} 单/秒  通知: {telegram.sent} 条")
+    snapshot = tracer.snapshot()
+    for stage, summary in snapshot['stages'].items():
+        print(f"{stage:>8}: n={summary['count']:<6} p50={summary['p50']:.3f}ms  p95={summary['p95']:.3f}ms  p99={summary['p99']:.3f}ms")
+    return snapshot
+
+
+def create_trade_manager(exchange):
+    from exchanges.tradeManager import TradeManager
+    trade_manager = TradeManager(exchange.name)
+    trade_manager.add_exchange(exchange.name, exchange)
+    trade_manager._close_query_delay = 0
+    return trade_manager
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='回放录制的 telegram 消息')
+    parser.add_argument('path', nargs='?', default='./config/record.jsonl')
+    parser.add_argument('--speed', type=float, default=1.0, help='回放倍速 0 为全速')
+    parser.add_argument('--latency', type=float, default=0.0, help='假交易所下单延迟(秒)')
+    parser.add_argument('--ticks', default=None, help='录制的行情 jsonl 用模拟交易所撮合')
+    args = parser.parse_args()
+    asyncio.run(replay(args.path, args.speed, args.latency, ticks=args.ticks))
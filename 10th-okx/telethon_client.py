@@ -0,0 +1,364 @@
+from telethon import TelegramClient, events, types
+from exchanges.tradeManager import TradeManager
+from exchanges.copyTrading import load_accounts, CopyTradingPool
+import asyncio
+import json
+import time
+
+from utils.ioFile import read_file, write_file, has_file
+from utils.time import formatTiem
+from utils.matchStr import matchStr
+from utils.latency import tracer
+from utils.signalParser import default_parser
+from utils.dedup import MessageDeduplicator
+from utils.recorder import recorder
+from utils.journal import journal
+from utils.notifier import notifier, CRITICAL, INFO
+from utils.eventLog import events as event_log
+from utils.clock import clock
+from utils.leader import LeaderElection, ClaimLog, StandbyBuffer
+from utils.startup import StartupCache, timer
+import global_const
+
+
+class telethon_client:
+    def __init__(self, api_id, api_hash, group_id, proxy, chats = None, session = 'session_name'):
+        self._api_id = api_id
+        self._api_hash = api_hash
+        self._group_id = group_id
+        self._proxy = proxy
+        # 监听的群聊 [{"id": 群id, "grammar": 信号格式, "exchanges": [开单平台]}] 没配置就只听 group_id
+        self._chats = {}
+        self.set_chats(chats or [{"id": group_id}])
+        self._dedup = MessageDeduplicator()
+        try:
+            # 可以设置代理 proxy=("socks5", '127.0.0.1', 4444)
+            self._telegram_client = TelegramClient(session, self._api_id, self._api_hash, proxy=self._proxy)
+        except BaseException as Error:
+            print(Error)
+        self.exchange_names = ['okx']
+        self.trade_manager = None
+        # 发通知的群id -> InputPeer 从本地缓存恢复 没缓存的启动后在后台解析 notifier 发消息直接用
+        # 监听按 chat_id 过滤 不需要 entity
+        self._entities = {}
+        # 多实例热备 见 utils/leader.py 没开启时为 None 自己就是主实例
+        self.election = None
+        self.claims = None
+        self.standby = None
+        # 主实例 telegram 断线超过这么多秒 让给备用实例
+        self.disconnect_grace = 2
+
+
+    # 获取所有的群聊列表
+    async def get_my_dialogsList(self, save = False):
+        dialogList = []
+        async for dialog in self._telegram_client.iter_dialogs():
+            dialogList.append({
+                "dialogName": dialog.name,
+                "dialogId": dialog.id
+            })
+
+        if save:
+            path = './config/dialogList.json'
+            if has_file(path, True):
+                write_file(path, dialogList)
+
+        return dialogList
+
+    # 启动服务
+    async def start_client(self):
+        print('telegram服务启动')
+        await self._telegram_client.start()
+
+
+    # 监听消息
+    def storage_messages(self, handleMessage):
+        # 校准到交易所时钟 和信号里交易所的 ts 可以直接相减
+        which_time = clock.now_ms()
+        chat_id = handleMessage.chat_id
+        event_log.debug('telegram', 'message', chat_id=chat_id, message_id=handleMessage.id)
+        matchJSON = matchStr(handleMessage.message, chat_id)
+        message_id = handleMessage.id
+        trace_id = (chat_id, message_id)
+        # 不是信号的消息直接跳过
+        if matchJSON is None:
+            tracer.discard(trace_id)
+            return None
+        tracer.stamp(trace_id, 'parse', matchJSON['market'])
+
+        currentInfo = {
+            "chat_id": chat_id,
+            "message_id": message_id,
+            "trace_id": trace_id,
+            # "message_text": message_text,
+            **matchJSON,
+            "which_time": which_time
+        }
+        return currentInfo
+
+
+    # 替换监听的群和各群的信号格式 运行中改配置也走这里 不需要重新注册事件
+    def set_chats(self, chats):
+        for chat_id in self._chats:
+            default_parser.unregister(chat_id)
+        self._chats = {chat['id']: chat for chat in chats}
+        for chat_id, chat in self._chats.items():
+            if chat.get('grammar'):
+                default_parser.register(chat['grammar'], chat_id)
+
+    # 配置文件变化后应用 群路由/杠杆/数量 telegram 和交易所连接都不动
+    async def apply_config(self, old, config):
+        self.set_chats(config.telegram.chats)
+        notifier.chat_id = config.telegram.send_chat_id
+        await self.trade_manager.apply_config(config.trade)
+
+    # 获取群聊消息 新消息和编辑过的消息都走同一个处理 由去重保证只下一次单
+    # 按 self._chats 过滤 群列表可以随时改
+    async def watch_chats(self):
+        print('正在监听……')
+        @self._telegram_client.on(events.NewMessage())
+        @self._telegram_client.on(events.MessageEdited())
+        async def handle_new_message(event):
+            if event.chat_id not in self._chats:
+                return
+            await self.handle_message(event.message, isinstance(event, events.MessageEdited.Event))
+
+    # 单条消息的处理流程 回放工具也直接调用这里
+    async def handle_message(self, message, edited = False):
+        trace_id = (message.chat_id, message.id)
+        tracer.stamp(trace_id, 'receive')
+        if recorder.enabled:
+            recorder.record_message(message.chat_id, message.id, message.message, int(time.time()*1000), edited)
+        try:
+            current_order = self.storage_messages(message)
+            if current_order:
+                event_log.info('telegram', 'signal', chat_id=message.chat_id, message_id=message.id, operation=current_order['operation'], market=current_order['market'], quantity=current_order['quantity'])
+        except BaseException as error:
+            current_order = False
+            tracer.discard(trace_id)
+            event_log.error('telegram', 'parse_failed', chat_id=message.chat_id, message_id=message.id, error=repr(error))
+
+        if current_order:
+            if self._dedup.seen(current_order['chat_id'], current_order['message_id'], current_order):
+                tracer.discard(trace_id)
+                event_log.info('telegram', 'duplicate', chat_id=message.chat_id, message_id=message.id)
+                return
+            if self.election:
+                # 备用实例只记下信号 接手时补下主实例没下完的
+                if not self.election.is_leader:
+                    tracer.discard(trace_id)
+                    self.standby.add(current_order)
+                    return
+                self.claims.claim(current_order['chat_id'], current_order['message_id'])
+            await self.exchange_interface(current_order)
+
+    async def exchange_interface(self, current_order):
+        operation = current_order['operation']
+        switch = {
+            '开多': { 'side': 'buy', 'posSide': 'long'},
+            '开空': { 'side': 'sell', 'posSide': 'short'},
+            '平多': { 'side': 'sell', 'posSide': 'long'},
+            '平空': { 'side': 'buy', 'posSide': 'short'},
+        }
+        outerParam = switch.get(operation)
+        route = self._chats.get(current_order['chat_id'], {})
+        current_order = {
+            **current_order,
+            **outerParam,
+            # 这个群的信号发到哪些交易所 没配置就发到全部
+            "exchanges": route.get('exchanges')
+        }
+        tracer.stamp(current_order['trace_id'], 'map')
+        # 下单放到后台任务里 不阻塞监听
+        task = self.trade_manager.create_task(self.trade_manager.open_position(current_order))
+        if self.claims:
+            chat_id, message_id = current_order['chat_id'], current_order['message_id']
+            task.add_done_callback(lambda _: self.claims.done(chat_id, message_id))
+
+    # 开启热备 同一台机器上的多个实例用同一个锁文件和 claims 文件
+    def enable_standby(self, name, lock_path = './config/leader.lock', claims_path = './config/claims.log', buffer_seconds = 30):
+        self.election = LeaderElection(lock_path, name)
+        self.claims = ClaimLog(claims_path)
+        self.standby = StandbyBuffer(buffer_seconds)
+
+    # 等着当主实例 当上之后补下备用期间收到的信号 telegram 断线就让出去 重连后再排队
+    async def lead(self):
+        while True:
+            if not self.election.try_acquire():
+                print(f'{self.election.name} 备用中 当前主实例: {self.election.holder()}')
+                await self.election.acquire()
+            await self.take_over()
+            await self.watch_connection()
+            self.election.release()
+            self.trade_manager.stop_auto()
+            notifier.notify(f'{self.election.name} telegram 断线 让出主实例', CRITICAL)
+            while not self._telegram_client.is_connected():
+                await asyncio.sleep(0.5)
+
+    async def take_over(self):
+        states = self.claims.load()
+        orders = self.standby.take_over(states)
+        notifier.notify(f'{self.election.name} 成为主实例 补下 {len(orders)} 个信号', CRITICAL)
+        for (chat_id, message_id), current_order in orders:
+            event_log.warning('leader', 'replay', chat_id=chat_id, message_id=message_id, claimed=states.get((chat_id, message_id)) == 'c')
+            self.claims.claim(chat_id, message_id)
+            await self.exchange_interface(current_order)
+        self.trade_manager.start_arbitrage()
+        self.trade_manager.create_task(self.trade_manager.start_roll())
+
+    async def watch_connection(self, interval = 0.5):
+        disconnected = None
+        while True:
+            await asyncio.sleep(interval)
+            if self._telegram_client.is_connected():
+                disconnected = None
+            elif disconnected is None:
+                disconnected = time.monotonic()
+            elif time.monotonic() - disconnected > self.disconnect_grace:
+                return
+
+
+    def set_exchange_config(self):
+        for exchange_name in self.exchange_names:
+            exchange_config_center = read_file('./exchanges/' + exchange_name + '/key.json')
+            exchange_config_center = json.loads(exchange_config_center['message'])
+            self.trade_manager.set_exchange_config(exchange_config_center, exchange_name)
+        self.trade_manager.set_exchanges()
+
+    # 本地缓存里的 entity 直接还原成 InputPeer 不走网络
+    def restore_entities(self, cached):
+        peers = {
+            "channel": lambda item: types.InputPeerChannel(item['id'], item['access_hash']),
+            "chat": lambda item: types.InputPeerChat(item['id']),
+            "user": lambda item: types.InputPeerUser(item['id'], item['access_hash'])
+        }
+        for chat_id, item in cached.items():
+            if item.get('type') in peers:
+                self._entities[int(chat_id)] = peers[item['type']](item)
+        notifier.peers = self._entities
+
+    # 没缓存的通知群解析 entity 连同合约信息一起写到本地缓存 最后更新群列表 都不在启动的关键路径上
+    async def warm_cache(self, cache):
+        entities = cache.get('entities', {})
+        for chat_id in (notifier.chat_id,):
+            if chat_id in self._entities:
+                continue
+            try:
+                peer = await self._telegram_client.get_input_entity(chat_id)
+            except ValueError as error:
+                print(f'解析群 {chat_id} 失败: {error}')
+                continue
+            self._entities[chat_id] = peer
+            if isinstance(peer, types.InputPeerChannel):
+                entities[str(chat_id)] = {"type": 'channel', "id": peer.channel_id, "access_hash": peer.access_hash}
+            elif isinstance(peer, types.InputPeerChat):
+                entities[str(chat_id)] = {"type": 'chat', "id": peer.chat_id}
+            elif isinstance(peer, types.InputPeerUser):
+                entities[str(chat_id)] = {"type": 'user', "id": peer.user_id, "access_hash": peer.access_hash}
+        cache.set('entities', entities)
+        cache.set('instruments', self.trade_manager.dump_instruments())
+        await asyncio.to_thread(cache.save)
+        await self.get_my_dialogsList(True)
+
+    def start_copy_pool(self, accounts_path):
+        try:
+            accounts = load_accounts(accounts_path) if accounts_path else []
+        except ValueError as error:
+            print('跟单账户配置有误 不启动跟单: ' + str(error))
+            return None
+        if not accounts:
+            return None
+        pool = CopyTradingPool(accounts, flag=global_const.get_value('flag'), report=self.report_copy, alert=self.alert_copy)
+        pool.start(self.trade_manager.trade)
+        self.trade_manager.copy_pool = pool
+        return pool
+
+    def report_copy(self, text):
+        notifier.notify(text, INFO)
+
+    def alert_copy(self, text):
+        notifier.notify(text, CRITICAL)
+
+    async def run(self, exchange_names, record_path = './config/record.jsonl', journal_path = './config/journal.db', config_store = None, cache_path = './config/cache.json', accounts_path = './config/accounts.json', events_path = './config/events.jsonl', instance = None):
+        self.exchange_names = exchange_names
+        if instance:
+            self.enable_standby(instance)
+        # 结构化事件日志 后台线程写文件 下单路径上不做 IO
+        if events_path:
+            event_log.open(events_path)
+        # 录制收到的消息和交易所请求 用 replay.py 离线回放
+        if record_path:
+            recorder.open(record_path)
+        # 信号/订单/成交/持仓/收益 落库 重启后恢复持仓
+        if journal_path:
+            journal.open(journal_path)
+        self.trade_manager = TradeManager(self.exchange_names)
+        if config_store:
+            config = config_store.load()
+            self.trade_manager.configure(config.trade)
+            notifier.chat_id = config.telegram.send_chat_id
+            config_store.on_change(self.apply_config)
+        global_const._init()
+        global_const.set_value('flag', '1')
+        global_const.set_value('telegram_client', self._telegram_client)
+        notifier.client = self._telegram_client
+        cache = StartupCache(cache_path).load()
+        self.restore_entities(cache.get('entities', {}))
+        self.set_exchange_config()
+        self.trade_manager.restore_instruments(cache.get('instruments', {}))
+        # 跟单账户在独立进程里下单 和 telegram 登录同时启动
+        copy_pool = self.start_copy_pool(accounts_path)
+        timer.mark('config')
+
+        async def timed(stage, coro):
+            await coro
+            timer.mark(stage)
+
+        # telegram 登录和交易所预热(长连接/合约信息/持仓模式/杠杆)同时进行
+        await asyncio.gather(timed('telegram', self.start_client()), timed('exchanges', self.trade_manager.start()))
+        await self.watch_chats()
+        # 热备时由 lead 在成为主实例后启动套利和滚仓
+        if self.election:
+            lead_task = asyncio.create_task(self.lead())
+        else:
+            lead_task = None
+            self.trade_manager.start_arbitrage()
+            self.trade_manager.create_task(self.trade_manager.start_roll())
+        timer.mark('listen')
+        timer.report()
+        warm_task = asyncio.create_task(self.warm_cache(cache))
+        # 延迟统计: http://127.0.0.1:9108 以及 ./config/latency.json
+        try:
+            metrics_server = await tracer.serve()
+        except OSError as error:
+            # 同一台机器的第二个实例端口被占用 不影响下单
+            print('延迟统计接口没有启动: ' + str(error))
+            metrics_server = None
+        dump_task = asyncio.create_task(tracer.dump_forever())
+        notifier_task = asyncio.create_task(notifier.run_forever())
+        # 配置文件热更新
+        config_task = asyncio.create_task(config_store.watch_forever()) if config_store else None
+        copy_task = asyncio.create_task(copy_pool.collect_forever()) if copy_pool else None
+        try:
+            await self._telegram_client.run_until_disconnected()
+        finally:
+            warm_task.cancel()
+            dump_task.cancel()
+            if lead_task:
+                lead_task.cancel()
+            if metrics_server:
+                metrics_server.close()
+            await self.trade_manager.close()
+            if copy_pool:
+                await copy_pool.close()
+                await asyncio.gather(copy_task, return_exceptions=True)
+            await notifier.flush()
+            notifier_task.cancel()
+            if config_task:
+                config_task.cancel()
+            recorder.close()
+            journal.close()
+            event_log.close()
+            if self.election:
+                self.election.release()
+                self.claims.close()
@@ -0,0 +1,71 @@
+import asyncio
+import time
+from collections import deque
+
+'''
+    交易所时钟 本机时间和交易所时间的偏差
+    每次采样: 本机发请求时间 t0 -> 交易所返回的时间 ts -> 本机收到时间 t1
+        往返 rtt = t1 - t0  偏差 offset = ts - (t0 + t1) / 2
+    往返越短偏差越准 保留最近 window 次采样 取往返最短的那次的偏差
+    clock.now_ms() = 本机时间 + 偏差 信号收到时间/签名时间戳/订单过期时间都用它 和交易所的 ts 可以直接相减
+    没同步过时偏差为 0 就是本机时间
+'''
+
+
+class ExchangeClock:
+    def __init__(self, window = 16, max_rtt = 2000):
+        self._samples = deque(maxlen=window)
+        # 往返超过这么多毫秒的采样不要
+        self.max_rtt = max_rtt
+        self.offset = 0.0
+        self.rtt = None
+        self.synced = False
+        self._task = None
+
+    def now_ms(self):
+        return int(time.time() * 1000 + self.offset)
+
+    # 秒 和 time.time() 一样
+    def now(self):
+        return time.time() + self.offset / 1000
+
+    def add_sample(self, sent, server, received):
+        rtt = received - sent
+        if rtt < 0 or rtt > self.max_rtt:
+            return
+        self._samples.append((rtt, server - (sent + received) / 2))
+        self.rtt, self.offset = min(self._samples)
+        self.synced = True
+
+    # sample() 返回 (本机发送毫秒, 交易所毫秒, 本机收到毫秒) 失败返回 None
+    async def sync(self, sample, count = 5, gap = 0.2):
+        for index in range(count):
+            try:
+                result = await sample()
+            except Exception as error:
+                print('时钟同步失败: ' + repr(error))
+                result = None
+            if result:
+                self.add_sample(*result)
+            if index < count - 1:
+                await asyncio.sleep(gap)
+        return self.offset
+
+    async def sync_forever(self, sample, interval = 60, count = 5):
+        while True:
+            await self.sync(sample, count)
+            await asyncio.sleep(interval)
+
+    # 多个交易所实例只启动一个后台同步
+    def start(self, sample, interval = 60):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.sync_forever(sample, interval))
+        return self._task
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+clock = ExchangeClock()
@@ -0,0 +1,213 @@
+import asyncio
+import configparser
+import json
+import os
+
+'''
+    配置模型 10th-okx(.config.json) 和 10th-okxPro(config.ini) 共用 只有这一份 10th-okxPro/utils/config.py 按路径加载这里
+    只在启动和文件变化时解析一次 其他地方都读缓存的 Config
+    ConfigStore.watch_forever 按修改时间检查文件 变化后重新解析 回调里把杠杆、数量、群路由应用到运行中的实例
+    解析失败保留旧配置 不影响运行
+
+    .config.json
+        {"api_id": ..., "api_hash": ..., "group_id": ...,
+         "chats": [{"id": 群id, "grammar": "pudate", "exchanges": ["okx"]}],
+         "exchanges": ["okx"],
+         "trade": {"lever": "50", "tdMode": "cross", "instIds": ["BTC-USDT-SWAP"], "size_multiplier": 2}}
+    config.ini
+        [Config] 下平铺 flag / lever / tdMode / instId / sz / offset / stop_offset / price_max_age / api_id / api_hash / group_id
+'''
+
+# 交易参数 名字 -> (类型, 默认值)
+TRADE_FIELDS = {
+    "flag": (str, '1'),
+    "instIds": (list, ['BTC-USDT-SWAP']),
+    "lever": (str, '50'),
+    "tdMode": (str, 'cross'),
+    "posMode": (str, 'long_short_mode'),
+    "ordType": (str, 'market'),
+    # 信号里的数量 * 倍数 = 主交易所的张数
+    "size_multiplier": (float, 2),
+    # 固定张数 okxPro 用
+    "sz": (str, '0.1'),
+    "offset": (float, 0.001),
+    "stop_offset": (float, 0.005),
+    # 行情推送超过多少秒没更新就不用 改用 REST 查价格 0 不检查 okxPro 用
+    "price_max_age": (float, 5),
+    # 平仓后最多等多久的收益记录(秒)
+    "close_query_delay": (float, 15),
+    # 信号收到后多少秒内的订单有效 超过的交易所直接拒绝(expTime) 不会晚成交 0 不设置
+    "order_ttl": (float, 5),
+    # 批量下单的合并窗口(秒) 0 不合并 前面没有在途下单时不等窗口直接发
+    "batch_window": (float, 0.005),
+    # 套利扫描的币对 例如 ['BTC-USDT', 'ETH-USDT'] 空的不扫描
+    "arb_pairs": (list, []),
+    # 套利机会自动下对冲单时每条腿的名义价值(USDT) 0 只通知不下单
+    "arb_notional": (float, 0),
+    # 自动对冲单合计的名义价值上限(USDT 每条腿) 对冲单不会自动平仓 到上限后只通知 0 不自动下单
+    "arb_max_exposure": (float, 0),
+    # 自动滚仓 浮盈加仓的间隔比例 0 不启动 见 exchanges/rollEngine.py
+    "roll_add_step": (float, 0),
+    "roll_take_profit": (float, 0.3),
+    # 事件日志按模块的级别 例如 {"trade": "DEBUG", "okx": "WARNING"} 见 utils/eventLog.py
+    "log_levels": (dict, {}),
+    # 下单前风控 见 exchanges/riskGate.py 0 不限制
+    # 所有持仓加上这一单的名义价值上限(USDT) 超出时缩小这一单
+    "risk_max_notional": (float, 0),
+    # 最多同时持有几个仓位 (instId, posSide) 算一个
+    "risk_max_positions": (int, 0),
+    # 维持保证金率低于这个值不再开仓
+    "risk_min_margin_ratio": (float, 0),
+    # 打开后拒绝所有开仓 平仓不受影响
+    "risk_kill_switch": (bool, False)
+}
+TD_MODES = ('cross', 'isolated')
+
+# config.ini 的键名 -> 模型里的名字
+INI_KEYS = {"instid": 'instIds', "tdmode": 'tdMode', "posmode": 'posMode', "ordtype": 'ordType'}
+
+
+class ConfigError(ValueError):
+    pass
+
+
+def coerce(name, value, kind):
+    try:
+        if kind is list:
+            if isinstance(value, str):
+                return [item.strip() for item in value.split(',') if item.strip()]
+            return list(value)
+        if kind is bool and isinstance(value, str):
+            return value.strip().lower() in ('1', 'true', 'yes', 'on')
+        return kind(value)
+    except (TypeError, ValueError):
+        raise ConfigError(f'配置 {name} 应该是 {kind.__name__}: {value!r}')
+
+
+class TradeConfig:
+    def __init__(self, **values):
+        for name, (kind, default) in TRADE_FIELDS.items():
+            setattr(self, name, coerce(name, values.get(name, default), kind))
+        if self.tdMode not in TD_MODES:
+            raise ConfigError('配置 tdMode 只能是 cross 或 isolated: ' + self.tdMode)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in TRADE_FIELDS}
+
+    def __eq__(self, other):
+        return isinstance(other, TradeConfig) and self.to_dict() == other.to_dict()
+
+
+class TelegramConfig:
+    def __init__(self, api_id, api_hash, group_id, chats = None, send_chat_id = 1002143229912):
+        self.api_id = coerce('api_id', api_id, int)
+        self.api_hash = coerce('api_hash', api_hash, str)
+        self.group_id = coerce('group_id', group_id, int)
+        self.send_chat_id = coerce('send_chat_id', send_chat_id, int)
+        # 没配置 chats 就只听 group_id
+        self.chats = [self._chat(chat) for chat in (chats or [{"id": self.group_id}])]
+
+    @staticmethod
+    def _chat(chat):
+        if 'id' not in chat:
+            raise ConfigError('chats 每一项都要有 id: ' + str(chat))
+        return {
+            "id": coerce('chats.id', chat['id'], int),
+            "grammar": chat.get('grammar'),
+            "exchanges": coerce('chats.exchanges', chat['exchanges'], list) if chat.get('exchanges') else None
+        }
+
+
+class Config:
+    def __init__(self, telegram, trade, exchanges = None):
+        self.telegram = telegram
+        self.trade = trade
+        self.exchanges = coerce('exchanges', exchanges or ['okx'], list)
+
+
+def parse_json(text):
+    content = json.loads(text)
+    for key in ('api_id', 'api_hash', 'group_id'):
+        if not content.get(key):
+            raise ConfigError('请检查配置文件是否有 ' + key + ' 并不能为空')
+    telegram = TelegramConfig(content['api_id'], content['api_hash'], content['group_id'], content.get('chats'), content.get('send_chat_id', 1002143229912))
+    return Config(telegram, TradeConfig(**content.get('trade', {})), content.get('exchanges'))
+
+
+def parse_ini(text):
+    parser = configparser.ConfigParser()
+    parser.read_string(text)
+    section = parser['Config']
+    for key in ('api_id', 'api_hash', 'group_id'):
+        if not section.get(key):
+            raise ConfigError('请检查配置文件是否有 ' + key + ' 并不能为空')
+    values = {}
+    for key, value in section.items():
+        name = INI_KEYS.get(key, key)
+        if name in TRADE_FIELDS:
+            values[name] = value
+    telegram = TelegramConfig(section['api_id'], section['api_hash'], section['group_id'], send_chat_id=section.get('send_message_group_id', 1002143229912))
+    return Config(telegram, TradeConfig(**values))
+
+
+def parse(path, text):
+    if path.endswith('.ini'):
+        return parse_ini(text)
+    return parse_json(text)
+
+
+class ConfigStore:
+    def __init__(self, path):
+        self.path = path
+        self.config = None
+        self._mtime = None
+        self._listeners = []
+
+    # 第一次调用时解析 之后直接返回缓存
+    def load(self):
+        if self.config is None:
+            self._mtime = os.stat(self.path).st_mtime_ns
+            with open(self.path, 'r', encoding='utf-8') as file:
+                self.config = parse(self.path, file.read())
+        return self.config
+
+    # 回调参数 (旧配置, 新配置) 可以是协程
+    def on_change(self, callback):
+        self._listeners.append(callback)
+
+    # 文件变了就重新解析 返回新配置 没变或者解析失败返回 None
+    def check(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        if mtime == self._mtime:
+            return None
+        self._mtime = mtime
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                config = parse(self.path, file.read())
+        except (ConfigError, ValueError, KeyError, configparser.Error) as error:
+            print('配置文件有误 继续使用旧配置: ' + str(error))
+            return None
+        return config
+
+    async def reload(self):
+        config = self.check()
+        if config is None:
+            return None
+        old, self.config = self.config, config
+        print('配置已重新加载 ' + self.path)
+        for callback in self._listeners:
+            try:
+                result = callback(old, config)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as error:
+                print('应用新配置出错: ' + str(error))
+        return config
+
+    async def watch_forever(self, interval = 1):
+        while True:
+            await asyncio.sleep(interval)
+            await self.reload()
@@ -0,0 +1,39 @@
+import hashlib
+import json
+from collections import OrderedDict
+
+
+# 信号去重 同一条消息被编辑 或者同一个信号被转发到多个群 只处理一次
+# 按 (群id, 消息id) 和信号内容的 hash 各保留最近的 max_size 条 内存不会一直涨
+class MessageDeduplicator:
+    def __init__(self, max_size = 4096):
+        self._max_size = max_size
+        self._ids = OrderedDict()
+        self._hashes = OrderedDict()
+
+    @staticmethod
+    def content_hash(signal):
+        content = json.dumps(
+            [signal.get('operation'), signal.get('quantity'), signal.get('market'), signal.get('response_json')],
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return hashlib.blake2b(content.encode('utf-8'), digest_size=16).digest()
+
+    def _remember(self, table, key):
+        table[key] = None
+        table.move_to_end(key)
+        if len(table) > self._max_size:
+            table.popitem(last=False)
+
+    # 第一次见到返回 False 并记下 见过的返回 True
+    def seen(self, chat_id, message_id, signal):
+        message_key = (chat_id, message_id)
+        content_key = self.content_hash(signal)
+        duplicate = message_key in self._ids or content_key in self._hashes
+        self._remember(self._ids, message_key)
+        self._remember(self._hashes, content_key)
+        return duplicate
+
+    def __len__(self):
+        return len(self._ids)
@@ -0,0 +1,162 @@
+import collections
+import json
+import os
+import threading
+import time
+
+'''
+    结构化事件日志 下单路径上代替 print
+    events.info('trade', 'order', venue='okx', instId=...) 只把 (时间, 级别, 模块, 事件, 字段) 放进内存环形缓冲区
+    不格式化字符串 不做 IO 低于模块级别的直接返回 字段直接传 dict(parameters=parameters) 不要 **展开 展开比记录本身还慢
+    后台线程每 interval 秒把缓冲区写到 JSON lines 文件 超过 max_bytes 轮转 保留 backups 个旧文件
+    console 打开时后台线程顺便打印到终端 终端慢也只拖慢后台线程
+    缓冲区满了丢最旧的 dropped 记丢了多少条
+'''
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVELS = {"DEBUG": DEBUG, "INFO": INFO, "WARNING": WARNING, "ERROR": ERROR}
+LEVEL_NAMES = {value: key for key, value in LEVELS.items()}
+
+
+def to_level(level):
+    if isinstance(level, str):
+        return LEVELS[level.upper()]
+    return int(level)
+
+
+class EventLog:
+    def __init__(self, capacity = 65536, level = INFO, interval = 0.2, max_bytes = 50 * 1024 * 1024, backups = 5, console = True):
+        self._capacity = capacity
+        self._buffer = collections.deque(maxlen=capacity)
+        self.level = level
+        self._levels = {}
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.console = console
+        self.dropped = 0
+        self.path = None
+        self._file = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    # {"trade": "DEBUG", "okx": "WARNING"} 没配置的模块用默认级别
+    def configure(self, levels, default = None):
+        self._levels = {module: to_level(level) for module, level in (levels or {}).items()}
+        if default is not None:
+            self.level = to_level(default)
+
+    def set_level(self, module, level):
+        self._levels[module] = to_level(level)
+
+    def enabled(self, module, level):
+        return level >= self._levels.get(module, self.level)
+
+    def log(self, level, module, event, **fields):
+        if level >= self._levels.get(module, self.level):
+            self._append(level, module, event, fields)
+
+    def _append(self, level, module, event, fields):
+        if len(self._buffer) == self._capacity:
+            self.dropped += 1
+        self._buffer.append((time.time(), level, module, event, fields))
+
+    def debug(self, module, event, **fields):
+        if DEBUG >= self._levels.get(module, self.level):
+            self._append(DEBUG, module, event, fields)
+
+    def info(self, module, event, **fields):
+        if INFO >= self._levels.get(module, self.level):
+            self._append(INFO, module, event, fields)
+
+    def warning(self, module, event, **fields):
+        if WARNING >= self._levels.get(module, self.level):
+            self._append(WARNING, module, event, fields)
+
+    def error(self, module, event, **fields):
+        if ERROR >= self._levels.get(module, self.level):
+            self._append(ERROR, module, event, fields)
+
+    # ========== 后台线程 ==========
+
+    def open(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._writer, name='event-log', daemon=True)
+            self._thread.start()
+
+    # flush 出错不能让线程退出 否则之后的事件只会在缓冲区里被挤掉
+    def _writer(self):
+        while not self._stop.wait(self.interval):
+            self._safe_flush()
+        self._safe_flush()
+
+    def _safe_flush(self):
+        try:
+            self.flush()
+        except Exception as error:
+            print('事件日志写入失败: ' + repr(error))
+
+    # 取出缓冲区里的所有事件 写文件/打印 关闭时也可以直接调用
+    # 序列化失败的事件和写失败的整批都算进 dropped
+    def flush(self):
+        with self._lock:
+            buffer = self._buffer
+            items = []
+            while buffer:
+                items.append(buffer.popleft())
+            lines = []
+            for ts, level, module, event, fields in items:
+                try:
+                    if self.console:
+                        print(f"{time.strftime('%H:%M:%S', time.localtime(ts))} {LEVEL_NAMES.get(level, level)} {module} {event} {fields}")
+                    if self._file is not None:
+                        lines.append(json.dumps({"ts": round(ts * 1000, 3), "level": LEVEL_NAMES.get(level, level), "module": module, "event": event, **fields}, ensure_ascii=False, default=str))
+                except Exception:
+                    self.dropped += 1
+            if not lines:
+                return
+            try:
+                self._file.write('\n'.join(lines) + '\n')
+                self._file.flush()
+                if self._file.tell() >= self.max_bytes:
+                    self._rotate()
+            except Exception:
+                self.dropped += len(lines)
+                raise
+
+    # events.jsonl -> events.jsonl.1 -> events.jsonl.2 ...
+    def _rotate(self):
+        self._file.close()
+        for index in range(self.backups - 1, 0, -1):
+            source = f'{self.path}.{index}'
+            if os.path.exists(source):
+                os.replace(source, f'{self.path}.{index + 1}')
+        if self.backups:
+            os.replace(self.path, self.path + '.1')
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def close(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        else:
+            self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+events = EventLog()
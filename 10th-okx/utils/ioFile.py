@@ -1,4 +1,5 @@
 import json
+import os
 import sys
 
 def read_file(file_path):
@@ -29,26 +30,23 @@ def write_file(file_path, content, mode='w'):
 
 
 def has_file(file_path, create = True):
-    red_result = read_file(file_path)
-    if(red_result['code'] != 200 ):
-        if create:
-            write_file(file_path, '')
-            return True
-        return False
-    else:
+    if os.path.isfile(file_path):
+        return True
+    if create:
+        write_file(file_path, '')
         return True
+    return False
 
 
+# 文件只读一次 不存在时按 keys 生成一个空模板
 def create_file_content(path, string):
-    path = path
     keys = string.split(',')
-    if has_file(path, False):
-        pass
+    red_result = read_file(path)
+    if red_result['code'] == 404:
+        read_content = { key: '' for key in keys}
+        write_file(path, read_content)
     else:
-        write_file(path, { key: '' for key in keys})
-
-    read_content = read_file(path)['message']
-    read_content = json.loads(read_content)
+        read_content = json.loads(red_result['message'])
 
     if all(key in read_content and read_content[key] for key in keys):
         pass
@@ -0,0 +1,276 @@
+import json
+import queue
+import sqlite3
+import threading
+import time
+
+'''
+    交易记录 SQLite WAL 模式 重启后不丢
+    signals  收到的信号
+    orders   每个交易所的订单 (venue, ordId) 唯一
+    fills    成交
+    positions 按成交累计出来的持仓 重启时从这里恢复
+    pnl      平仓后查到的收益 字段同 positions-history
+    下单流程只往队列里放一条记录 后台线程批量写入 一批一个事务
+'''
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS signals (
+    ts INTEGER, chat_id INTEGER, message_id INTEGER, operation TEXT, instId TEXT, quantity TEXT, payload TEXT
+);
+CREATE INDEX IF NOT EXISTS signals_ts ON signals (ts);
+CREATE INDEX IF NOT EXISTS signals_instId ON signals (instId, ts);
+
+CREATE TABLE IF NOT EXISTS orders (
+    venue TEXT, ordId TEXT, clOrdId TEXT, instId TEXT, side TEXT, posSide TEXT, ordType TEXT,
+    sz TEXT, avgPx TEXT, fee TEXT, lever TEXT, state TEXT, chat_id INTEGER, message_id INTEGER, ts INTEGER,
+    PRIMARY KEY (venue, ordId)
+);
+CREATE INDEX IF NOT EXISTS orders_ordId ON orders (ordId);
+CREATE INDEX IF NOT EXISTS orders_instId ON orders (instId, ts);
+CREATE INDEX IF NOT EXISTS orders_ts ON orders (ts);
+
+CREATE TABLE IF NOT EXISTS fills (
+    venue TEXT, ordId TEXT, instId TEXT, side TEXT, posSide TEXT, sz REAL, px REAL, fee REAL, ts INTEGER
+);
+CREATE INDEX IF NOT EXISTS fills_ordId ON fills (ordId);
+CREATE INDEX IF NOT EXISTS fills_instId ON fills (instId, ts);
+
+CREATE TABLE IF NOT EXISTS positions (
+    venue TEXT, instId TEXT, posSide TEXT, pos REAL, avgPx REAL, uTime INTEGER,
+    PRIMARY KEY (venue, instId, posSide)
+);
+
+CREATE TABLE IF NOT EXISTS pnl (
+    venue TEXT, posId TEXT, instId TEXT, posSide TEXT, type TEXT, openAvgPx TEXT, closeAvgPx TEXT,
+    pnl TEXT, fee TEXT, realizedPnl TEXT, ts INTEGER,
+    PRIMARY KEY (venue, posId, ts)
+);
+CREATE INDEX IF NOT EXISTS pnl_instId ON pnl (instId, ts);
+'''
+
+
+def connect(path):
+    connection = sqlite3.connect(path)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    return connection
+
+
+# 开仓方向: 开多 buy long 开空 sell short 单向持仓 net 按买卖带符号
+def signed_size(side, posSide, sz):
+    if posSide == 'net':
+        return sz if side == 'buy' else -sz
+    opening = (side == 'buy') == (posSide == 'long')
+    return sz if opening else -sz
+
+
+class Journal:
+    def __init__(self, batch_size = 500):
+        self.enabled = False
+        self._path = None
+        self._batch_size = batch_size
+        self._queue = queue.Queue()
+        self._thread = None
+        self._positions = {}
+
+    def open(self, path):
+        self._path = path
+        connection = connect(path)
+        with connection:
+            connection.executescript(SCHEMA)
+        for venue, instId, posSide, pos, avgPx, uTime in connection.execute('SELECT * FROM positions'):
+            self._positions[(venue, instId, posSide)] = [pos, avgPx]
+        connection.close()
+        self._thread = threading.Thread(target=self._writer, name='journal', daemon=True)
+        self._thread.start()
+        self.enabled = True
+
+    # ========== 写入 只入队 ==========
+
+    def record_signal(self, current_order):
+        if self.enabled:
+            self._queue.put(('signal', (
+                current_order['which_time'],
+                current_order.get('chat_id'),
+                current_order.get('message_id'),
+                current_order['operation'],
+                current_order['market'],
+                current_order['quantity'],
+                json.dumps(current_order.get('response_json'), ensure_ascii=False)
+            )))
+
+    def record_order(self, venue, orderInfo, current_order = None):
+        if self.enabled:
+            current_order = current_order or {}
+            self._queue.put(('order', (
+                venue,
+                orderInfo['ordId'],
+                orderInfo.get('clOrdId', ''),
+                orderInfo['instId'],
+                orderInfo['side'],
+                orderInfo['posSide'],
+                orderInfo.get('ordType', ''),
+                str(orderInfo['sz']),
+                str(orderInfo.get('avgPx', '')),
+                str(orderInfo.get('fee', '')),
+                str(orderInfo.get('lever', '')),
+                orderInfo.get('state', ''),
+                current_order.get('chat_id'),
+                current_order.get('message_id'),
+                int(orderInfo.get('ts') or time.time() * 1000)
+            )))
+            filled = float(orderInfo.get('accFillSz') or (orderInfo['sz'] if orderInfo.get('state') == 'filled' else 0))
+            if filled and orderInfo.get('avgPx'):
+                self._queue.put(('fill', (
+                    venue,
+                    orderInfo['ordId'],
+                    orderInfo['instId'],
+                    orderInfo['side'],
+                    orderInfo['posSide'],
+                    filled,
+                    float(orderInfo['avgPx']),
+                    float(orderInfo.get('fee') or 0),
+                    int(orderInfo.get('fillTime') or orderInfo.get('ts') or time.time() * 1000)
+                )))
+
+    def record_pnl(self, venue, item):
+        if self.enabled:
+            self._queue.put(('pnl', (
+                venue,
+                item['posId'],
+                item['instId'],
+                item['posSide'],
+                item.get('type', ''),
+                item.get('openAvgPx', ''),
+                item.get('closeAvgPx', ''),
+                item.get('pnl', ''),
+                item.get('fee', ''),
+                item.get('realizedPnl', ''),
+                int(item.get('uTime') or time.time() * 1000)
+            )))
+
+    # ========== 后台线程 ==========
+
+    def _writer(self):
+        connection = connect(self._path)
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self._batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = False
+            # 这一批对内存持仓的修改 提交成功后才生效 回滚时丢掉 和数据库保持一致
+            staged = {}
+            try:
+                with connection:
+                    for kind, row in batch:
+                        if kind is None:
+                            stop = True
+                        else:
+                            self._apply(connection, kind, row, staged)
+                for key, value in staged.items():
+                    if value is None:
+                        self._positions.pop(key, None)
+                    else:
+                        self._positions[key] = value
+            except sqlite3.Error as error:
+                print('交易记录写入失败: ' + str(error))
+            for _ in batch:
+                self._queue.task_done()
+            if stop:
+                connection.close()
+                return
+
+    def _apply(self, connection, kind, row, staged):
+        if kind == 'signal':
+            connection.execute('INSERT INTO signals VALUES (?, ?, ?, ?, ?, ?, ?)', row)
+        elif kind == 'order':
+            connection.execute('INSERT OR REPLACE INTO orders VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', row)
+        elif kind == 'fill':
+            connection.execute('INSERT INTO fills VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', row)
+            self._apply_fill(connection, row, staged)
+        elif kind == 'pnl':
+            connection.execute('INSERT OR REPLACE INTO pnl VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', row)
+
+    def _apply_fill(self, connection, row, staged):
+        venue, ordId, instId, side, posSide, sz, px, fee, ts = row
+        key = (venue, instId, posSide)
+        pos, avgPx = (staged[key] if key in staged else self._positions.get(key)) or (0.0, 0.0)
+        delta = signed_size(side, posSide, sz)
+        if posSide == 'net':
+            opening = pos == 0 or (pos > 0) == (delta > 0)
+        else:
+            opening = delta > 0
+        total = pos + delta
+        if opening:
+            avgPx = (avgPx * abs(pos) + px * abs(delta)) / abs(total)
+        elif posSide == 'net' and total != 0 and (total > 0) != (pos > 0):
+            # 单向持仓反手 剩下的部分按这次成交价开仓
+            avgPx = px
+
+        if abs(total) <= 1e-12 or (posSide != 'net' and total < 0):
+            staged[key] = None
+            connection.execute('DELETE FROM positions WHERE venue = ? AND instId = ? AND posSide = ?', key)
+        else:
+            staged[key] = [total, avgPx]
+            connection.execute('INSERT OR REPLACE INTO positions VALUES (?, ?, ?, ?, ?, ?)', (*key, total, avgPx, ts))
+
+    # 等队列里的记录都写完
+    def flush(self):
+        if self.enabled:
+            self._queue.join()
+
+    def close(self):
+        if not self.enabled:
+            return
+        self.enabled = False
+        self._queue.put((None, None))
+        self._thread.join()
+
+    # ========== 查询 每次用单独的连接 WAL 模式下读写互不阻塞 ==========
+
+    def _query(self, sql, args = ()):
+        connection = sqlite3.connect(self._path)
+        connection.row_factory = sqlite3.Row
+        try:
+            return [dict(row) for row in connection.execute(sql, args)]
+        finally:
+            connection.close()
+
+    def _range(self, table, instId, start, end):
+        sql = 'SELECT * FROM ' + table + ' WHERE 1 = 1'
+        args = []
+        if instId:
+            sql += ' AND instId = ?'
+            args.append(instId)
+        if start is not None:
+            sql += ' AND ts >= ?'
+            args.append(start)
+        if end is not None:
+            sql += ' AND ts < ?'
+            args.append(end)
+        return self._query(sql + ' ORDER BY ts', args)
+
+    def get_order(self, ordId):
+        return self._query('SELECT * FROM orders WHERE ordId = ?', (ordId,))
+
+    def orders(self, instId = None, start = None, end = None):
+        return self._range('orders', instId, start, end)
+
+    def fills(self, instId = None, start = None, end = None):
+        return self._range('fills', instId, start, end)
+
+    def signals(self, instId = None, start = None, end = None):
+        return self._range('signals', instId, start, end)
+
+    def pnl(self, instId = None, start = None, end = None):
+        return self._range('pnl', instId, start, end)
+
+    def open_positions(self):
+        return self._query('SELECT * FROM positions')
+
+
+journal = Journal()
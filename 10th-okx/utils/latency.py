@@ -0,0 +1,119 @@
+import asyncio
+import json
+import time
+from collections import deque
+
+from utils.ioFile import write_file
+
+# 一条信号从收到到成交依次经过的阶段
+STAGES = ('receive', 'parse', 'map', 'submit', 'ack', 'fill')
+
+
+def percentile(sorted_samples, q):
+    if not sorted_samples:
+        return None
+    index = min(len(sorted_samples) - 1, int(round(q / 100 * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+# 分阶段的延迟统计 每个阶段记录距上一个阶段的耗时(毫秒)
+# 热路径上只做一次 perf_counter_ns 和 deque.append 百分位在读取时才排序
+class LatencyTracer:
+    def __init__(self, window = 2048, max_traces = 4096):
+        self._window = window
+        self._max_traces = max_traces
+        self._traces = {}
+        self._stages = {}
+        self._instruments = {}
+
+    def _samples(self, table, key):
+        samples = table.get(key)
+        if samples is None:
+            samples = table[key] = deque(maxlen=self._window)
+        return samples
+
+    def stamp(self, trace_id, stage, instId = None):
+        if trace_id is None:
+            return
+        now = time.perf_counter_ns()
+        trace = self._traces.get(trace_id)
+        if trace is None:
+            # 旧的 trace 没走完(比如解析失败) 超出上限时丢掉最早的
+            if len(self._traces) >= self._max_traces:
+                self._traces.pop(next(iter(self._traces)))
+            trace = self._traces[trace_id] = {"instId": instId, "start": now, "last": now}
+        elif instId:
+            trace['instId'] = instId
+
+        elapsed = (now - trace['last']) / 1e6
+        trace['last'] = now
+        if stage == STAGES[0]:
+            return
+
+        self._samples(self._stages, stage).append(elapsed)
+        if trace['instId']:
+            self._samples(self._instruments, (trace['instId'], stage)).append(elapsed)
+
+        if stage == STAGES[-1]:
+            total = (now - trace['start']) / 1e6
+            self._samples(self._stages, 'total').append(total)
+            if trace['instId']:
+                self._samples(self._instruments, (trace['instId'], 'total')).append(total)
+            self._traces.pop(trace_id, None)
+
+    # 清空所有统计 压测每一轮单独统计
+    def reset(self):
+        self._traces.clear()
+        self._stages.clear()
+        self._instruments.clear()
+
+    # 放弃一条没走完的 trace
+    def discard(self, trace_id):
+        self._traces.pop(trace_id, None)
+
+    @staticmethod
+    def _summary(samples):
+        ordered = sorted(samples)
+        return {
+            "count": len(ordered),
+            "p50": percentile(ordered, 50),
+            "p95": percentile(ordered, 95),
+            "p99": percentile(ordered, 99),
+            "max": ordered[-1] if ordered else None
+        }
+
+    def snapshot(self):
+        instruments = {}
+        for (instId, stage), samples in list(self._instruments.items()):
+            instruments.setdefault(instId, {})[stage] = self._summary(samples)
+        return {
+            "ts": int(time.time() * 1000),
+            "unit": "ms",
+            "stages": {stage: self._summary(samples) for stage, samples in list(self._stages.items())},
+            "instruments": instruments
+        }
+
+    # 本地指标接口 GET 任意路径返回 JSON
+    async def serve(self, host = '127.0.0.1', port = 9108):
+        async def handle(reader, writer):
+            try:
+                await reader.readuntil(b'\r\n\r\n')
+                body = json.dumps(self.snapshot(), ensure_ascii=False).encode('utf-8')
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nConnection: close\r\n')
+                writer.write(b'Content-Length: ' + str(len(body)).encode() + b'\r\n\r\n' + body)
+                await writer.drain()
+            except (asyncio.IncompleteReadError, ConnectionError):
+                pass
+            finally:
+                writer.close()
+
+        return await asyncio.start_server(handle, host, port)
+
+    # 定时把统计写到文件里
+    async def dump_forever(self, path = './config/latency.json', interval = 60):
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(write_file, path, self.snapshot())
+
+
+tracer = LatencyTracer()
@@ -0,0 +1,140 @@
+import asyncio
+import fcntl
+import os
+import time
+from collections import OrderedDict
+
+'''
+    同一台机器上跑多个监听实例 各用各的 telegram session 都保持连接 只有主实例下单
+    选主: 谁拿到锁文件的 flock 谁是主 主实例进程退出时系统自动释放锁 备用实例每 poll_interval 秒试一次 几十毫秒内接手
+    交接: 主实例下单前在 claims 文件里记 "c 群id 消息id" 下单结束后记 "d 群id 消息id"
+          备用实例把收到的信号在内存里留 buffer_seconds 秒 接手时读 claims
+          已经 d 的跳过 只有 c 的说明主实例下到一半 用同一个 clOrdId 重新下(交易所返回重复 clOrdId 时按已有订单处理) 没有记录的直接下
+'''
+
+
+class LeaderElection:
+    def __init__(self, path = './config/leader.lock', name = None, poll_interval = 0.02):
+        self.path = path
+        self.name = name or str(os.getpid())
+        self.poll_interval = poll_interval
+        self.is_leader = False
+        self._fd = None
+
+    def try_acquire(self):
+        if self.is_leader:
+            return True
+        if self._fd is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        # 锁文件里写上当前主实例 方便查看
+        os.ftruncate(self._fd, 0)
+        os.pwrite(self._fd, f'{self.name} {os.getpid()} {int(time.time())}\n'.encode(), 0)
+        self.is_leader = True
+        return True
+
+    # 等到成为主实例
+    async def acquire(self):
+        while not self.try_acquire():
+            await asyncio.sleep(self.poll_interval)
+
+    # 主动让出 例如 telegram 断线 备用实例马上接手
+    def release(self):
+        if self._fd is not None:
+            if self.is_leader:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self.is_leader = False
+
+    # 现在的主实例 没有返回 None
+    def holder(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                return file.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+
+class ClaimLog:
+    def __init__(self, path = './config/claims.log', keep = 4096):
+        self.path = path
+        # 接手时只保留最近这么多行
+        self.keep = keep
+        self._fd = None
+
+    def _write(self, state, chat_id, message_id):
+        if self._fd is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        # O_APPEND 的一次短写入是原子的 不用加锁
+        os.write(self._fd, f'{state} {chat_id} {message_id}\n'.encode())
+
+    def claim(self, chat_id, message_id):
+        self._write('c', chat_id, message_id)
+
+    def done(self, chat_id, message_id):
+        self._write('d', chat_id, message_id)
+
+    # (群id, 消息id) -> 'c' 或 'd'
+    def load(self):
+        states = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                lines = file.readlines()
+        except FileNotFoundError:
+            return states
+        for line in lines:
+            parts = line.split()
+            if len(parts) != 3:
+                continue
+            key = (int(parts[1]), int(parts[2]))
+            if parts[0] == 'd' or states.get(key) != 'd':
+                states[key] = parts[0]
+        if len(lines) > self.keep:
+            with open(self.path, 'w', encoding='utf-8') as file:
+                file.writelines(lines[-self.keep:])
+            self.close()
+        return states
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+# 备用实例收到的信号 按收到顺序保留 buffer_seconds 秒
+class StandbyBuffer:
+    def __init__(self, buffer_seconds = 30):
+        self.buffer_seconds = buffer_seconds
+        self._orders = OrderedDict()
+
+    def add(self, current_order):
+        self._orders[(current_order['chat_id'], current_order['message_id'])] = (time.monotonic(), current_order)
+        self.prune()
+
+    def prune(self):
+        deadline = time.monotonic() - self.buffer_seconds
+        while self._orders:
+            key, (received, _) = next(iter(self._orders.items()))
+            if received >= deadline:
+                break
+            self._orders.pop(key)
+
+    # 接手时要补下的信号 已经完成的不要
+    def take_over(self, states):
+        self.prune()
+        orders = [(key, order) for key, (_, order) in self._orders.items() if states.get(key) != 'd']
+        self._orders.clear()
+        return orders
+
+    def __len__(self):
+        return len(self._orders)
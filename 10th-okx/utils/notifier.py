@@ -0,0 +1,127 @@
+import asyncio
+import heapq
+import itertools
+import time
+
+from telethon.errors import FloodWaitError
+
+'''
+    telegram 通知队列 下单流程只调用 notify() 入队就返回 后台任务负责发送
+    优先级: CRITICAL 下单失败等告警 > TRADE 成交通知 > INFO 其他
+    队列满了先丢优先级最低、最新的一条
+    一小段时间内的多条消息合并成一条发 遇到 FloodWait 按 telegram 给的秒数等待后重发
+'''
+
+CRITICAL = 0
+TRADE = 1
+INFO = 2
+
+# telegram 单条消息的长度上限
+MAX_LENGTH = 4096
+DEFAULT_CHAT_ID = 1002143229912
+
+
+class Notifier:
+    def __init__(self, client = None, chat_id = DEFAULT_CHAT_ID, max_size = 1000, coalesce_window = 0.5, min_interval = 1.0, retries = 5):
+        self.client = client
+        self.chat_id = chat_id
+        # chat id -> InputPeer 启动时从本地缓存恢复 发送时不用再解析 entity
+        self.peers = {}
+        self.max_size = max_size
+        # 合并等待时间 告警不等
+        self.coalesce_window = coalesce_window
+        # 两次发送的最小间隔
+        self.min_interval = min_interval
+        self.retries = retries
+        self.sent = 0
+        self.dropped = 0
+        self._heap = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._sending = False
+        self._last_send = 0.0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def notify(self, text, priority = INFO, chat_id = None):
+        item = (priority, next(self._seq), chat_id or self.chat_id, str(text))
+        if len(self._heap) >= self.max_size:
+            lowest = max(self._heap)
+            if item > lowest:
+                self.dropped += 1
+                return False
+            self._heap.remove(lowest)
+            heapq.heapify(self._heap)
+            self.dropped += 1
+        heapq.heappush(self._heap, item)
+        self._wakeup.set()
+        return True
+
+    def _drain(self):
+        batch = [heapq.heappop(self._heap) for _ in range(len(self._heap))]
+        self._wakeup.clear()
+        return batch
+
+    # 同一个群的消息按优先级拼起来 超过长度就拆成多条
+    @staticmethod
+    def _coalesce(batch):
+        groups = {}
+        for item in batch:
+            groups.setdefault(item[2], []).append(item)
+        for chat_id, items in groups.items():
+            chunk = []
+            length = 0
+            for item in items:
+                text = item[3][:MAX_LENGTH]
+                if chunk and length + len(text) + 2 > MAX_LENGTH:
+                    yield chat_id, chunk
+                    chunk = []
+                    length = 0
+                chunk.append(item)
+                length += len(text) + 2
+            if chunk:
+                yield chat_id, chunk
+
+    async def _send(self, chat_id, text):
+        delay = 1
+        for _ in range(self.retries):
+            wait = self.min_interval - (time.monotonic() - self._last_send)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                await self.client.send_message(self.peers.get(chat_id, chat_id), text)
+                self._last_send = time.monotonic()
+                self.sent += 1
+                return True
+            except FloodWaitError as error:
+                print(f'telegram 限流 {error.seconds} 秒后重发')
+                await asyncio.sleep(error.seconds)
+            except Exception as error:
+                print('telegram 发送失败: ' + str(error))
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+        return False
+
+    async def run_forever(self):
+        while True:
+            await self._wakeup.wait()
+            if self.coalesce_window and self._heap[0][0] != CRITICAL:
+                await asyncio.sleep(self.coalesce_window)
+            self._sending = True
+            try:
+                for chat_id, items in self._coalesce(self._drain()):
+                    if not await self._send(chat_id, '\n\n'.join(item[3] for item in items)):
+                        self.dropped += len(items)
+                        print(f'telegram 通知丢弃 {len(items)} 条')
+            finally:
+                self._sending = False
+
+    # 退出前把队列里剩下的发完
+    async def flush(self, timeout = 10):
+        deadline = time.monotonic() + timeout
+        while (self._heap or self._sending) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+
+notifier = Notifier()
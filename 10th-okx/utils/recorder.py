@@ -0,0 +1,128 @@
+import collections
+import json
+import os
+import threading
+import time
+
+'''
+    消息和交易所请求的录制 每行一个紧凑的 JSON 只追加不修改
+    消息:  {"k": "m", "ts": 收到时间(毫秒), "c": 群id, "i": 消息id, "e": 是否编辑, "x": 文本}
+    请求:  {"k": "q", "ts": 发出时间(毫秒), "v": 交易所, "m": 方法, "p": 路径, "b": 参数, "r": 返回, "ms": 耗时}
+    默认不录 open() 之后才开始写
+    记录时只放进内存队列 序列化和写文件在后台线程 和 utils/eventLog.py 一样
+    文件超过 max_bytes 轮转 record.jsonl -> record.jsonl.1 ... 保留 backups 个旧文件 队列满了丢最旧的 dropped 记数
+'''
+
+
+class Recorder:
+    def __init__(self, capacity = 65536, interval = 0.5, max_bytes = 200 * 1024 * 1024, backups = 3):
+        self.enabled = False
+        self._capacity = capacity
+        self._buffer = collections.deque(maxlen=capacity)
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.dropped = 0
+        self.path = None
+        self._file = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def open(self, path):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8', buffering=64 * 1024)
+        self.enabled = True
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._writer, name='recorder', daemon=True)
+            self._thread.start()
+
+    def _append(self, record):
+        if len(self._buffer) == self._capacity:
+            self.dropped += 1
+        self._buffer.append(record)
+
+    def record_message(self, chat_id, message_id, text, receive_ts, edited = False):
+        if self.enabled:
+            self._append({"k": "m", "ts": receive_ts, "c": chat_id, "i": message_id, "e": int(edited), "x": text})
+
+    def record_exchange(self, venue, method, path, params, response, started, elapsed_ms):
+        if self.enabled:
+            self._append({"k": "q", "ts": started, "v": venue, "m": method, "p": path, "b": params, "r": response, "ms": round(elapsed_ms, 3)})
+
+    # 写失败不能让线程退出
+    def _writer(self):
+        while not self._stop.wait(self.interval):
+            self._safe_flush()
+        self._safe_flush()
+
+    def _safe_flush(self):
+        try:
+            self.flush()
+        except Exception as error:
+            print('录制写入失败: ' + repr(error))
+
+    # 取出队列里的记录写到文件 关闭时也直接调用
+    def flush(self):
+        with self._lock:
+            buffer = self._buffer
+            lines = []
+            while buffer:
+                record = buffer.popleft()
+                try:
+                    lines.append(json.dumps(record, ensure_ascii=False, separators=(',', ':'), default=str))
+                except Exception:
+                    self.dropped += 1
+            if self._file is None or not lines:
+                return
+            try:
+                self._file.write('\n'.join(lines) + '\n')
+                self._file.flush()
+                if self._file.tell() >= self.max_bytes:
+                    self._rotate()
+            except Exception:
+                self.dropped += len(lines)
+                raise
+
+    def _rotate(self):
+        self._file.close()
+        for index in range(self.backups - 1, 0, -1):
+            source = f'{self.path}.{index}'
+            if os.path.exists(source):
+                os.replace(source, f'{self.path}.{index + 1}')
+        if self.backups:
+            os.replace(self.path, self.path + '.1')
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, 'a', encoding='utf-8', buffering=64 * 1024)
+
+    def close(self):
+        self.enabled = False
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        else:
+            self.flush()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_records(path, kinds = None):
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if kinds is None or record['k'] in kinds:
+                yield record
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+recorder = Recorder()
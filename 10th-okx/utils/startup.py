@@ -0,0 +1,53 @@
+import json
+import time
+
+from utils.ioFile import read_file, write_file
+
+'''
+    启动加速
+    StartupTimer 记录启动各阶段耗时 ready 时打印 对比冷启动/热启动
+    StartupCache 把解析过的群 entity 和合约信息存到 ./config/cache.json 下次启动直接用 不走网络
+'''
+
+
+# 记录的是从启动开始到每个阶段完成的时间 并行的阶段各自记录完成时间
+class StartupTimer:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = []
+
+    def mark(self, stage):
+        self.stages.append((stage, (time.perf_counter() - self.started) * 1000))
+
+    def report(self):
+        print('启动耗时(从启动开始计):')
+        for stage, elapsed in self.stages:
+            print(f"{stage:>12}: {elapsed:8.1f}ms")
+        return dict(self.stages)
+
+
+class StartupCache:
+    def __init__(self, path = './config/cache.json'):
+        self.path = path
+        self._content = {}
+
+    def load(self):
+        result = read_file(self.path)
+        if result['code'] == 200 and result['message'].strip():
+            try:
+                self._content = json.loads(result['message'])
+            except ValueError:
+                self._content = {}
+        return self
+
+    def get(self, section, default = None):
+        return self._content.get(section, default)
+
+    def set(self, section, value):
+        self._content[section] = value
+
+    def save(self):
+        write_file(self.path, self._content)
+
+
+timer = StartupTimer()
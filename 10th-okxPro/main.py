@@ -2,14 +2,15 @@ import os
 import socks  # pysocks
 import asyncio
 from telethon_client import telethon_client
-from utils.utils import red_init
+from utils.config import ConfigStore
 from ok.okxPro import OkxPro
 
 proxy = (socks.SOCKS5, '127.0.0.1', 7890)
 
-# 初始化配置
-config_detail = red_init()
-flag = config_detail["Config"]['flag']
+# 初始化配置 运行中改 config.ini 会热更新
+config_store = ConfigStore('config.ini')
+config = config_store.load()
+flag = config.trade.flag
 
 # 设置 OKX 实例
 simulation = {
@@ -24,10 +25,22 @@ okx_instance = OkxPro(
     result_dict["apikey"],
     result_dict["secretkey"],
     result_dict["passphrase"],
-    flag
+    flag,
+    offset=config.trade.offset,
+    stop_offset=config.trade.stop_offset,
+    sz=config.trade.sz,
+    lever=config.trade.lever,
+    tdMode=config.trade.tdMode,
+    price_max_age=config.trade.price_max_age
 )
 
 
+async def apply_config(old, new):
+    await okx_instance.apply_config(new.trade)
+
+config_store.on_change(apply_config)
+
+
 # 监听到消息后进行开单
 
 '''
@@ -39,9 +52,8 @@ okx_instance = OkxPro(
             如果没有开进去再次收到消息 获取价格 并进行计算均价是多少 然后在均价的基础上 千分之1 进行挂单
         4. 如果收到平仓信号设置止损 
 '''
-def process_order(order):
-    
-    pass
+async def process_order(order):
+    await okx_instance.process_order(order)
 
 # 创建 Telegram 实例
 def create_telegram_client(telegram_API_config):
@@ -60,12 +72,18 @@ def create_telegram_client(telegram_API_config):
 
 async def main():
     telegram_client = create_telegram_client({
-        "api_id": config_detail["Config"]['api_id'],
-        "api_hash": config_detail["Config"]['api_hash'],
-        "group_id": int(config_detail["Config"]['group_id'])
+        "api_id": config.telegram.api_id,
+        "api_hash": config.telegram.api_hash,
+        "group_id": config.telegram.group_id
     })
     if telegram_client:
-        await telegram_client.run()
+        await okx_instance.start(config.trade.instIds)
+        config_task = asyncio.create_task(config_store.watch_forever())
+        try:
+            await telegram_client.run()
+        finally:
+            config_task.cancel()
+            await okx_instance.close()
     else:
         print("Telegram 客户端未成功创建，程序终止")
 
@@ -0,0 +1,78 @@
+import asyncio
+import base64
+import datetime
+import hmac
+import json
+from urllib.parse import urlencode
+
+import aiohttp
+
+API_URL = 'https://www.okx.com'
+
+
+def sign(api_secret, message):
+    digest = hmac.new(api_secret.encode('utf-8'), message.encode('utf-8'), 'sha256').digest()
+    return base64.b64encode(digest).decode('utf-8')
+
+
+# OKX v5 REST 的 asyncio 客户端 一个实例共用一个长连接池
+class OKXClient:
+    def __init__(self, api_key, api_secret, passphrase, flag = '1', base_url = API_URL, timeout = 10):
+        self._api_key = api_key
+        self._api_secret = api_secret
+        self._passphrase = passphrase
+        self._flag = flag
+        self._base_url = base_url
+        self._timeout = timeout
+        self._session = None
+
+    async def get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=100, keepalive_timeout=60, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(
+                self._base_url,
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self._timeout)
+            )
+        return self._session
+
+    def _sign(self, timestamp, method, request_path, body):
+        return sign(self._api_secret, timestamp + method + request_path + body)
+
+    def _headers(self, method, request_path, body, auth):
+        headers = {'Content-Type': 'application/json'}
+        if self._flag == '1':
+            headers['x-simulated-trading'] = '1'
+        if auth:
+            timestamp = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='milliseconds')[:-6] + 'Z'
+            headers['OK-ACCESS-KEY'] = self._api_key
+            headers['OK-ACCESS-SIGN'] = self._sign(timestamp, method, request_path, body)
+            headers['OK-ACCESS-TIMESTAMP'] = timestamp
+            headers['OK-ACCESS-PASSPHRASE'] = self._passphrase
+        return headers
+
+    async def request(self, method, path, params = None, auth = True):
+        session = await self.get_session()
+        body = ''
+        request_path = path
+        if method == 'GET':
+            if params:
+                request_path = path + '?' + urlencode({key: value for key, value in params.items() if value is not None})
+        elif params is not None:
+            body = json.dumps(params)
+
+        headers = self._headers(method, request_path, body, auth)
+        async with session.request(method, request_path, data=body or None, headers=headers) as response:
+            return await response.json(content_type=None)
+
+    async def get(self, path, params = None, auth = True):
+        return await self.request('GET', path, params, auth)
+
+    async def post(self, path, params = None, auth = True):
+        return await self.request('POST', path, params, auth)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            # 给 ssl 连接一点时间优雅关闭
+            await asyncio.sleep(0.25)
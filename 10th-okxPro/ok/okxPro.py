@@ -1,3 +1,248 @@
+import asyncio
+from decimal import Decimal, ROUND_HALF_UP
+
+from ok.okxClient import OKXClient, API_URL
+from ok.okxWebsocket import OKXWebsocket, PriceCache, PUBLIC_WS_URL, DEMO_PUBLIC_WS_URL, PRIVATE_WS_URL, DEMO_PRIVATE_WS_URL
+
+'''
+    挂单均价策略的订单管理
+    价格全部来自公共频道推送的行情缓存 下单不再查价格
+    每个 (instId, posSide) 最多一笔挂着的开仓单 一笔止损单
+        开仓信号: 没有挂单就按 价格 * (1 ± offset) 挂限价单
+                  挂单还没成交又来信号 按所有信号价格的均价重新算价 数量累加 用 amend-order 原地改单
+                  改单失败先撤掉旧单 查到它已成交或已撤销才重新挂
+        平仓信号: 撤掉还没成交的开仓单 按 价格 * (1 ∓ stop_offset) 设置止损 已有止损就用 amend-algos 改触发价
+    挂单的成交/撤单由私有频道 orders 推送更新
+'''
+
+OPEN_OPERATIONS = ('开多', '开空')
+
+
 class OkxPro:
-    def __init__(self,  api_key, api_secret, passphrase, flag):
-        pass
\ No newline at end of file
+    def __init__(self, api_key, api_secret, passphrase, flag, offset = 0.001, stop_offset = 0.005, sz = '0.1', lever = '100', tdMode = 'cross', price_max_age = 5, base_url = API_URL):
+        self.client = OKXClient(api_key, api_secret, passphrase, flag, base_url)
+        self.offset = Decimal(str(offset))
+        self.stop_offset = Decimal(str(stop_offset))
+        self.sz = Decimal(str(sz))
+        self.lever = str(lever)
+        self.tdMode = tdMode
+        self.price_max_age = float(price_max_age)
+        self.prices = PriceCache()
+        self.public_websocket = OKXWebsocket(DEMO_PUBLIC_WS_URL if flag == '1' else PUBLIC_WS_URL)
+        self.private_websocket = OKXWebsocket(DEMO_PRIVATE_WS_URL if flag == '1' else PRIVATE_WS_URL, api_key, api_secret, passphrase)
+        self.private_websocket.subscribe({"channel": "orders", "instType": "SWAP"}, self.on_order_update)
+        # (instId, posSide) -> 挂着的开仓单 / 止损单
+        self.working = {}
+        self.stops = {}
+        self._tick_sizes = {}
+        self._lock = asyncio.Lock()
+        self._tasks = []
+
+    # 配置文件变化后应用 挂单偏移/止损偏移/张数直接生效 杠杆变了才去设置 连接不动
+    async def apply_config(self, trade):
+        self.offset = Decimal(str(trade.offset))
+        self.stop_offset = Decimal(str(trade.stop_offset))
+        self.sz = Decimal(trade.sz)
+        self.tdMode = trade.tdMode
+        self.price_max_age = trade.price_max_age
+        if str(trade.lever) != self.lever:
+            self.lever = str(trade.lever)
+            for instId in trade.instIds:
+                await self.set_leverage(instId)
+
+    async def start(self, instIds):
+        for instId in instIds:
+            self.public_websocket.subscribe({"channel": "tickers", "instId": instId}, self.prices.on_ticker)
+            self.public_websocket.subscribe({"channel": "mark-price", "instId": instId}, self.prices.on_mark)
+        self._tasks = [
+            asyncio.create_task(self.public_websocket.run_forever()),
+            asyncio.create_task(self.private_websocket.run_forever())
+        ]
+        await self.load_instruments(instIds)
+        for instId in instIds:
+            await self.set_leverage(instId)
+            if not await self.prices.wait(instId):
+                print(instId + ' 行情还没推送过来')
+
+    async def load_instruments(self, instIds):
+        result = await self.client.get('/api/v5/public/instruments', {"instType": 'SWAP'}, auth=False)
+        if result['code'] != '0':
+            print(result)
+            return
+        for item in result['data']:
+            if item['instId'] in instIds:
+                self._tick_sizes[item['instId']] = Decimal(item['tickSz'])
+
+    async def set_leverage(self, instId):
+        result = await self.client.post('/api/v5/account/set-leverage', {"instId": instId, "lever": self.lever, "mgnMode": self.tdMode})
+        if result['code'] != '0':
+            print(result)
+        else:
+            print('杠杆设置成功 ' + instId + ' ' + self.lever)
+
+    def round_price(self, instId, price):
+        tick = self._tick_sizes.get(instId, Decimal('0.1'))
+        return str((Decimal(str(price)) / tick).quantize(Decimal('1'), rounding=ROUND_HALF_UP) * tick)
+
+    # 开多往上挂 开空往下挂 例如 90000 千分之一 开多挂 90090
+    def limit_price(self, instId, side, price):
+        factor = 1 + self.offset if side == 'buy' else 1 - self.offset
+        return self.round_price(instId, Decimal(str(price)) * factor)
+
+    # 多单止损在下方 空单止损在上方
+    def stop_price(self, instId, posSide, price):
+        factor = 1 - self.stop_offset if posSide == 'long' else 1 + self.stop_offset
+        return self.round_price(instId, Decimal(str(price)) * factor)
+
+    # 推送的价格过期(断线或者推送停了)时用 REST 查最新成交价 查到的也写回缓存
+    async def fetch_price(self, instId):
+        result = await self.client.get('/api/v5/market/ticker', {"instId": instId}, auth=False)
+        if result['code'] != '0' or not result['data']:
+            print(result)
+            return None
+        self.prices.on_ticker(result['data'][0])
+        return float(result['data'][0]['last'])
+
+    async def process_order(self, order):
+        instId = order['market']
+        price = self.prices.price(instId, self.price_max_age)
+        if price is None:
+            price = await self.fetch_price(instId)
+        if price is None:
+            print('没有 ' + instId + ' 的最新行情 跳过')
+            return None
+        async with self._lock:
+            if order['operation'] in OPEN_OPERATIONS:
+                return await self.open_order(instId, order['side'], order['posSide'], price)
+            return await self.set_stop(instId, order['posSide'], price)
+
+    async def open_order(self, instId, side, posSide, price):
+        key = (instId, posSide)
+        working = self.working.get(key)
+        if working:
+            prices = working['prices'] + [price]
+            average = sum(prices) / len(prices)
+            px = self.limit_price(instId, side, average)
+            sz = working['sz'] + self.sz
+            result = await self.client.post('/api/v5/trade/amend-order', {
+                "instId": instId,
+                "ordId": working['ordId'],
+                "newPx": px,
+                "newSz": str(sz)
+            })
+            if result['code'] == '0':
+                working['px'] = px
+                working['sz'] = sz
+                working['prices'] = prices
+                print(f'改单成功 {instId} {posSide} 均价 {average} 挂单价 {px} 数量 {sz}')
+                return working
+            # 改单失败一般是刚好成交或者被撤了 也可能只是请求出错旧单还挂着
+            # 先撤单再查状态 确认旧单不会再成交才重新挂 否则两笔会同时挂着
+            print(result)
+            filled = await self.retire_order(instId, working['ordId'])
+            if filled is None:
+                return result
+            self.working.pop(key, None)
+            # 旧单被撤时没成交的数量并进新挂单 价格还按所有信号的均价 全部成交了就只挂这一次信号的
+            if filled < working['sz']:
+                return await self.place_limit(key, side, prices, sz - filled)
+
+        return await self.place_limit(key, side, [price], self.sz)
+
+    async def place_limit(self, key, side, prices, sz):
+        instId, posSide = key
+        px = self.limit_price(instId, side, sum(prices) / len(prices))
+        result = await self.client.post('/api/v5/trade/order', {
+            "instId": instId,
+            "tdMode": self.tdMode,
+            "side": side,
+            "posSide": posSide,
+            "ordType": 'limit',
+            "px": px,
+            "sz": str(sz)
+        })
+        if result['code'] != '0':
+            print(result)
+            return result
+        working = {"ordId": result['data'][0]['ordId'], "side": side, "px": px, "sz": sz, "prices": prices}
+        self.working[key] = working
+        print(f'挂单成功 {instId} {posSide} 价格 {px} 数量 {sz}')
+        return working
+
+    # 撤掉挂单并查出最终状态 返回已成交数量 还没结束(撤单没生效)返回 None
+    async def retire_order(self, instId, ordId):
+        result = await self.client.post('/api/v5/trade/cancel-order', {"instId": instId, "ordId": ordId})
+        if result['code'] != '0':
+            # 已经成交或撤销的单会撤单失败 下面查状态确认
+            print(result)
+        result = await self.client.get('/api/v5/trade/order', {"instId": instId, "ordId": ordId})
+        if result['code'] != '0' or not result['data']:
+            print(result)
+            return None
+        order = result['data'][0]
+        if order['state'] not in ('filled', 'canceled', 'mmp_canceled'):
+            print(f"旧挂单 {instId} {ordId} 状态 {order['state']} 不重新挂单")
+            return None
+        return Decimal(order.get('accFillSz') or '0')
+
+    async def set_stop(self, instId, posSide, price):
+        key = (instId, posSide)
+        working = self.working.pop(key, None)
+        if working:
+            result = await self.client.post('/api/v5/trade/cancel-order', {"instId": instId, "ordId": working['ordId']})
+            if result['code'] != '0':
+                print(result)
+
+        trigger = self.stop_price(instId, posSide, price)
+        stop = self.stops.get(key)
+        if stop:
+            result = await self.client.post('/api/v5/trade/amend-algos', {
+                "instId": instId,
+                "algoId": stop['algoId'],
+                "newSlTriggerPx": trigger,
+                "newSlOrdPx": '-1'
+            })
+            if result['code'] == '0':
+                stop['trigger'] = trigger
+                print(f'止损改到 {instId} {posSide} {trigger}')
+                return stop
+            # 止损已经触发或者被撤了 重新下一笔
+            print(result)
+            self.stops.pop(key, None)
+
+        result = await self.client.post('/api/v5/trade/order-algo', {
+            "instId": instId,
+            "tdMode": self.tdMode,
+            "side": 'sell' if posSide == 'long' else 'buy',
+            "posSide": posSide,
+            "ordType": 'conditional',
+            "closeFraction": '1',
+            "slTriggerPx": trigger,
+            "slOrdPx": '-1',
+            "slTriggerPxType": 'mark'
+        })
+        if result['code'] != '0':
+            print(result)
+            return result
+        stop = {"algoId": result['data'][0]['algoId'], "trigger": trigger}
+        self.stops[key] = stop
+        print(f'止损设置成功 {instId} {posSide} {trigger}')
+        return stop
+
+    # 私有频道推送 挂单成交或者撤单后就不再改它了
+    def on_order_update(self, item):
+        key = (item['instId'], item['posSide'])
+        working = self.working.get(key)
+        if not working or working['ordId'] != item['ordId']:
+            return
+        if item['state'] == 'filled':
+            print(f"挂单成交 {item['instId']} {item['posSide']} 均价 {item['avgPx']} 数量 {item['accFillSz']}")
+            self.working.pop(key, None)
+        elif item['state'] == 'canceled':
+            self.working.pop(key, None)
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.client.close()
@@ -0,0 +1,171 @@
+import asyncio
+import json
+import time
+
+import aiohttp
+
+from ok.okxClient import sign
+
+PRIVATE_WS_URL = 'wss://ws.okx.com:8443/ws/v5/private'
+DEMO_PRIVATE_WS_URL = 'wss://wspap.okx.com:8443/ws/v5/private'
+PUBLIC_WS_URL = 'wss://ws.okx.com:8443/ws/v5/public'
+DEMO_PUBLIC_WS_URL = 'wss://wspap.okx.com:8443/ws/v5/public'
+
+
+# 行情缓存 公共频道 tickers / mark-price 推送更新 下单算价格不用再走 REST
+# 每个价格记下本地收到的时间 断线或者推送停了以后旧价格不会被当成当前价格
+class PriceCache:
+    def __init__(self):
+        self._prices = {}
+        self._events = {}
+
+    def _entry(self, instId):
+        entry = self._prices.get(instId)
+        if entry is None:
+            entry = self._prices[instId] = {"last": None, "bid": None, "ask": None, "mark": None, "ts": 0, "last_at": 0, "mark_at": 0}
+        return entry
+
+    def _ready(self, instId):
+        event = self._events.get(instId)
+        if event is None:
+            event = self._events[instId] = asyncio.Event()
+        return event
+
+    def on_ticker(self, item):
+        entry = self._entry(item['instId'])
+        entry['last'] = float(item['last'])
+        entry['bid'] = float(item['bidPx']) if item.get('bidPx') else None
+        entry['ask'] = float(item['askPx']) if item.get('askPx') else None
+        entry['ts'] = int(item['ts'])
+        entry['last_at'] = time.time()
+        self._ready(item['instId']).set()
+
+    def on_mark(self, item):
+        entry = self._entry(item['instId'])
+        entry['mark'] = float(item['markPx'])
+        entry['ts'] = max(entry['ts'], int(item['ts']))
+        entry['mark_at'] = time.time()
+        self._ready(item['instId']).set()
+
+    def get(self, instId):
+        return self._prices.get(instId)
+
+    # 最新成交价 没有的话用标记价格 max_age(秒) 大于 0 时超过这么久没更新的价格不用 都过期返回 None
+    def price(self, instId, max_age = 0):
+        entry = self._prices.get(instId)
+        if entry is None:
+            return None
+        now = time.time()
+        for name in ('last', 'mark'):
+            if entry[name] and (max_age <= 0 or now - entry[name + '_at'] <= max_age):
+                return entry[name]
+        return None
+
+    async def wait(self, instId, timeout = 10):
+        try:
+            await asyncio.wait_for(self._ready(instId).wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+# OKX v5 WebSocket 连接 断线自动重连并重新订阅
+# 私有频道传 api_key 会先登录 公共频道不传
+class OKXWebsocket:
+    def __init__(self, url, api_key = None, api_secret = None, passphrase = None, ping_interval = 20):
+        self._url = url
+        self._api_key = api_key
+        self._api_secret = api_secret
+        self._passphrase = passphrase
+        self._ping_interval = ping_interval
+        self._channels = []
+        self._handlers = {}
+        self._ws = None
+        self._session = None
+        self.ready = asyncio.Event()
+
+    # channel_args 例如 {"channel": "orders", "instType": "SWAP"}
+    def subscribe(self, channel_args, handler):
+        self._channels.append(channel_args)
+        self._handlers[channel_args['channel']] = handler
+        if self._ws is not None and not self._ws.closed:
+            asyncio.create_task(self._ws.send_json({"op": "subscribe", "args": [channel_args]}))
+
+    def _login_args(self):
+        timestamp = str(int(time.time()))
+        return {
+            "apiKey": self._api_key,
+            "passphrase": self._passphrase,
+            "timestamp": timestamp,
+            "sign": sign(self._api_secret, timestamp + 'GET' + '/users/self/verify')
+        }
+
+    async def _keepalive(self, ws):
+        while not ws.closed:
+            await asyncio.sleep(self._ping_interval)
+            await ws.send_str('ping')
+
+    async def _connect(self):
+        ws = await self._session.ws_connect(self._url, autoping=True)
+        if self._api_key:
+            await ws.send_json({"op": "login", "args": [self._login_args()]})
+            message = await ws.receive_json(timeout=10)
+            if message.get('event') != 'login' or message.get('code') != '0':
+                await ws.close()
+                raise ConnectionError('websocket 登录失败: ' + str(message))
+        if self._channels:
+            await ws.send_json({"op": "subscribe", "args": self._channels})
+        return ws
+
+    def _dispatch(self, message):
+        if message == 'pong':
+            return
+        message = json.loads(message)
+        if 'data' not in message:
+            if message.get('event') == 'error':
+                print(message)
+            return
+        handler = self._handlers.get(message['arg']['channel'])
+        if handler:
+            for item in message['data']:
+                # 一条数据处理出错只跳过这一条 不影响同一推送里的其他数据和后面的推送
+                try:
+                    handler(item)
+                except Exception as error:
+                    print(f"{message['arg']['channel']} 推送处理出错: {error!r} {item}")
+
+    # 推送不是 JSON 之类的错误只丢掉这一条 不断开连接 不让 run_forever 退出
+    def _on_message(self, data):
+        try:
+            self._dispatch(data)
+        except Exception as error:
+            print(f'websocket 推送解析出错: {error!r} {data[:200]}')
+
+    async def run_forever(self):
+        self._session = aiohttp.ClientSession()
+        delay = 1
+        try:
+            while True:
+                keepalive = None
+                try:
+                    self._ws = await self._connect()
+                    self.ready.set()
+                    delay = 1
+                    keepalive = asyncio.create_task(self._keepalive(self._ws))
+                    async for message in self._ws:
+                        if message.type == aiohttp.WSMsgType.TEXT:
+                            self._on_message(message.data)
+                        elif message.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                            break
+                except (aiohttp.ClientError, ConnectionError, asyncio.TimeoutError) as error:
+                    print('websocket 断开: ' + str(error))
+                finally:
+                    self.ready.clear()
+                    if keepalive:
+                        keepalive.cancel()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+        finally:
+            if self._ws is not None:
+                await self._ws.close()
+            await self._session.close()
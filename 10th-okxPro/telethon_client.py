@@ -1,4 +1,5 @@
 from telethon import TelegramClient, events
+import inspect
 import time
 from utils.matchStr import matchStr
 
@@ -26,8 +27,11 @@ class telethon_client:
     def storage_messages(self, handleMessage): 
         print('监听到! 正在处理')
         which_time = int(time.time()*1000)
-        matchJSON = matchStr(handleMessage.message)
+        matchJSON = matchStr(handleMessage.message, handleMessage.chat_id)
         message_id = handleMessage.id
+        # 不是信号的消息直接跳过
+        if matchJSON is None:
+            return None
 
         currentInfo = {
             "message_id": message_id,
@@ -51,7 +55,9 @@ class telethon_client:
             if current_order:
                 current_order =  await self.exchange_interface(current_order)
                 if self._on_order_callback:
-                    self._on_order_callback(current_order)
+                    result = self._on_order_callback(current_order)
+                    if inspect.isawaitable(result):
+                        await result
                 else:
                     print("未定义回调函数，订单内容：", current_order)
     
@@ -0,0 +1,31 @@
+import importlib.util
+import os
+import sys
+
+'''
+    配置模型只有一份 在 10th-okx/utils/config.py 这里按文件路径加载它再导出 不要在这里改
+    两个包都有自己的 utils 包 不能把 10th-okx 加进 sys.path 直接 import 会互相盖住
+'''
+
+_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), '10th-okx', 'utils', 'config.py')
+_NAME = '_10th_okx_config'
+
+_module = sys.modules.get(_NAME)
+if _module is None:
+    _spec = importlib.util.spec_from_file_location(_NAME, _PATH)
+    _module = importlib.util.module_from_spec(_spec)
+    sys.modules[_NAME] = _module
+    _spec.loader.exec_module(_module)
+
+TRADE_FIELDS = _module.TRADE_FIELDS
+TD_MODES = _module.TD_MODES
+INI_KEYS = _module.INI_KEYS
+ConfigError = _module.ConfigError
+coerce = _module.coerce
+TradeConfig = _module.TradeConfig
+TelegramConfig = _module.TelegramConfig
+Config = _module.Config
+parse_json = _module.parse_json
+parse_ini = _module.parse_ini
+parse = _module.parse
+ConfigStore = _module.ConfigStore
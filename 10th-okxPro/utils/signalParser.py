@@ -0,0 +1,91 @@
+import json
+import re
+
+# 信号里的返回体是 python dict 的写法 单引号换成双引号后按 JSON 解析
+# raw_decode 从 '{' 开始解析到对应的 '}' 为止 不需要再找结尾
+_decoder = json.JSONDecoder()
+
+
+# 一种信号格式
+#   marker  必须出现的关键字 不包含就直接跳过 不跑正则
+#   anchor  信号开始的字符 正则从这里 match 不做全文 search
+#   pattern 匹配到返回体 '{' 之前 分组依次对应 fields
+class SignalGrammar:
+    def __init__(self, name, pattern, fields, marker, anchor = '[', payload = 'response_json'):
+        self.name = name
+        self.fields = fields
+        self.marker = marker
+        self.anchor = anchor
+        self.payload = payload
+        self._regex = re.compile(pattern)
+
+    # 没有返回体或者不是合法的 JSON 返回 None 这条消息不算信号
+    def _decode_payload(self, text, start):
+        if start >= len(text) or text[start] != '{':
+            return None
+        try:
+            payload, _ = _decoder.raw_decode(text[start:].replace("'", "\""))
+        except json.JSONDecodeError:
+            return None
+        return payload if isinstance(payload, dict) else None
+
+    def parse(self, text):
+        if self.marker not in text:
+            return None
+        start = text.find(self.anchor)
+        while start != -1:
+            match = self._regex.match(text, start)
+            if match:
+                result = dict(zip(self.fields, match.groups()))
+                if self.payload:
+                    payload = self._decode_payload(text, match.end())
+                    if payload is None:
+                        return None
+                    result[self.payload] = payload
+                return result
+            start = text.find(self.anchor, start + 1)
+        return None
+
+
+# 普哥信号: [开多] 数量:6 市场:BTC-USDT-SWAP 返回{'code': '0', 'data': [...]}
+PUDATE = SignalGrammar(
+    'pudate',
+    r"\[([^\]]+)\] 数量:(\d+) 市场:(\S+) 返回",
+    ('operation', 'quantity', 'market'),
+    marker=' 数量:'
+)
+
+GRAMMARS = {
+    PUDATE.name: PUDATE
+}
+
+
+# 按来源群聊注册信号格式 没有单独注册的群聊用默认格式
+class SignalParser:
+    def __init__(self, default = (PUDATE,)):
+        self._default = list(default)
+        self._chats = {}
+
+    def register(self, grammar, chat_id = None):
+        if isinstance(grammar, str):
+            grammar = GRAMMARS[grammar]
+        if chat_id is None:
+            self._default.append(grammar)
+        else:
+            self._chats.setdefault(chat_id, []).append(grammar)
+
+    # 去掉某个群单独配置的格式 回到默认格式
+    def unregister(self, chat_id):
+        self._chats.pop(chat_id, None)
+
+    def parse(self, text, chat_id = None):
+        if not text:
+            return None
+        for grammar in self._chats.get(chat_id, self._default):
+            result = grammar.parse(text)
+            if result is not None:
+                return result
+        return None
+
+
+default_parser = SignalParser()